@@ -17,10 +17,17 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from server import models
-from server.database import Base
+from server.database import Base, DatabaseSettings
 
 target_metadata = Base.metadata
 
+# migrate the database that the server is configured to use, if it's set
+database_settings = DatabaseSettings()
+if "DATABASE_URL" in database_settings.model_fields_set:
+    config.set_main_option(
+        "sqlalchemy.url", database_settings.DATABASE_URL.replace("%", "%%")
+    )
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -1,25 +1,52 @@
+import argparse
+import os
 from datetime import datetime, timezone
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from azure.keyvault.secrets import SecretClient, SecretProperties
+from azure.core.exceptions import ResourceNotFoundError
+from azure.identity import DefaultAzureCredential
+from azure.keyvault.secrets import SecretClient
 
 from server.api.api_keys.api_key_provider import ApiKeyProvider
+from server.database import SessionLocal
 from server.models.apikey.api_schemas import ApiKey
-from server.models.apikey.db_model import DBApiKey
+from server.models.apikey.db_model import DBAzureApiKey
+from server.models.user.db_model import DBUser
 
-from enum import Enum
+def _as_utc(date: Optional[datetime]) -> Optional[datetime]:
+    # SQLite drops the timezone of the stored expirations, which are all in UTC
+    if date is None or date.tzinfo is not None:
+        return date
+    return date.replace(tzinfo=timezone.utc)
 
 class AzureApiKeyProvider(ApiKeyProvider):
+    """Stores API keys as Azure Key Vault secrets, tagged with their user. Keys are
+    also indexed by user in the `azure_api_key` table, so that listing a user's keys
+    doesn't scan the whole vault."""
+
     def __init__(self, session: Session, kv_client: SecretClient, **kwargs):
         self.kv_client = kv_client
         self.db_session = session
 
-    def _filter_by_user_id(self, user_id: str) -> Callable[[SecretProperties], bool]:
-        return lambda secret: secret.tags.get("user_id") == user_id if secret.tags else False
+    def _get_key_owner(self, api_key: str) -> Optional[str]:
+        index_entry = self.db_session.get(DBAzureApiKey, api_key)
+        if index_entry:
+            return index_entry.user
+
+        # the key may not be indexed yet if it was created before the index was
+        try:
+            secret = self.kv_client.get_secret(api_key)
+        except ResourceNotFoundError:
+            return None
+        return secret.properties.tags.get("user_id") if secret.properties.tags else None
 
     def get_user_and_expiration(self, api_key: str) -> Optional[Tuple[str, datetime]]:
-        secret = self.kv_client.get_secret(api_key)
+        try:
+            secret = self.kv_client.get_secret(api_key)
+        except ResourceNotFoundError:
+            return None
 
         if secret and self.is_date_valid(secret.properties.expires_on):
             return secret.value, secret.properties.expires_on
@@ -29,15 +56,95 @@ class AzureApiKeyProvider(ApiKeyProvider):
             raise ValueError("Expiration date is in the past.")
         
         self.kv_client.set_secret(api_key, user_id, expires_on=expiration, tags={"user_id": user_id})
+        self.db_session.merge(DBAzureApiKey(
+            user=user_id,
+            key_vault_identifier=api_key,
+            expiration=expiration.astimezone(timezone.utc),
+        ))
+        self.db_session.commit()
 
         return ApiKey(api_key=api_key, expiration=expiration)
 
     def delete_api_key(self, user_id: str, api_key: str) -> bool:
-        poller = self.kv_client.begin_delete_secret(api_key)
-        poller.result()
+        if self._get_key_owner(api_key) != user_id:
+            return False
+
+        try:
+            poller = self.kv_client.begin_delete_secret(api_key)
+            poller.result()
+        except ResourceNotFoundError:
+            # the secret is already gone, only its index entry is left
+            pass
+
+        index_entry = self.db_session.get(DBAzureApiKey, api_key)
+        if index_entry:
+            self.db_session.delete(index_entry)
+            self.db_session.commit()
 
         return True
 
     def get_api_keys(self, user_id: str) -> list[ApiKey]:
-        keys = filter(self._filter_by_user_id(user_id), self.kv_client.list_properties_of_secrets())
-        return [ApiKey(api_key=key.name, expiration=key.expires_on) for key in keys]
+        index_entries = self.db_session.scalars(
+            select(DBAzureApiKey)
+            .where(DBAzureApiKey.user == user_id)
+            .order_by(DBAzureApiKey.key_vault_identifier)
+        )
+        return [
+            ApiKey(api_key=entry.key_vault_identifier, expiration=_as_utc(entry.expiration))
+            for entry in index_entries
+        ]
+
+class ApiKeyIndexChanges(BaseModel):
+    """How many index entries a reconciliation added, updated and removed."""
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+
+def reconcile_azure_api_keys(session: Session, kv_client: SecretClient) -> ApiKeyIndexChanges:
+    """Sync the `azure_api_key` index with the vault, which is the source of truth.
+    Keys that are missing from the index are added, keys whose owner or expiration
+    changed are updated, and keys that are no longer in the vault are removed. The
+    vault is scanned once."""
+    known_users = set(session.scalars(select(DBUser.id)))
+    vault_keys: dict[str, Tuple[str, Optional[datetime]]] = {}
+    for secret in kv_client.list_properties_of_secrets():
+        user_id = secret.tags.get("user_id") if secret.tags else None
+        # secrets without a user tag aren't API keys
+        if user_id in known_users:
+            vault_keys[secret.name] = (user_id, _as_utc(secret.expires_on))
+
+    index_entries = {
+        entry.key_vault_identifier: entry
+        for entry in session.scalars(select(DBAzureApiKey))
+    }
+    changes = ApiKeyIndexChanges()
+    for api_key, (user_id, expiration) in vault_keys.items():
+        index_entry = index_entries.pop(api_key, None)
+        if index_entry is None:
+            session.add(DBAzureApiKey(user=user_id, key_vault_identifier=api_key, expiration=expiration))
+            changes.added += 1
+        elif index_entry.user != user_id or _as_utc(index_entry.expiration) != expiration:
+            index_entry.user = user_id
+            index_entry.expiration = expiration
+            changes.updated += 1
+
+    for index_entry in index_entries.values():
+        session.delete(index_entry)
+        changes.removed += 1
+
+    session.commit()
+    return changes
+
+def main():
+    """Sync the index of Azure API keys with the key vault."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--vault-url", default=os.environ.get("AZURE_KEY_VAULT_URL"))
+    args = parser.parse_args()
+
+    kv_client = SecretClient(vault_url=args.vault_url, credential=DefaultAzureCredential())
+    with SessionLocal() as session:
+        changes = reconcile_azure_api_keys(session, kv_client)
+    print(f"Added {changes.added}, updated {changes.updated} and removed {changes.removed} API keys.")
+
+if __name__ == "__main__":
+    main()
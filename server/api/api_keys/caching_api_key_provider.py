@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from server.api.api_keys.api_key_provider import ApiKeyProvider
+from server.models.apikey.api_schemas import ApiKey
+
+# the longest that other server processes keep accepting a deleted key
+DEFAULT_API_KEY_CACHE_TTL = timedelta(seconds=5)
+DEFAULT_API_KEY_CACHE_SIZE = 10_000
+
+
+def _hash_api_key(api_key: str) -> str:
+    # the cache never holds the keys themselves
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class ApiKeyCache:
+    """Process-wide store of API key lookups, keyed by a hash of the key. Both found
+    and missing keys are stored, until the earlier of the TTL and the expiration of
+    the key. Once it holds `max_size` lookups, the least recently used ones are
+    dropped first."""
+
+    def __init__(self, ttl: timedelta = DEFAULT_API_KEY_CACHE_TTL, max_size: int = DEFAULT_API_KEY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # key hash -> (lookup result, when the entry expires)
+        self._lookups: OrderedDict[str, Tuple[Optional[Tuple[str, datetime]], datetime]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> Tuple[bool, Optional[Tuple[str, datetime]]]:
+        """Returns whether the lookup of the key is cached, and its result if so."""
+        key_hash = _hash_api_key(api_key)
+        with self._lock:
+            entry = self._lookups.get(key_hash)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at > datetime.now(timezone.utc):
+                    self._lookups.move_to_end(key_hash)
+                    self.hits += 1
+                    return True, result
+                del self._lookups[key_hash]
+            self.misses += 1
+            return False, None
+
+    def put(self, api_key: str, result: Optional[Tuple[str, datetime]]):
+        expires_at = datetime.now(timezone.utc) + self.ttl
+        if result is not None and result[1] is not None:
+            expires_at = min(expires_at, result[1].astimezone(timezone.utc))
+
+        key_hash = _hash_api_key(api_key)
+        with self._lock:
+            self._lookups[key_hash] = (result, expires_at)
+            self._lookups.move_to_end(key_hash)
+            while len(self._lookups) > self.max_size:
+                self._lookups.popitem(last=False)
+
+    def invalidate(self, api_key: str):
+        with self._lock:
+            self._lookups.pop(_hash_api_key(api_key), None)
+
+    def clear(self):
+        with self._lock:
+            self._lookups.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class CachingApiKeyProvider(ApiKeyProvider):
+    """Wraps another ApiKeyProvider to cache its key lookups in an ApiKeyCache, which
+    outlives the provider. Creating or deleting a key through this provider
+    invalidates its cached lookup right away. Other server processes keep their own
+    cache, so a deleted key can still be accepted by them until their entry expires,
+    i.e. for up to the TTL of the cache. The TTL is kept to a few seconds by default
+    for that reason: long enough to spare the lookups of bursts of requests with the
+    same key, and short enough for revocations to apply soon on every process."""
+
+    def __init__(self, provider: ApiKeyProvider, cache: ApiKeyCache):
+        self.provider = provider
+        self.cache = cache
+
+    def get_user_and_expiration(self, api_key: str) -> Optional[Tuple[str, datetime]]:
+        cached, result = self.cache.get(api_key)
+        if not cached:
+            result = self.provider.get_user_and_expiration(api_key)
+            self.cache.put(api_key, result)
+        return result
+
+    def create_api_key(self, user_id: str, api_key: str, expiration: datetime) -> ApiKey:
+        created_key = self.provider.create_api_key(user_id, api_key, expiration)
+        self.cache.invalidate(api_key)
+        return created_key
+
+    def delete_api_key(self, user_id: str, api_key: str) -> bool:
+        deleted = self.provider.delete_api_key(user_id, api_key)
+        self.cache.invalidate(api_key)
+        return deleted
+
+    def get_api_keys(self, user_id: str) -> list[ApiKey]:
+        return self.provider.get_api_keys(user_id)
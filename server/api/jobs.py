@@ -0,0 +1,284 @@
+"""A queue of workflow runs, backed by the `workflow_run_job` table.
+
+The run endpoint can spool the uploaded file to disk and queue a job instead of
+validating the file while the request waits. A pool of worker threads claims the
+queued jobs, runs them and stores their reports. Several pools, in as many
+processes, can share the queue: a job is claimed with a conditional update of its
+status, so when workers race for the same job only one of them gets it, without
+any locking support from the database.
+
+While a worker runs a job, a thread renews the job's heartbeat, however long the run
+goes between progress updates. A job whose worker died is claimed again once its
+heartbeat is older than the lease.
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import frictionless.exception
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from server.database import SessionLocal
+from server.models.job.db_model import DBWorkflowRunJob
+from server.models.workflow.db_model import DBWorkflow
+from server.workflow_runner.exceptions import (
+    FieldsetSchemaNotFoundException,
+    ParameterDefinitionNotFoundException,
+)
+from server.workflow_runner.validators import csv_resource
+from server.workflow_runner.workflow_runner import execute_workflow
+
+LOG = logging.getLogger(__name__)
+
+# a running job whose heartbeat is older than this is considered abandoned
+JOB_LEASE = timedelta(minutes=5)
+# how often the heartbeat of a running job is renewed
+HEARTBEAT_INTERVAL = JOB_LEASE / 5
+# how often a running job records its progress, which also renews its lease
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+INVALID_FILE_ERROR = (
+    "Could not parse the input file. Please check that it is a valid .csv file!"
+)
+FAILED_RUN_ERROR = "The workflow run failed unexpectedly."
+
+
+class WorkflowRunJobError(Exception):
+    """Exception raised when a job can't be run, with a message for the user."""
+
+
+def _claimable(now: datetime):
+    return or_(
+        DBWorkflowRunJob.status == "queued",
+        and_(
+            DBWorkflowRunJob.status == "running",
+            DBWorkflowRunJob.heartbeat_date < now - JOB_LEASE,
+        ),
+    )
+
+
+def claim_job(session: Session, job_id: str, worker_id: str) -> bool:
+    """Claim a job if it is still claimable. Returns whether this worker got it."""
+    now = datetime.now()
+    result = session.execute(
+        update(DBWorkflowRunJob)
+        .where(DBWorkflowRunJob.id == job_id, _claimable(now))
+        .values(
+            status="running",
+            worker_id=worker_id,
+            heartbeat_date=now,
+            started_date=now,
+            rows_processed=0,
+        )
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def claim_next_job(session: Session, worker_id: str) -> DBWorkflowRunJob | None:
+    """Claim the oldest claimable job, or return None if there is none."""
+    while True:
+        job_id = session.scalars(
+            select(DBWorkflowRunJob.id)
+            .where(_claimable(datetime.now()))
+            .order_by(DBWorkflowRunJob.created_date, DBWorkflowRunJob.id)
+            .limit(1)
+        ).first()
+        if job_id is None:
+            return None
+        # another worker may have claimed the job since we looked it up
+        if claim_job(session, job_id, worker_id):
+            return session.get(DBWorkflowRunJob, job_id, populate_existing=True)
+
+
+def _update_claimed_job(
+    session: Session, job_id: str, worker_id: str, **values: object
+) -> bool:
+    # only the worker that holds the claim may update a running job
+    result = session.execute(
+        update(DBWorkflowRunJob)
+        .where(
+            DBWorkflowRunJob.id == job_id,
+            DBWorkflowRunJob.worker_id == worker_id,
+            DBWorkflowRunJob.status == "running",
+        )
+        .values(heartbeat_date=datetime.now(), **values)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _fail_claimed_job(
+    session: Session, job_id: str, worker_id: str, error: str
+) -> bool:
+    session.rollback()
+    return _update_claimed_job(
+        session,
+        job_id,
+        worker_id,
+        status="failed",
+        error=error,
+        finished_date=datetime.now(),
+    )
+
+
+@contextmanager
+def _heartbeat(session: Session, job_id: str, worker_id: str) -> Iterator[None]:
+    """Renew the lease of a claimed job every `HEARTBEAT_INTERVAL` while the block
+    runs, from a thread with a session of its own."""
+    stopped = threading.Event()
+
+    def beat():
+        with Session(session.get_bind()) as heartbeat_session:
+            while not stopped.wait(HEARTBEAT_INTERVAL.total_seconds()):
+                try:
+                    _ = _update_claimed_job(heartbeat_session, job_id, worker_id)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    LOG.exception("Could not renew the lease of job %s", job_id)
+                    heartbeat_session.rollback()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(session: Session, job: DBWorkflowRunJob, worker_id: str):
+    """Run a claimed job and store its report, or why it failed."""
+    # the job's attributes expire with every commit, and its row is deleted along
+    # with its workflow
+    job_id = job.id
+    upload_path = job.upload_path
+    last_progress = time.monotonic()
+
+    def record_progress(rows_processed: int):
+        nonlocal last_progress
+        if time.monotonic() - last_progress >= PROGRESS_INTERVAL_SECONDS:
+            last_progress = time.monotonic()
+            _ = _update_claimed_job(
+                session, job_id, worker_id, rows_processed=rows_processed
+            )
+
+    try:
+        workflow = session.get(DBWorkflow, job.workflow_id)
+        if workflow is None:
+            raise WorkflowRunJobError(f"Workflow {job.workflow_id} was not found.")
+        resource = csv_resource(job.upload_path)
+        try:
+            resource.infer()
+        except frictionless.exception.FrictionlessException as e:
+            raise WorkflowRunJobError(INVALID_FILE_ERROR) from e
+
+        with _heartbeat(session, job_id, worker_id):
+            run_result = execute_workflow(
+                file_name=job.filename,
+                file_contents=resource,
+                param_values=job.param_values,
+                schema=workflow.schema,
+                max_failures=job.max_failures,
+                max_failures_per_field=job.max_failures_per_field,
+                fail_fast=job.fail_fast,
+                on_progress=record_progress,
+            )
+        finished = _update_claimed_job(
+            session,
+            job_id,
+            worker_id,
+            status="succeeded",
+            rows_processed=run_result.row_count,
+            report=run_result.to_report(job.filename, job.workflow_id),
+            finished_date=datetime.now(),
+        )
+    except (
+        WorkflowRunJobError,
+        ParameterDefinitionNotFoundException,
+        FieldsetSchemaNotFoundException,
+    ) as e:
+        finished = _fail_claimed_job(session, job_id, worker_id, str(e))
+    except Exception:  # pylint: disable=broad-exception-caught
+        LOG.exception("Workflow run job %s failed", job_id)
+        finished = _fail_claimed_job(session, job_id, worker_id, FAILED_RUN_ERROR)
+
+    # if the claim was lost, the worker that holds it now still needs the file, unless
+    # the job was deleted
+    if finished or session.get(DBWorkflowRunJob, job_id) is None:
+        try:
+            os.remove(upload_path)
+        except FileNotFoundError:
+            pass
+
+
+class JobWorkerPool:
+    """Threads that claim and run queued workflow run jobs until the pool is
+    stopped. Each worker uses its own session from `session_factory`."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: int = 2,
+        poll_interval: float = 1.0,
+    ):
+        self.session_factory: Callable[[], Session] = session_factory
+        self.workers: int = workers
+        self.poll_interval: float = poll_interval
+        self._stopping: threading.Event = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        self._stopping.clear()
+        for _ in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, args=(f"worker-{uuid.uuid4()}",), daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None):
+        """Stop claiming jobs and wait for the running ones to finish."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _work(self, worker_id: str):
+        while not self._stopping.is_set():
+            try:
+                with self.session_factory() as session:
+                    job = claim_next_job(session, worker_id)
+                    if job is not None:
+                        run_job(session, job, worker_id)
+                        continue
+            except Exception:  # pylint: disable=broad-exception-caught
+                LOG.exception("Job worker %s failed to process the queue", worker_id)
+            _ = self._stopping.wait(self.poll_interval)
+
+
+def main():
+    """Run job workers outside of the API server processes."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    _ = parser.add_argument("--workers", type=int, default=2)
+    _ = parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    pool = JobWorkerPool(workers=args.workers, poll_interval=args.poll_interval)
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
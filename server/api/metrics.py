@@ -0,0 +1,264 @@
+"""In-process metrics of the API, rendered in the Prometheus text format.
+
+Each server process counts its own requests, validations and cache lookups since it
+started. `/metrics` renders them as text that Prometheus can scrape, and that is
+readable as is, e.g. in tests or with curl when there is no collector around.
+"""
+
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# upper bounds of the buckets of latency histograms, in seconds
+DEFAULT_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# the values of the labels of a metric, in the order of its label names
+LabelValues = tuple[str, ...]
+
+M = TypeVar("M", bound="Metric")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + labels + "}"
+
+
+class Metric(ABC):
+    """A metric with a value for each combination of the values of its labels."""
+
+    type: str
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: tuple[str, ...] = tuple(label_names)
+        self._lock: threading.Lock = threading.Lock()
+
+    def _label_values(self, labels: Mapping[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} has labels {self.label_names}, got {tuple(labels)}."
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """The name, formatted labels and value of each sample of the metric."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(
+            f"{name}{labels} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """A total that only goes up, e.g. of requests or of rows validated."""
+
+    type: str = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = self._label_values(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+
+class Histogram(Metric):
+    """Counts of observations, e.g. request latencies, in cumulative buckets of
+    values, along with their count and sum."""
+
+    type: str = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (count of each bucket, sum of the observations)
+        self._values: dict[LabelValues, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time of a block of code, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = self._label_values(labels)
+        with self._lock:
+            counts, _ = self._values.get(key, ([0], 0.0))
+            return sum(counts)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            )
+        bucket_label_names = self.label_names + ("le",)
+        for label_values, (counts, total) in values:
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative_count += count
+                labels = _format_labels(
+                    bucket_label_names, label_values + (_format_value(upper_bound),)
+                )
+                yield f"{self.name}_bucket", labels, cumulative_count
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_count", labels, cumulative_count
+            yield f"{self.name}_sum", labels, total
+
+
+class CallbackMetric(Metric):
+    """A metric whose values are read when it is rendered, e.g. from the counters
+    that a cache keeps itself. `collect` returns the values by label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        collect: Callable[[], Mapping[LabelValues, float]],
+        label_names: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, label_names)
+        self.type = metric_type
+        self.collect: Callable[[], Mapping[LabelValues, float]] = collect
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for label_values, value in sorted(self.collect().items()):
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+
+class MetricsRegistry:
+    """The metrics of a server process, rendered together."""
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware that counts the HTTP requests by route, method and status, and
+    times them until their response was sent, streamed responses included.
+
+    Routes are named after their endpoint function, e.g. `run_workflow`. Requests
+    that match no route are counted as `unmatched`, so that requests for made up
+    paths don't add labels.
+    """
+
+    def __init__(self, app: ASGIApp, requests: Counter, latency: Histogram):
+        self.app: ASGIApp = app
+        self.requests: Counter = requests
+        self.latency: Histogram = latency
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        # a request that fails before it responds gets a 500 from the server
+        status = 500
+
+        async def send_and_record_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            # the router adds the route that the request matched to the scope
+            route: Any = scope.get("route")
+            route_name = getattr(route, "name", None) or "unmatched"
+            self.latency.observe(
+                time.perf_counter() - start, route=route_name, method=scope["method"]
+            )
+            self.requests.inc(
+                route=route_name, method=scope["method"], status=str(status)
+            )
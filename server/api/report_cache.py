@@ -0,0 +1,148 @@
+"""A cache of workflow run reports on local disk, addressed by what they depend on.
+
+The same file is often run again with the same workflow and params, e.g. when a
+client retries a request or a pipeline is re-run. The report of a run only depends
+on the contents and the name of the file, the schema of the workflow, the param
+values and the failure caps of the run, so a report is cached under a hash of all
+of them, and returned again without parsing or validating the file. A workflow whose
+schema changed hashes differently, so its stale reports are never returned, and are
+evicted in time.
+
+Reports are stored as JSON files in a directory, which server processes can share,
+and the least recently used reports of the directory are evicted once they take more
+than a given number of bytes.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+from pydantic import ValidationError
+
+from server.models.workflow.api_schemas import WorkflowRunReport
+
+DEFAULT_REPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def run_report_key(
+    file_hash: str,
+    file_name: str,
+    workflow_id: str,
+    schema_hash: str,
+    param_values: Mapping[str, Any],
+    options: Mapping[str, Any],
+) -> str:
+    """The cache key of the report of a run, from the hash of the contents of the
+    file, and everything else that the report depends on. `options` holds the other
+    arguments of the run, such as its failure caps."""
+    # the params and options are normalized by sorting their names
+    run = json.dumps(
+        [file_hash, file_name, workflow_id, schema_hash, param_values, options],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(run.encode()).hexdigest()
+
+
+class RunReportCache:
+    """A thread-safe LRU cache of workflow run reports, stored as JSON files in
+    `directory`, which hold at most `max_bytes` together.
+
+    The directory is the only record of what is cached, so that the processes that
+    share it see each other's reports, and evict them by their last use: a hit
+    touches the report's file, and the oldest files are removed once the files of
+    the directory take more than `max_bytes`."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_REPORT_CACHE_BYTES):
+        self.directory: Path = Path(directory)
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock: threading.Lock = threading.Lock()
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> WorkflowRunReport | None:
+        path = self._path(key)
+        try:
+            report = WorkflowRunReport.model_validate_json(path.read_bytes())
+            # mark the report as recently used for every process
+            self._touch(path)
+        except FileNotFoundError:
+            # the report was never cached, or was evicted
+            report = None
+        except (OSError, ValidationError):
+            # the report was written by an older version of the server
+            self.discard(key)
+            report = None
+        with self._lock:
+            if report is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return report
+
+    def put(self, key: str, report: WorkflowRunReport):
+        contents = report.model_dump_json(by_alias=True).encode()
+        if len(contents) > self.max_bytes:
+            return
+        # write the report under another name first, so that it's never read
+        # half-written
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=f"{key}.", suffix=".tmp", delete=False
+        ) as file:
+            _ = file.write(contents)
+        self._touch(Path(file.name))
+        os.replace(file.name, self._path(key))
+        self._evict()
+
+    def _touch(self, path: Path):
+        # the clock of the file system can be too coarse to order the reports
+        # written or read in quick succession
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def discard(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def _reports(self) -> list[tuple[int, int, Path]]:
+        """The last use, size and path of the reports in the directory, from the
+        least to the most recently used."""
+        reports: list[tuple[int, int, Path]] = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                continue
+            reports.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(reports)
+
+    def _evict(self):
+        """Remove the least recently used reports of the directory, including those
+        of other processes, until the reports fit in `max_bytes`. The directory is
+        scanned after each report that is added, which takes little time next to
+        the run that produced the report."""
+        reports = self._reports()
+        total_bytes = sum(size for _, size, _ in reports)
+        for _, size, path in reports:
+            if total_bytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+
+    def clear(self):
+        for _, _, path in self._reports():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
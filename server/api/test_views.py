@@ -1,17 +1,46 @@
 # pylint: disable=redefined-outer-name,unused-argument
-# pyright: reportUnusedParameter=none
 
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
 import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
-from server.api.views import app, azure_scheme, get_session
-from server.database import Base
+from server import pydantic_type
+from server.api import jobs, views
+from server.api.report_cache import RunReportCache
+from server.api.views import (
+    api_key_lookup_latency,
+    app,
+    azure_scheme,
+    get_async_session,
+    get_session,
+    settings,
+    user_cache,
+    workflow_cache,
+)
+from server.database import Base, create_async_database_engine, create_database_engine
+from server.models.job.db_model import DBWorkflowRunJob
 from server.models.user.db_model import DBUser
 from server.models.workflow.db_model import DBWorkflow
+from server.models.workflow.workflow_schema import WorkflowSchema
+
+WORKFLOW_RUNNER_TESTS_DIR = (
+    Path(__file__).resolve().parent.parent / "tests" / "workflow_runner"
+)
+SAMPLE_SCHEMA_PATH = WORKFLOW_RUNNER_TESTS_DIR / "sample_schema/workflow_schema.json"
+BAD_DATA_PATH = WORKFLOW_RUNNER_TESTS_DIR / "data/bad.csv"
 
 
 class MockAzureUser:
@@ -38,9 +67,7 @@ def mock_azure_scheme():
 @pytest.fixture(scope="function")
 def setup_db():
     """Create and configure a new in-memory SQLite database for testing"""
-    engine = create_engine(
-        "sqlite:///./test.db", connect_args={"check_same_thread": False}
-    )
+    engine = create_database_engine("sqlite:///./test.db")
     # pylint: disable=invalid-name
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -48,14 +75,24 @@ def setup_db():
     Base.metadata.create_all(bind=engine)
 
     session = TestingSessionLocal()
+    async_engine = create_async_database_engine("sqlite:///./test.db")
+
+    async def get_test_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    # the database is created for each test, and so are its users
+    user_cache.clear()
 
     # Override dependencies
     app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_async_session] = get_test_async_session
     app.dependency_overrides[azure_scheme] = mock_azure_scheme
 
     yield session
 
     session.close()
+    asyncio.run(async_engine.dispose())
     Base.metadata.drop_all(bind=engine)
 
 
@@ -85,7 +122,8 @@ def db_with_user(setup_db: Session):
 client = TestClient(app)
 
 
-def test_get_self_user(db_with_user: Session):
+@pytest.mark.usefixtures("db_with_user")
+def test_get_self_user():
     response = client.get("/api/users/self")
 
     assert response.status_code == 200
@@ -115,6 +153,20 @@ def test_create_new_user(empty_db: Session):
     assert data["given_name"] == "Waymond"
 
 
+def test_current_user_is_cached(empty_db: Session):
+    with mock.patch.object(
+        AsyncSession, "get", autospec=True, side_effect=AsyncSession.get
+    ) as get:
+        for _ in range(3):
+            response = client.get("/api/users/self")
+            assert response.status_code == 200
+            assert response.json()["id"] == MOCK_USER_ID
+    # the user was created by the first request, and cached
+    assert get.call_count == 1
+    assert (user_cache.hits, user_cache.misses) == (2, 1)
+    assert empty_db.query(DBUser).count() == 1
+
+
 def test_create_workflow(db_with_user: Session):
     response = client.post("/api/workflows/", json={"title": "Test Workflow"})
     assert response.status_code == 200
@@ -202,6 +254,69 @@ def test_get_workflows(db_with_user: Session):
     assert data[0]["owner"] == MOCK_USER_ID
 
 
+def test_get_workflows_in_pages(db_with_user: Session):
+    created_date = datetime(2024, 1, 1)
+    workflows = [
+        DBWorkflow(
+            title=title,
+            owner=MOCK_USER_ID,
+            # two workflows were created at the same time
+            created_date=created_date + timedelta(days=min(i, 3)),
+        )
+        for i, title in enumerate(["a1", "b1", "a2", "a3", "a%"])
+    ]
+    db_with_user.add_all(workflows)
+    db_with_user.commit()
+    ordered_ids = [
+        workflow.id
+        for workflow in sorted(
+            workflows,
+            key=lambda workflow: (workflow.created_date, uuid.UUID(workflow.id)),
+        )
+    ]
+
+    listed_ids: list[str] = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        response = client.get("/api/workflows", params=params)
+        assert response.status_code == 200
+        listed_ids.extend(workflow["id"] for workflow in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert listed_ids == ordered_ids
+
+    response = client.get("/api/workflows", params={"title_prefix": "a"})
+    assert [workflow["id"] for workflow in response.json()] == [
+        workflow_id for workflow_id in ordered_ids if workflow_id != workflows[1].id
+    ]
+    response = client.get("/api/workflows", params={"title_prefix": "a%"})
+    assert [workflow["title"] for workflow in response.json()] == ["a%"]
+
+    response = client.get("/api/workflows", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+def test_get_workflows_does_not_load_schemas(db_with_user: Session):
+    db_with_user.add(DBWorkflow(title="Test Workflow", owner=MOCK_USER_ID))
+    db_with_user.commit()
+    db_with_user.expunge_all()
+
+    with mock.patch.object(
+        pydantic_type, "_type_adapter", wraps=pydantic_type._type_adapter
+    ) as type_adapter:
+        response = client.get("/api/workflows")
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+        type_adapter.assert_not_called()
+
+        workflow_id = response.json()[0]["id"]
+        response = client.get(f"/api/workflows/{workflow_id}")
+        assert response.status_code == 200
+        assert "schema" in response.json()
+        type_adapter.assert_called_once()
+
+
 def test_delete_workflow(db_with_user: Session):
     test_workflow = DBWorkflow(
         title="Test Workflow",
@@ -253,3 +368,529 @@ def test_delete_workflow_with_incorrect_user(db_with_user: Session):
 
     # Clean up the dependency override
     del app.dependency_overrides[azure_scheme]
+
+
+@pytest.fixture(scope="function")
+def sample_workflow(db_with_user: Session):
+    """Fixture for a workflow with the sample workflow schema."""
+    workflow = DBWorkflow(
+        title="Sample Workflow",
+        owner=MOCK_USER_ID,
+        schema=WorkflowSchema.model_validate(
+            json.loads(SAMPLE_SCHEMA_PATH.read_text())
+        ),
+    )
+    db_with_user.add(workflow)
+    db_with_user.commit()
+    yield workflow
+
+
+def run_sample_workflow(workflow: DBWorkflow, **form: str):
+    return client.post(
+        f"/api/workflows/{workflow.id}/run",
+        files={"file": ("bad.csv", BAD_DATA_PATH.read_bytes(), "text/csv")},
+        data={
+            "workflow_inputs": json.dumps({"fieldset_schema": "demographic_fields"}),
+            **form,
+        },
+    )
+
+
+def test_run_workflow(sample_workflow: DBWorkflow):
+    response = run_sample_workflow(sample_workflow)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["rowCount"] == 13
+    assert data["rowCountIsExact"]
+    assert data["failureCount"] == 11
+    assert data["failureCountIsExact"]
+    assert len(data["validationFailures"]) == 11
+
+
+def test_run_workflow_uses_workflow_cache(
+    sample_workflow: DBWorkflow, db_with_user: Session
+):
+    workflow_cache.clear()
+    report = run_sample_workflow(sample_workflow).json()
+    assert run_sample_workflow(sample_workflow).json() == report
+    stats = workflow_cache.stats()
+    assert (stats.size, stats.hits, stats.misses) == (1, 1, 1)
+
+    # updating the workflow drops it from the cache
+    schema = sample_workflow.schema
+    workflow = client.get(f"/api/workflows/{sample_workflow.id}").json()
+    workflow["schema"]["operations"] = []
+    response = client.put(f"/api/workflows/{sample_workflow.id}", json=workflow)
+    assert response.status_code == 200
+    assert workflow_cache.stats().size == 0
+    assert run_sample_workflow(sample_workflow).json()["failureCount"] < (
+        report["failureCount"]
+    )
+    assert workflow_cache.stats().misses == 2
+
+    # a schema changed by another process is loaded again. The update was made in
+    # the endpoint's own session.
+    db_with_user.expire(sample_workflow)
+    sample_workflow.schema = schema
+    db_with_user.commit()
+    assert run_sample_workflow(sample_workflow).json() == report
+    assert workflow_cache.stats().misses == 3
+
+    response = client.delete(f"/api/workflows/{sample_workflow.id}")
+    assert response.status_code == 200
+    assert workflow_cache.stats().size == 0
+    assert run_sample_workflow(sample_workflow).status_code == 404
+
+
+def test_run_workflow_with_failure_caps(sample_workflow: DBWorkflow):
+    response = run_sample_workflow(sample_workflow, max_failures="3")
+    assert response.status_code == 200
+    data = response.json()
+
+    assert len(data["validationFailures"]) == 3
+    assert data["failureCount"] >= 3
+    assert not data["failureCountIsExact"]
+
+    response = run_sample_workflow(sample_workflow, fail_fast="true")
+    assert response.status_code == 200
+    data = response.json()
+
+    assert len(data["validationFailures"]) == 1
+    assert data["rowCount"] <= 13
+    assert not data["rowCountIsExact"]
+
+
+def test_run_workflow_uses_report_cache(sample_workflow: DBWorkflow):
+    with tempfile.TemporaryDirectory() as directory:
+        report_cache = RunReportCache(directory)
+        with (
+            mock.patch.object(views, "run_report_cache", report_cache),
+            mock.patch.object(
+                views, "execute_workflow", wraps=views.execute_workflow
+            ) as execute_workflow,
+        ):
+            report = run_sample_workflow(sample_workflow).json()
+            assert execute_workflow.call_count == 1
+            # the same file is run again with the same workflow and params
+            assert run_sample_workflow(sample_workflow).json() == report
+            assert execute_workflow.call_count == 1
+            assert (report_cache.hits, report_cache.misses) == (1, 1)
+
+            # the failure caps are part of the run
+            data = run_sample_workflow(sample_workflow, max_failures="3").json()
+            assert len(data["validationFailures"]) == 3
+            assert execute_workflow.call_count == 2
+
+            # neither are streamed runs cached
+            _ = run_sample_workflow(sample_workflow, stream="true")
+            assert (report_cache.hits, report_cache.misses) == (1, 2)
+
+            # the reports of a workflow are stale once its schema changes
+            workflow = client.get(f"/api/workflows/{sample_workflow.id}").json()
+            workflow["schema"]["operations"] = []
+            response = client.put(f"/api/workflows/{sample_workflow.id}", json=workflow)
+            assert response.status_code == 200
+            assert run_sample_workflow(sample_workflow).json()["failureCount"] < (
+                report["failureCount"]
+            )
+            assert execute_workflow.call_count == 3
+
+
+def test_run_workflow_in_validation_executor(sample_workflow: DBWorkflow):
+    threads: list[str] = []
+    execute_workflow = views.execute_workflow
+
+    def record_thread(**kwargs):
+        threads.append(threading.current_thread().name)
+        return execute_workflow(**kwargs)
+
+    with mock.patch.object(views, "execute_workflow", side_effect=record_thread):
+        response = run_sample_workflow(sample_workflow)
+    assert response.status_code == 200
+    assert len(threads) == 1
+    assert threads[0].startswith("validation")
+
+
+def test_run_workflow_spooled_to_disk(sample_workflow: DBWorkflow):
+    in_memory = run_sample_workflow(sample_workflow).json()
+    with mock.patch.object(settings, "UPLOAD_MAX_MEMORY_BYTES", 16):
+        response = run_sample_workflow(sample_workflow)
+    assert response.status_code == 200
+    assert response.json() == in_memory
+
+
+def test_run_workflow_on_compressed_file(sample_workflow: DBWorkflow):
+    response = client.post(
+        f"/api/workflows/{sample_workflow.id}/run",
+        files={
+            "file": (
+                "bad.csv.gz",
+                gzip.compress(BAD_DATA_PATH.read_bytes()),
+                "application/gzip",
+            )
+        },
+        data={"workflow_inputs": json.dumps({"fieldset_schema": "demographic_fields"})},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    report = run_sample_workflow(sample_workflow).json()
+    assert data["validationFailures"] == report["validationFailures"]
+    assert data["rowCount"] == 13
+
+
+def test_run_workflow_in_parallel(sample_workflow: DBWorkflow):
+    response = run_sample_workflow(sample_workflow, parallel="true")
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["rowCount"] == 13
+    assert data["failureCount"] == 11
+    assert (
+        data["validationFailures"]
+        == run_sample_workflow(sample_workflow).json()["validationFailures"]
+    )
+
+
+def test_run_workflow_streamed(sample_workflow: DBWorkflow):
+    response = run_sample_workflow(sample_workflow, stream="true")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    header, *failures, summary = [
+        json.loads(line) for line in response.text.splitlines()
+    ]
+    report = run_sample_workflow(sample_workflow).json()
+
+    assert header == {
+        "type": "header",
+        "filename": "bad.csv",
+        "workflowId": sample_workflow.id,
+    }
+    assert all(failure.pop("type") == "failure" for failure in failures)
+    # failures are streamed in the order they were found, not by operation
+    assert sorted(failures, key=json.dumps) == sorted(
+        report["validationFailures"], key=json.dumps
+    )
+    assert summary == {
+        "type": "summary",
+        "rowCount": 13,
+        "rowCountIsExact": True,
+        "failureCount": 11,
+        "failureCountIsExact": True,
+    }
+
+
+def test_run_several_workflows(db_with_user: Session, sample_workflow: DBWorkflow):
+    schema = WorkflowSchema.model_validate(json.loads(SAMPLE_SCHEMA_PATH.read_text()))
+    # a workflow that only checks the file type and the row count
+    schema.operations = [
+        operation
+        for operation in schema.operations
+        if operation.type != "fieldsetSchemaValidation"
+    ]
+    other_workflow = DBWorkflow(title="Other", owner=MOCK_USER_ID, schema=schema)
+    db_with_user.add(other_workflow)
+    db_with_user.commit()
+    inputs = {"fieldset_schema": "demographic_fields"}
+
+    with mock.patch.object(
+        views, "upload_resource", wraps=views.upload_resource
+    ) as upload_resource:
+        response = client.post(
+            "/api/workflows/run",
+            files={"file": ("bad.csv", BAD_DATA_PATH.read_bytes(), "text/csv")},
+            data={
+                "workflow_runs": json.dumps(
+                    [
+                        {"workflowId": sample_workflow.id, "workflowInputs": inputs},
+                        {"workflowId": other_workflow.id, "workflowInputs": inputs},
+                    ]
+                )
+            },
+        )
+    assert response.status_code == 200
+    upload_resource.assert_called_once()
+    sample_report, other_report = response.json()
+    assert sample_report == run_sample_workflow(sample_workflow).json()
+    assert other_report["workflowId"] == other_workflow.id
+    assert other_report["rowCount"] == 13
+    assert other_report["failureCount"] < sample_report["failureCount"]
+
+
+@pytest.mark.usefixtures("sample_workflow")
+def test_run_several_workflows_errors():
+    def run_workflows(workflow_runs: str):
+        return client.post(
+            "/api/workflows/run",
+            files={"file": ("bad.csv", BAD_DATA_PATH.read_bytes(), "text/csv")},
+            data={"workflow_runs": workflow_runs},
+        )
+
+    assert run_workflows("[]").status_code == 400
+    assert run_workflows('[{"workflowId": 1}]').status_code == 422
+    unknown_workflow = [{"workflowId": "unknown", "workflowInputs": {}}]
+    assert run_workflows(json.dumps(unknown_workflow)).status_code == 404
+
+
+def test_run_workflow_profiled(sample_workflow: DBWorkflow):
+    data = run_sample_workflow(sample_workflow, profile="true").json()
+    assert data["rowCount"] == 13
+    timings = data["timings"]
+    assert timings["totalSeconds"] > 0
+    assert timings["rowsPerSecond"] > 0
+    assert [operation["type"] for operation in timings["operations"]] == [
+        "fileTypeValidation",
+        "rowCountValidation",
+        "fieldsetSchemaValidation",
+    ]
+
+    assert run_sample_workflow(sample_workflow).json()["timings"] is None
+
+    response = run_sample_workflow(sample_workflow, stream="true", profile="true")
+    summary = json.loads(response.text.splitlines()[-1])
+    assert summary["timings"]["totalSeconds"] > 0
+
+    response = run_sample_workflow(sample_workflow, parallel="true", profile="true")
+    assert response.status_code == 400
+
+
+def test_run_workflow_streamed_in_parallel(sample_workflow: DBWorkflow):
+    response = run_sample_workflow(sample_workflow, stream="true", parallel="true")
+    assert response.status_code == 400
+
+
+def queue_sample_workflow_job(workflow: DBWorkflow, **form: str) -> str:
+    response = client.post(
+        f"/api/workflows/{workflow.id}/jobs",
+        files={"file": ("bad.csv", BAD_DATA_PATH.read_bytes(), "text/csv")},
+        data={
+            "workflow_inputs": json.dumps({"fieldset_schema": "demographic_fields"}),
+            **form,
+        },
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "queued"
+    assert data["rowsProcessed"] == 0
+    return data["id"]
+
+
+def worker_session(session: Session) -> Session:
+    """A session of its own for a worker, on the test database."""
+    return sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())()
+
+
+def test_workflow_run_job(sample_workflow: DBWorkflow, db_with_user: Session):
+    job_id = queue_sample_workflow_job(sample_workflow)
+    job = db_with_user.get(DBWorkflowRunJob, job_id)
+    assert job is not None
+    upload_path = job.upload_path
+    assert Path(upload_path).read_bytes() == BAD_DATA_PATH.read_bytes()
+
+    response = client.get(f"/api/jobs/{job_id}/report")
+    assert response.status_code == 409
+    assert response.json()["detail"] == f"Job {job_id} is queued."
+
+    with worker_session(db_with_user) as session:
+        job = jobs.claim_next_job(session, "test-worker")
+        assert job is not None and job.id == job_id
+        assert jobs.claim_next_job(session, "test-worker") is None
+        jobs.run_job(session, job, "test-worker")
+
+    response = client.get(f"/api/jobs/{job_id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "succeeded"
+    assert data["rowsProcessed"] == 13
+    assert data["finishedDate"] is not None
+    assert not Path(upload_path).exists()
+
+    response = client.get(f"/api/jobs/{job_id}/report")
+    assert response.status_code == 200
+    assert response.json() == run_sample_workflow(sample_workflow).json()
+
+
+def test_workflow_run_job_not_queued(sample_workflow: DBWorkflow):
+    with tempfile.TemporaryDirectory() as upload_dir:
+        with (
+            mock.patch.object(settings, "UPLOAD_DIR", upload_dir),
+            mock.patch.object(
+                views, "_commit_or_rollback", side_effect=RuntimeError("insert failed")
+            ),
+            pytest.raises(RuntimeError),
+        ):
+            _ = queue_sample_workflow_job(sample_workflow)
+        # the upload was spooled, then removed since no job tracks it
+        assert not os.listdir(upload_dir)
+
+
+def test_failed_workflow_run_job(sample_workflow: DBWorkflow, db_with_user: Session):
+    job_id = queue_sample_workflow_job(sample_workflow)
+
+    with worker_session(db_with_user) as session:
+        job = jobs.claim_next_job(session, "test-worker")
+        assert job is not None
+        with mock.patch.object(
+            jobs, "execute_workflow", side_effect=RuntimeError("boom")
+        ):
+            jobs.run_job(session, job, "test-worker")
+
+    data = client.get(f"/api/jobs/{job_id}").json()
+    assert data["status"] == "failed"
+    assert data["error"] == jobs.FAILED_RUN_ERROR
+
+    response = client.get(f"/api/jobs/{job_id}/report")
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"] == f"Job {job_id} is failed. {jobs.FAILED_RUN_ERROR}"
+    )
+
+
+@pytest.mark.usefixtures("db_with_user")
+def test_workflow_run_job_not_found():
+    response = client.get(f"/api/jobs/{uuid.uuid4()}")
+    assert response.status_code == 404
+
+
+def test_workflow_run_job_is_claimed_once(
+    sample_workflow: DBWorkflow, db_with_user: Session
+):
+    job_id = queue_sample_workflow_job(sample_workflow)
+
+    # both workers saw the job queued, only the first update claims it
+    with worker_session(db_with_user) as first, worker_session(db_with_user) as second:
+        assert jobs.claim_job(first, job_id, "first-worker")
+        assert not jobs.claim_job(second, job_id, "second-worker")
+
+    db_with_user.expire_all()
+    job = db_with_user.get(DBWorkflowRunJob, job_id)
+    assert job is not None and job.worker_id == "first-worker"
+
+
+def test_abandoned_workflow_run_job_is_claimed_again(
+    sample_workflow: DBWorkflow, db_with_user: Session
+):
+    job_id = queue_sample_workflow_job(sample_workflow)
+
+    with worker_session(db_with_user) as session:
+        assert jobs.claim_job(session, job_id, "dead-worker")
+        assert jobs.claim_next_job(session, "other-worker") is None
+
+        # the first worker stopped renewing its lease
+        job = session.get(DBWorkflowRunJob, job_id)
+        assert job is not None and job.heartbeat_date is not None
+        job.heartbeat_date = job.heartbeat_date - jobs.JOB_LEASE * 2
+        session.commit()
+
+        job = jobs.claim_next_job(session, "other-worker")
+        assert job is not None and job.worker_id == "other-worker"
+
+
+def test_workflow_run_job_heartbeat(sample_workflow: DBWorkflow, db_with_user: Session):
+    job_id = queue_sample_workflow_job(sample_workflow)
+    execute_workflow = jobs.execute_workflow
+    heartbeats: list[tuple[datetime, datetime]] = []
+
+    def heartbeat_date() -> datetime:
+        with worker_session(db_with_user) as session:
+            job = session.get(DBWorkflowRunJob, job_id)
+            assert job is not None and job.heartbeat_date is not None
+            return job.heartbeat_date
+
+    def run_without_progress(**kwargs):
+        claimed = heartbeat_date()
+        time.sleep(0.5)
+        heartbeats.append((claimed, heartbeat_date()))
+        return execute_workflow(**kwargs)
+
+    with (
+        worker_session(db_with_user) as session,
+        mock.patch.object(jobs, "HEARTBEAT_INTERVAL", timedelta(seconds=0.05)),
+        mock.patch.object(jobs, "execute_workflow", side_effect=run_without_progress),
+    ):
+        job = jobs.claim_next_job(session, "test-worker")
+        assert job is not None
+        jobs.run_job(session, job, "test-worker")
+
+    # the lease was renewed while the run recorded no progress
+    [(claimed, renewed)] = heartbeats
+    assert renewed > claimed
+    assert client.get(f"/api/jobs/{job_id}").json()["status"] == "succeeded"
+
+
+def test_job_worker_pool(sample_workflow: DBWorkflow, db_with_user: Session):
+    job_ids = [queue_sample_workflow_job(sample_workflow) for _ in range(4)]
+
+    pool = jobs.JobWorkerPool(
+        lambda: worker_session(db_with_user), workers=3, poll_interval=0.05
+    )
+    with mock.patch.object(
+        jobs, "execute_workflow", wraps=jobs.execute_workflow
+    ) as execute_workflow:
+        pool.start()
+        statuses: list[str] = []
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            statuses = [
+                client.get(f"/api/jobs/{job_id}").json()["status"] for job_id in job_ids
+            ]
+            if all(status == "succeeded" for status in statuses):
+                break
+            time.sleep(0.05)
+        pool.stop()
+
+    assert statuses == ["succeeded"] * 4
+    # each job was run by a single worker
+    assert execute_workflow.call_count == 4
+
+
+def read_metrics() -> dict[str, float]:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return {
+        sample: float(value)
+        for sample, value in (
+            line.rsplit(" ", 1)
+            for line in response.text.splitlines()
+            if not line.startswith("#")
+        )
+    }
+
+
+def test_metrics(sample_workflow: DBWorkflow):
+    before = read_metrics()
+    assert run_sample_workflow(sample_workflow).status_code == 200
+    assert run_sample_workflow(sample_workflow, stream="true").status_code == 200
+    after = read_metrics()
+
+    def increase(sample: str) -> float:
+        return after[sample] - before.get(sample, 0)
+
+    assert increase("smooshr_validated_rows_total") == 2 * 13
+    assert increase("smooshr_emitted_failures_total") == 2 * 11
+    assert increase("smooshr_validated_bytes_total") == 2 * len(
+        BAD_DATA_PATH.read_bytes()
+    )
+    route = 'route="run_workflow",method="POST"'
+    assert increase(f'smooshr_http_requests_total{{{route},status="200"}}') == 2
+    assert increase(f"smooshr_http_request_duration_seconds_count{{{route}}}") == 2
+    assert (
+        increase(f'smooshr_http_request_duration_seconds_bucket{{{route},le="+Inf"}}')
+        == 2
+    )
+    # the second run found the workflow in the cache
+    assert 'smooshr_cache_hits_total{cache="workflow"}' in after
+    assert 0 < after['smooshr_cache_hit_ratio{cache="workflow"}'] <= 1
+
+
+def test_api_key_lookup_metrics():
+    lookups = api_key_lookup_latency.count(provider=views.KEY_PROVIDER_CLASS.__name__)
+    provider = mock.Mock()
+    provider.get_user_and_expiration.return_value = None
+    with mock.patch.object(views, "get_api_key_provider", return_value=provider):
+        assert views._get_api_key_user_id("unknown_key") is None
+    assert (
+        api_key_lookup_latency.count(provider=views.KEY_PROVIDER_CLASS.__name__)
+        == lookups + 1
+    )
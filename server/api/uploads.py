@@ -0,0 +1,94 @@
+"""Load uploaded files without holding them in memory.
+
+Uploads up to a configurable size are validated from memory. Larger uploads are
+copied to a temporary file in chunks, so that Frictionless reads them from disk
+through a buffered stream and only a chunk of the file is in memory at a time.
+
+Either way the upload is read once, in chunks, which can also be hashed on the way,
+e.g. to look up the reports of earlier runs on the same file.
+"""
+
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import BinaryIO, Protocol
+
+from frictionless import Resource
+
+from server.workflow_runner.validators import csv_resource
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class Digest(Protocol):
+    """A hash of the contents of an upload, e.g. from `hashlib`, which is updated
+    with each chunk of the upload as it's read."""
+
+    def update(self, data: bytes, /) -> None: ...
+
+
+def spool_upload(
+    file: BinaryIO,
+    directory: str | None = None,
+    head: list[bytes] | None = None,
+    digest: Digest | None = None,
+) -> str:
+    """Copy an uploaded file to a new file on disk, in chunks, and return its path.
+    `head` holds the chunks of the upload that were already read from `file`, and
+    the chunks read from `file` are added to `digest`."""
+    with tempfile.NamedTemporaryFile(
+        suffix=".csv", prefix="upload-", dir=directory, delete=False
+    ) as spooled_file:
+        for chunk in head or []:
+            _ = spooled_file.write(chunk)
+        while chunk := file.read(UPLOAD_CHUNK_BYTES):
+            if digest:
+                digest.update(chunk)
+            _ = spooled_file.write(chunk)
+    return spooled_file.name
+
+
+@contextmanager
+def spooled_upload(file: BinaryIO, directory: str | None = None) -> Iterator[str]:
+    """Spool an uploaded file to disk, and remove it on exit."""
+    path = spool_upload(file, directory)
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
+@contextmanager
+def upload_resource(
+    file: BinaryIO,
+    max_memory_bytes: int,
+    directory: str | None = None,
+    digest: Digest | None = None,
+) -> Iterator[Resource]:
+    """Load an uploaded csv file as a Frictionless Resource. The file is kept in
+    memory if it's at most `max_memory_bytes` long, and otherwise spooled to a
+    temporary file in `directory` that is removed on exit. A compressed upload is
+    kept compressed, and decompressed while the Resource is read.
+
+    The whole upload is added to `digest` by the time the Resource is returned,
+    before the Resource is read."""
+    head: list[bytes] = []
+    size = 0
+    while chunk := file.read(UPLOAD_CHUNK_BYTES):
+        if digest:
+            digest.update(chunk)
+        head.append(chunk)
+        size += len(chunk)
+        if size > max_memory_bytes:
+            break
+    else:
+        yield csv_resource(b"".join(head))
+        return
+
+    path = spool_upload(file, directory, head, digest)
+    del head
+    try:
+        yield csv_resource(path)
+    finally:
+        os.remove(path)
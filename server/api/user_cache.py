@@ -0,0 +1,108 @@
+"""An in-process cache of the users that authenticate requests.
+
+Every authenticated request looks up its user, by the `oid` of its Azure token or
+the owner of its API key. The cache keeps a snapshot of the most recently seen
+users, detached from any session, for a short time, so that most requests don't
+need a database round trip to authenticate.
+
+Concurrent requests for a user that isn't cached wait for the first one to load
+it, so that e.g. the first login of a user who opens several tabs at once only
+inserts the user once.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
+from server.models.user.db_model import DBUser
+
+DEFAULT_USER_CACHE_TTL = timedelta(seconds=60)
+DEFAULT_USER_CACHE_SIZE = 10_000
+
+
+class UserCache:
+    """A thread-safe LRU cache of detached users by id, holding at most `max_size`
+    users for at most `ttl` each."""
+
+    def __init__(
+        self,
+        ttl: timedelta = DEFAULT_USER_CACHE_TTL,
+        max_size: int = DEFAULT_USER_CACHE_SIZE,
+    ):
+        self.ttl: timedelta = ttl
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        # user id -> (user, when the entry expires, in monotonic time)
+        self._users: OrderedDict[str, tuple[DBUser, float]] = OrderedDict()
+        # user id -> the load of a user that isn't cached, which concurrent
+        # requests for the same user wait for
+        self._loading: dict[str, asyncio.Future[DBUser | None]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, user_id: str) -> DBUser | None:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                user, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._users.move_to_end(user_id)
+                    self.hits += 1
+                    return user
+                del self._users[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user: DBUser):
+        """Cache a user, which must be detached from its session."""
+        expires_at = time.monotonic() + self.ttl.total_seconds()
+        with self._lock:
+            self._users[user.id] = (user, expires_at)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_size:
+                _ = self._users.popitem(last=False)
+
+    async def load(
+        self, user_id: str, load_user: Callable[[], Awaitable[DBUser | None]]
+    ) -> DBUser | None:
+        """Get a user from the cache, or with `load_user` if it isn't cached, which
+        returns the user detached from its session, or None if there is no such
+        user. While a user is loaded, concurrent loads of the same user in the same
+        event loop wait for it, and only load the user themselves if it fails."""
+        user = self.get(user_id)
+        if user is not None:
+            return user
+
+        loop = asyncio.get_running_loop()
+        pending = self._loading.get(user_id)
+        if pending is not None and pending.get_loop() is loop:
+            _ = await asyncio.wait([pending])
+            if not pending.cancelled():
+                return pending.result()
+
+        loading: asyncio.Future[DBUser | None] = loop.create_future()
+        self._loading[user_id] = loading
+        try:
+            user = await load_user()
+            if user is not None:
+                self.put(user)
+            loading.set_result(user)
+            return user
+        finally:
+            # if the load failed, the waiting loads load the user themselves
+            _ = loading.cancel()
+            if self._loading.get(user_id) is loading:
+                del self._loading[user_id]
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            _ = self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
@@ -1,47 +1,118 @@
 """Entry point for the API server"""
 
+import asyncio
+import base64
+import binascii
+import hashlib
 import json
 import logging
-from collections.abc import Generator
-from contextlib import contextmanager
-from datetime import datetime
-from typing import Any, ClassVar, Generator, Optional
+import os
+from collections.abc import AsyncIterator, Callable, Generator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import Any, ClassVar, Generator, Optional, TypeVar
 import secrets
-from functools import cache
+from functools import cache, partial
 
 from fastapi.security import APIKeyHeader
 import frictionless.exception
-from fastapi import Depends, FastAPI, Form, HTTPException, Security, UploadFile
+from fastapi import (
+    Depends,
+    FastAPI,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    Security,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.routing import APIRoute
 from fastapi_azure_auth import B2CMultiTenantAuthorizationCodeBearer
 from fastapi_azure_auth.user import User as AzureUser
-from frictionless import Resource
-from pydantic import AnyHttpUrl, Field
+from pydantic import AnyHttpUrl, Field, TypeAdapter, ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, undefer
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 
 from server.api.api_keys.db_api_key_provider import DbApiKeyProvider
 from server.api.api_keys.azure_api_key_provider import AzureApiKeyProvider
-from server.database import SessionLocal
+from server.api.api_keys.api_key_provider import ApiKeyProvider
+from server.api.api_keys.caching_api_key_provider import (
+    DEFAULT_API_KEY_CACHE_SIZE,
+    DEFAULT_API_KEY_CACHE_TTL,
+    ApiKeyCache,
+    CachingApiKeyProvider,
+)
+from server.api.jobs import JobWorkerPool
+from server.api.report_cache import (
+    DEFAULT_REPORT_CACHE_BYTES,
+    RunReportCache,
+    run_report_key,
+)
+from server.api.metrics import (
+    CONTENT_TYPE,
+    CallbackMetric,
+    Counter,
+    Histogram,
+    LabelValues,
+    MetricsRegistry,
+    RequestMetricsMiddleware,
+)
+from server.api.uploads import spool_upload, spooled_upload, upload_resource
+from server.api.user_cache import (
+    DEFAULT_USER_CACHE_SIZE,
+    DEFAULT_USER_CACHE_TTL,
+    UserCache,
+)
+from server.api.workflow_cache import (
+    DEFAULT_WORKFLOW_CACHE_SIZE,
+    CachedWorkflow,
+    WorkflowCache,
+)
+from server.database import AsyncSessionLocal, SessionLocal
 from server.models.apikey.api_schemas import ApiKey, ApiKeyCreate, ApiKeyDelete
+from server.models.job.api_schemas import WorkflowRunJob
+from server.models.job.db_model import DBWorkflowRunJob
 from server.models.user.api_schemas import User
 from server.models.user.db_model import DBUser
 from server.models.workflow.api_schemas import (
     BaseWorkflow,
     FullWorkflow,
+    ValidationFailure,
     WorkflowCreate,
+    WorkflowRunInputs,
     WorkflowRunReport,
+    WorkflowRunStreamFailure,
+    WorkflowRunStreamHeader,
+    WorkflowRunStreamSummary,
     WorkflowUpdate,
 )
 from server.models.workflow.db_model import DBWorkflow
 from server.models.workflow.workflow_schema import WorkflowSchema
+from server.workflow_runner.plan import CompiledWorkflow
 from server.workflow_runner.validators import WorkflowParamValue
-from server.workflow_runner.workflow_runner import process_workflow
+from server.workflow_runner.parallel import (
+    ChunkValidationPool,
+    execute_workflow_parallel,
+)
+from server.workflow_runner.workflow_runner import (
+    WorkflowRunResult,
+    WorkflowRun,
+    execute_workflow,
+    execute_workflows,
+    stream_workflow,
+)
 
 LOG = logging.getLogger(__name__)
+T = TypeVar("T")
 
 logging.basicConfig(
     level=logging.INFO,
@@ -61,9 +132,38 @@ class Settings(BaseSettings):
     AZURE_B2C_SCOPES: str = Field(default="")
 
     AZURE_KEY_VAULT_URL: str = Field(default="")
+
+    # number of threads that run queued workflow run jobs in each server process
+    JOB_WORKERS: int = Field(default=2)
+    # uploads larger than this are spooled to disk instead of validated in memory
+    UPLOAD_MAX_MEMORY_BYTES: int = Field(default=16 * 1024 * 1024)
+    # where uploads are spooled, the temp directory if empty
+    UPLOAD_DIR: str = Field(default="")
+    # number of parsed workflows kept in memory for runs, in each server process
+    WORKFLOW_CACHE_SIZE: int = Field(default=DEFAULT_WORKFLOW_CACHE_SIZE)
+    # how long API key lookups are cached, and how many of them. Deleted keys are
+    # still accepted by the other server processes until their lookups expire
+    API_KEY_CACHE_TTL_SECONDS: float = Field(
+        default=DEFAULT_API_KEY_CACHE_TTL.total_seconds()
+    )
+    API_KEY_CACHE_SIZE: int = Field(default=DEFAULT_API_KEY_CACHE_SIZE)
+    # how long the users that authenticate requests are cached, and how many of them
+    USER_CACHE_TTL_SECONDS: float = Field(
+        default=DEFAULT_USER_CACHE_TTL.total_seconds()
+    )
+    USER_CACHE_SIZE: int = Field(default=DEFAULT_USER_CACHE_SIZE)
+    # number of threads that validate files for workflow runs, in each server process
+    VALIDATION_WORKERS: int = Field(default=4)
+    # number of processes that validate the chunks of parallel workflow runs, shared
+    # by the runs of each server process. The number of CPUs if unset
+    PARALLEL_VALIDATION_WORKERS: Optional[int] = Field(default=None)
+    # where the reports of workflow runs are cached, for runs of the same file with
+    # the same workflow and params, and how many bytes of them. Not cached if empty
+    RUN_REPORT_CACHE_DIR: str = Field(default="")
+    RUN_REPORT_CACHE_BYTES: int = Field(default=DEFAULT_REPORT_CACHE_BYTES)
       
     model_config: ClassVar[SettingsConfigDict] = SettingsConfigDict(
-        env_file=".env.server", case_sensitive=True
+        env_file=".env.server", case_sensitive=True, extra="ignore"
     )
 
 
@@ -79,10 +179,46 @@ def generate_api_key() -> str:
     return secrets.token_hex(20)
 
 settings = Settings()
+workflow_cache = WorkflowCache(settings.WORKFLOW_CACHE_SIZE)
+run_report_cache = (
+    RunReportCache(settings.RUN_REPORT_CACHE_DIR, settings.RUN_REPORT_CACHE_BYTES)
+    if settings.RUN_REPORT_CACHE_DIR
+    else None
+)
+
+# workflow runs are validated in these threads rather than on the event loop, and
+# don't hold up the threads that serve the sync endpoints
+validation_executor = ThreadPoolExecutor(
+    max_workers=settings.VALIDATION_WORKERS, thread_name_prefix="validation"
+)
+# the chunks of parallel workflow runs are validated in these processes, which are
+# spawned on the first parallel run
+chunk_validation_pool = ChunkValidationPool(settings.PARALLEL_VALIDATION_WORKERS)
+
+# the most workflows that can be listed in one page, and the header that holds the
+# cursor of the next page
+MAX_WORKFLOWS_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# the most workflows that can be run on one upload at once
+MAX_WORKFLOWS_PER_UPLOAD = 10
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Run the workflow run job workers while the server is up, and stop the
+    processes of parallel runs on shutdown."""
+    job_worker_pool = JobWorkerPool(workers=settings.JOB_WORKERS)
+    job_worker_pool.start()
+    yield
+    job_worker_pool.stop()
+    chunk_validation_pool.shutdown()
+
 
 app = FastAPI(
     title="Smooshr2 API",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -91,6 +227,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -123,6 +260,118 @@ def get_kv_client():
 # Change this to switch between Azure and DB key providers
 KEY_PROVIDER_CLASS = AzureApiKeyProvider
 
+# API key lookups are cached across requests, so that authenticating a request
+# doesn't need a Key Vault round trip every time
+api_key_cache = ApiKeyCache(
+    ttl=timedelta(seconds=settings.API_KEY_CACHE_TTL_SECONDS),
+    max_size=settings.API_KEY_CACHE_SIZE,
+)
+
+# so are the users they belong to, detached from the session that loaded them, so
+# that authenticating a request doesn't need a database round trip every time
+user_cache = UserCache(
+    ttl=timedelta(seconds=settings.USER_CACHE_TTL_SECONDS),
+    max_size=settings.USER_CACHE_SIZE,
+)
+
+# metrics of this server process, served by /metrics
+metrics = MetricsRegistry()
+request_count = metrics.register(
+    Counter(
+        "smooshr_http_requests_total",
+        "HTTP requests, by route, method and status.",
+        ["route", "method", "status"],
+    )
+)
+request_latency = metrics.register(
+    Histogram(
+        "smooshr_http_request_duration_seconds",
+        "Time to respond to HTTP requests, by route and method.",
+        ["route", "method"],
+    )
+)
+validated_bytes = metrics.register(
+    Counter(
+        "smooshr_validated_bytes_total",
+        "Bytes of the files uploaded to workflow runs.",
+    )
+)
+validated_rows = metrics.register(
+    Counter("smooshr_validated_rows_total", "Rows read by workflow runs.")
+)
+emitted_failures = metrics.register(
+    Counter(
+        "smooshr_emitted_failures_total",
+        "Validation failures reported by workflow runs.",
+    )
+)
+api_key_lookup_latency = metrics.register(
+    Histogram(
+        "smooshr_api_key_lookup_duration_seconds",
+        "Time to look up the user of an API key, cached lookups included.",
+        ["provider"],
+    )
+)
+
+
+def _cache_lookups() -> dict[str, tuple[int, int]]:
+    """The hits and misses of each cache of this server process."""
+    lookups = {
+        "workflow": (workflow_cache.hits, workflow_cache.misses),
+        "api_key": (api_key_cache.hits, api_key_cache.misses),
+        "user": (user_cache.hits, user_cache.misses),
+    }
+    if run_report_cache:
+        lookups["run_report"] = (run_report_cache.hits, run_report_cache.misses)
+    return lookups
+
+
+def _cache_hit_ratios() -> dict[LabelValues, float]:
+    return {
+        (cache,): hits / (hits + misses)
+        for cache, (hits, misses) in _cache_lookups().items()
+        if hits + misses
+    }
+
+
+metrics.register(
+    CallbackMetric(
+        "smooshr_cache_hits_total",
+        "Lookups that were found in a cache.",
+        "counter",
+        lambda: {(cache,): hits for cache, (hits, _) in _cache_lookups().items()},
+        ["cache"],
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "smooshr_cache_misses_total",
+        "Lookups that were missing from a cache.",
+        "counter",
+        lambda: {(cache,): misses for cache, (_, misses) in _cache_lookups().items()},
+        ["cache"],
+    )
+)
+metrics.register(
+    CallbackMetric(
+        "smooshr_cache_hit_ratio",
+        "Share of the lookups of a cache that were hits.",
+        "gauge",
+        _cache_hit_ratios,
+        ["cache"],
+    )
+)
+
+app.add_middleware(
+    RequestMetricsMiddleware, requests=request_count, latency=request_latency
+)
+
+def get_api_key_provider(session: Session) -> ApiKeyProvider:
+    """Get the API key provider, with its lookups cached."""
+    return CachingApiKeyProvider(
+        KEY_PROVIDER_CLASS(session, kv_client=get_kv_client()), api_key_cache
+    )
+
 @contextmanager
 def _commit_or_rollback(session: Session):
     # Helper function to commit or rollback a session
@@ -142,75 +391,111 @@ def get_session() -> Generator[Session, Any, None]:
     finally:
         session.close()
 
-def get_current_user(
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Get an async DB session, for the async endpoints"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+@asynccontextmanager
+async def _commit_or_rollback_async(session: AsyncSession):
+    # Helper function to commit or rollback an async session
+    try:
+        yield
+        await session.commit()
+    except:
+        await session.rollback()
+        raise
+
+async def get_current_user(
     azure_user: Optional[AzureUser] = Depends(azure_scheme),
     api_key: Optional[str] = Depends(api_key_scheme),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> DBUser:
     """This function authenticates and returns the currently signed in user. This function
     supports both Azure and API key authentication."""
     if azure_user is not None:
-        return _get_current_user_from_azure(azure_user, session=session)
+        return await _get_current_user_from_azure(azure_user, session=session)
     elif api_key is not None:
-        return _get_current_user_from_api_key(api_key, session=session)
+        return await _get_current_user_from_api_key(api_key, session=session)
     else:
         raise HTTPException(
             status_code=401, detail="Not authenticated."
         )
 
-def get_current_user_no_api_key(
+async def get_current_user_no_api_key(
     azure_user: AzureUser = Depends(azure_scheme),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> DBUser:
     """This function authenticates and returns the currently signed in user. This function
     supports only Azure authentication, and should be used for private API endpoints that are
     only accessible via the Smooshr2 frontend."""
-    return get_current_user(azure_user, api_key=None, session=session)
+    return await get_current_user(azure_user, api_key=None, session=session)
+
+def _get_api_key_user_id(api_key: str) -> Optional[str]:
+    """Looks up the user of an API key. The key providers are sync and may call Key
+    Vault, so this runs in the threadpool."""
+    with SessionLocal() as session, api_key_lookup_latency.time(
+        provider=KEY_PROVIDER_CLASS.__name__
+    ):
+        result = get_api_key_provider(session).get_user_and_expiration(api_key)
+
+    return result[0] if result else None
 
-def _get_current_user_from_api_key(
+async def _get_current_user_from_api_key(
     api_key: str = Depends(api_key_scheme),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> DBUser:
     """This function returns the currently authenticated user given an API key."""
-    api_key_provider = KEY_PROVIDER_CLASS(session, azure_kv_client)
-    result = api_key_provider.get_user_and_expiration(api_key)
+    user_id = await run_in_threadpool(_get_api_key_user_id, api_key)
 
-    if result is None:
+    if user_id is None:
         raise HTTPException(
             status_code=401, detail="Invalid or expired API key."
         )
 
-    user_id, _ = result
-    db_user = session.get(DBUser, user_id)
+    async def load_user() -> Optional[DBUser]:
+        db_user = await session.get(DBUser, user_id)
+        if db_user:
+            session.expunge(db_user)
+        return db_user
 
-    return db_user 
+    return await user_cache.load(user_id, load_user)
 
-def _get_current_user_from_azure(
+async def _get_current_user_from_azure(
     azure_user: AzureUser = Depends(azure_scheme),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> DBUser:
     """This function returns the currently authenticated user given an AzureUser."""
-    # check if the azure user exists in our database already
     user_id: str = azure_user.claims.get("oid", "")
 
-    db_user = session.get(DBUser, user_id)
-
-    if db_user:
+    async def load_or_create_user() -> DBUser:
+        # check if the azure user exists in our database already
+        db_user = await session.get(DBUser, user_id)
+
+        if not db_user:
+            # user doesn't exist yet, so create the user
+            token = azure_user.claims
+            db_user = DBUser(
+                id=user_id,
+                email=token.get("emails", ["no_email"])[0],
+                identity_provider=token.get("idp", "local"),
+                family_name=token.get("family_name", ""),
+                given_name=token.get("given_name", ""),
+            )
+            session.add(db_user)
+            try:
+                await session.commit()
+                await session.refresh(db_user)
+            except IntegrityError:
+                # another server process created the user first
+                await session.rollback()
+                db_user = await session.get(DBUser, user_id)
+
+        session.expunge(db_user)
         return db_user
 
-    # user doesn't exist yet, so create the user
-    token = azure_user.claims
-    new_db_user = DBUser(
-        id=user_id,
-        email=token.get("emails", ["no_email"])[0],
-        identity_provider=token.get("idp", "local"),
-        family_name=token.get("family_name", ""),
-        given_name=token.get("given_name", ""),
-    )
-    session.add(new_db_user)
-    session.commit()
-    session.refresh(new_db_user)
-    return new_db_user
+    # concurrent first logins of a user wait for the first one to create the user
+    return await user_cache.load(user_id, load_or_create_user)
 
 def fetch_workflow_or_raise(
     workflow_id: str, session: Session, user: DBUser
@@ -236,41 +521,157 @@ def fetch_workflow_or_raise(
     return workflow
 
 
+async def fetch_workflow_or_raise_async(
+    workflow_id: str, session: AsyncSession, user: DBUser, with_schema: bool = True
+) -> DBWorkflow:
+    """Async version of `fetch_workflow_or_raise`. The schema of the workflow can't
+    be lazily loaded in async code: it's loaded along with the workflow, unless
+    `with_schema` is False."""
+    query = select(DBWorkflow).where(DBWorkflow.id == workflow_id)
+    if with_schema:
+        query = query.options(undefer(DBWorkflow.schema))
+    workflow = await session.scalar(query)
+
+    if not workflow:
+        raise HTTPException(
+            status_code=404, detail=f"Workflow with id {workflow_id} was not found."
+        )
+
+    if workflow.owner != user.id:
+        raise HTTPException(
+            status_code=404, detail=f"Workflow {workflow_id} not found."
+        )
+
+    return workflow
+
+
+def fetch_compiled_workflow_or_raise(
+    workflow_id: str, session: Session, user: DBUser
+) -> CompiledWorkflow:
+    """Fetches the parsed schema of a workflow, ready to run, from the workflow
+    cache or the database. Raises the same exceptions as `fetch_workflow_or_raise`."""
+    return fetch_cached_workflow_or_raise(workflow_id, session, user).workflow
+
+
+def fetch_cached_workflow_or_raise(
+    workflow_id: str, session: Session, user: DBUser
+) -> CachedWorkflow:
+    """Like `fetch_compiled_workflow_or_raise`, along with the hash of the schema."""
+
+    cached = workflow_cache.load(session, workflow_id)
+
+    if not cached:
+        raise HTTPException(
+            status_code=404, detail=f"Workflow with id {workflow_id} was not found."
+        )
+
+    if cached.owner != user.id:
+        raise HTTPException(
+            status_code=404, detail=f"Workflow {workflow_id} not found."
+        )
+
+    return cached
+
+
+def fetch_job_or_raise(job_id: str, session: Session, user: DBUser) -> DBWorkflowRunJob:
+    """Fetches a workflow run job orm object with the given job_id from the
+    database, or raises an exception if the job cannot be found, or if the
+    user did not queue the job."""
+    # jobs are updated by the workers' sessions: always read their current state
+    job = session.get(DBWorkflowRunJob, job_id, populate_existing=True)
+
+    if not job or job.owner != user.id:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+
+    return job
+
+
 @app.get(
     "/api/users/self",
     dependencies=[Security(azure_scheme)],
     tags=["users"],
 )
-def get_self_user(user: DBUser = Depends(get_current_user)) -> User:
+async def get_self_user(user: DBUser = Depends(get_current_user)) -> User:
     """Get the currently signed in user"""
     return user
 
 
 @app.get("/api/workflows/{workflow_id}", tags=["workflows"])
-def get_workflow(
+async def get_workflow(
     workflow_id: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user: DBUser = Depends(get_current_user),
 ) -> FullWorkflow:
     """Get a workflow by ID"""
-    db_workflow = fetch_workflow_or_raise(workflow_id, session, user)
+    db_workflow = await fetch_workflow_or_raise_async(workflow_id, session, user)
     return FullWorkflow.model_validate(db_workflow)
 
 
+def _encode_workflows_cursor(workflow: BaseWorkflow) -> str:
+    position = json.dumps([workflow.created_date.isoformat(), workflow.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _decode_workflows_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_date, workflow_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_date), str(workflow_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor.") from e
+
+
 @app.get("/api/workflows", tags=["workflows"])
-def get_workflows(
-    user: DBUser = Depends(get_current_user), session: Session = Depends(get_session)
+async def get_workflows(
+    response: Response,
+    limit: int | None = Query(default=None, ge=1, le=MAX_WORKFLOWS_PAGE_SIZE),
+    cursor: str | None = None,
+    title_prefix: str | None = None,
+    user: DBUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> list[BaseWorkflow]:
-    """Get all workflows for the current user."""
-    db_workflows = session.query(DBWorkflow).filter(DBWorkflow.owner == user.id).all()
-    return [BaseWorkflow.model_validate(db_workflow) for db_workflow in db_workflows]
+    """Get the workflows of the current user, oldest first.
+
+    Args:
+        limit (int | None): The number of workflows in a page. All of the
+            workflows are returned if there is no limit.
+        cursor (str | None): Where the page starts. When there may be more
+            workflows after a page, the cursor of the next page is sent in the
+            `X-Next-Cursor` header.
+        title_prefix (str | None): Only list the workflows whose title starts
+            with this prefix.
+    """
+    # only the listed columns are read, the schemas can be large. The query is
+    # served by the (owner, created_date, id) index.
+    query = (
+        select(
+            DBWorkflow.id, DBWorkflow.title, DBWorkflow.owner, DBWorkflow.created_date
+        )
+        .where(DBWorkflow.owner == user.id)
+        .order_by(DBWorkflow.created_date, DBWorkflow.id)
+    )
+    if cursor:
+        query = query.where(
+            tuple_(DBWorkflow.created_date, DBWorkflow.id)
+            > _decode_workflows_cursor(cursor)
+        )
+    if title_prefix:
+        query = query.where(DBWorkflow.title.startswith(title_prefix, autoescape=True))
+    if limit:
+        query = query.limit(limit)
+
+    workflows = [
+        BaseWorkflow.model_validate(row) for row in await session.execute(query)
+    ]
+    if limit and len(workflows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = _encode_workflows_cursor(workflows[-1])
+    return workflows
 
 
 @app.post("/api/workflows", tags=["workflows"])
-def create_workflow(
+async def create_workflow(
     workflow_data: WorkflowCreate,
     user: DBUser = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> FullWorkflow:
     """Create a new workflow"""
     db_workflow = DBWorkflow(
@@ -278,58 +679,76 @@ def create_workflow(
         owner=user.id,
         created_date=datetime.now(),
     )
-    with _commit_or_rollback(session):
+    # the workflow's defaults are set on it when it's inserted, it doesn't need to
+    # be loaded again
+    async with _commit_or_rollback_async(session):
         session.add(db_workflow)
-    session.refresh(db_workflow)
 
     return FullWorkflow.model_validate(db_workflow)
 
 
 @app.put("/api/workflows/{workflow_id}", tags=["workflows"])
-def update_workflow(
+async def update_workflow(
     workflow_id: str,
     workflow_data: WorkflowUpdate,
     user: DBUser = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> FullWorkflow:
     """Update a workflow by ID"""
     # TODO - This should be updated to only allow the owner of the workflow
     #        or admins to update it once authentication is implemented.
-    workflow = fetch_workflow_or_raise(workflow_id, session, user)
+    workflow = await fetch_workflow_or_raise_async(workflow_id, session, user)
 
     for key, value in workflow_data.model_dump(by_alias=True).items():
         setattr(workflow, key, value)
 
-    session.commit()
-    session.refresh(workflow)
+    await session.commit()
+    workflow_cache.invalidate(workflow_id)
+    # the deferred schema is only loaded when it's named
+    await session.refresh(workflow, ["title", "owner", "created_date", "schema"])
 
     return FullWorkflow.model_validate(workflow)
 
 
 @app.delete("/api/workflows/{workflow_id}", tags=["workflows"])
-def delete_workflow(
+async def delete_workflow(
     workflow_id: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user: DBUser = Depends(get_current_user),
 ):
     """Delete a workflow by ID"""
     # TODO - This should be updated to only allow the owner of the workflow
     #        or admins to delete it once authentication is implemented.
-    workflow = fetch_workflow_or_raise(workflow_id, session, user)
-    with _commit_or_rollback(session):
-        session.delete(workflow)
+    workflow = await fetch_workflow_or_raise_async(
+        workflow_id, session, user, with_schema=False
+    )
+    async with _commit_or_rollback_async(session):
+        await session.delete(workflow)
+    workflow_cache.invalidate(workflow_id)
 
     return {"message": "Workflow deleted"}
 
 
-@app.post("/api/workflows/{workflow_id}/run", status_code=200, tags=["workflows"])
-def run_workflow(
+@app.post(
+    "/api/workflows/{workflow_id}/run",
+    status_code=200,
+    tags=["workflows"],
+    response_model=WorkflowRunReport,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def run_workflow(
     workflow_id: str,
     file: UploadFile,
     workflow_inputs: str = Form(),
+    max_failures: int | None = Form(default=None, ge=1),
+    max_failures_per_field: int | None = Form(default=None, ge=1),
+    fail_fast: bool = Form(default=False),
+    parallel: bool = Form(default=False),
+    stream: bool = Form(default=False),
+    profile: bool = Form(default=False),
     session: Session = Depends(get_session),
     user: DBUser = Depends(get_current_user),
-) -> WorkflowRunReport:
+) -> WorkflowRunReport | StreamingResponse:
     """Runs the workflow associated with id `workflow_id` on the passed in csv,
     and returns any results or errors from the run. The workflow_id must be
     associated with a workflow the calling user has access to.
@@ -339,57 +758,426 @@ def run_workflow(
         file (UploadFile): The csv file to run the workflow on.
         workflow_inputs (str): The inputs to pass to the workflow. This is a
             stringified JSON object.
+        max_failures (int | None): The maximum number of failures to report.
+        max_failures_per_field (int | None): The maximum number of failures to
+            report for each field.
+        fail_fast (bool): Whether to stop at the first failure.
+        parallel (bool): Whether to validate chunks of a large file in several
+            processes.
+        stream (bool): Whether to stream the report as newline-delimited JSON:
+            a header record, then the failures while they are found, in the order
+            they are found, and a summary record with the row and failure counts.
+            Can't be combined with `parallel`.
+        profile (bool): Whether to add to the report the wall time of each stage
+            of the run, and its throughput. Can't be combined with `parallel`.
     """
     # deserialize the stringified JSON object into a dictionary
     workflow_param_values: dict[str, WorkflowParamValue] = json.loads(workflow_inputs)
 
-    db_workflow = fetch_workflow_or_raise(workflow_id, session, user)
+    # reading and validating the file blocks, so the run is done in the validation
+    # threads
+    run = await _in_validation_executor(
+        partial(
+            _run_workflow,
+            workflow_id=workflow_id,
+            file=file,
+            workflow_param_values=workflow_param_values,
+            max_failures=max_failures,
+            max_failures_per_field=max_failures_per_field,
+            fail_fast=fail_fast,
+            parallel=parallel,
+            stream=stream,
+            profile=profile,
+            session=session,
+            user=user,
+        )
+    )
+    if isinstance(run, WorkflowRunReport):
+        return run
+    return StreamingResponse(
+        _iterate_in_validation_executor(run), media_type="application/x-ndjson"
+    )
+
+
+async def _in_validation_executor(func: Callable[[], T]) -> T:
+    """Call a function in the validation threads, and wait for its result."""
+    return await asyncio.get_running_loop().run_in_executor(validation_executor, func)
+
+
+async def _iterate_in_validation_executor(
+    chunks: Iterator[str],
+) -> AsyncIterator[str]:
+    """Iterate over the records of a streamed workflow run, which are validated as
+    they are read, in the validation threads."""
+    while True:
+        chunk = await _in_validation_executor(partial(next, chunks, None))
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _run_workflow(
+    workflow_id: str,
+    file: UploadFile,
+    workflow_param_values: dict[str, WorkflowParamValue],
+    max_failures: int | None,
+    max_failures_per_field: int | None,
+    fail_fast: bool,
+    parallel: bool,
+    stream: bool,
+    profile: bool,
+    session: Session,
+    user: DBUser,
+) -> WorkflowRunReport | Iterator[str]:
+    """Runs a workflow for `run_workflow`, and returns its report, or the records
+    of the report if it is streamed. The report of a run that is neither streamed,
+    profiled nor parallel is cached, and returned for the next run of the same file
+    with the same workflow and params, without validating the file again."""
+    cached_workflow = fetch_cached_workflow_or_raise(workflow_id, session, user)
+    workflow = cached_workflow.workflow
+    filename = file.filename if file.filename else ""
+    invalid_file_error = _invalid_file_error()
+    # the upload is hashed while it's read, to look up the report in the cache
+    file_hash = (
+        hashlib.sha256()
+        if run_report_cache and not (parallel or stream or profile)
+        else None
+    )
+    report_key: str | None = None
+
+    if parallel and stream:
+        raise HTTPException(
+            status_code=400, detail="A parallel workflow run can't be streamed."
+        )
+    if parallel and profile:
+        raise HTTPException(
+            status_code=400, detail="A parallel workflow run can't be profiled."
+        )
+
+    if parallel:
+        # the worker processes read their chunks of the file from disk
+        with spooled_upload(file.file, settings.UPLOAD_DIR or None) as file_path:
+            try:
+                run_result = execute_workflow_parallel(
+                    file_name=filename,
+                    file_path=file_path,
+                    param_values=workflow_param_values,
+                    schema=workflow,
+                    max_failures=max_failures,
+                    max_failures_per_field=max_failures_per_field,
+                    fail_fast=fail_fast,
+                    pool=chunk_validation_pool,
+                )
+            except frictionless.exception.FrictionlessException as e:
+                raise invalid_file_error from e
+    else:
+        # load the uploaded file to a Frictionless Resource. Large files are spooled
+        # to disk and read from there, instead of being held in memory.
+        with ExitStack() as upload:
+            resource = upload.enter_context(
+                upload_resource(
+                    file.file,
+                    settings.UPLOAD_MAX_MEMORY_BYTES,
+                    settings.UPLOAD_DIR or None,
+                    file_hash,
+                )
+            )
+            if run_report_cache and file_hash:
+                report_key = run_report_key(
+                    file_hash.hexdigest(),
+                    filename,
+                    workflow_id,
+                    cached_workflow.schema_hash,
+                    workflow_param_values,
+                    {
+                        "max_failures": max_failures,
+                        "max_failures_per_field": max_failures_per_field,
+                        "fail_fast": fail_fast,
+                    },
+                )
+                if cached_report := run_report_cache.get(report_key):
+                    return cached_report
+
+            try:
+                # check if the csv is even a valid csv file. Note that this is a stronger
+                # check than what is performed in `process_workflow` because we are checking
+                # for if the file adheres to the csv format, and not just the data within it.
+                # Only a sample is inferred: the rows are counted while the workflow runs,
+                # so the file is only read in full once.
+                resource.infer()
+            except frictionless.exception.FrictionlessException as e:
+                raise invalid_file_error from e
+
+            if stream:
+                # the response streams the run, and removes the upload once done
+                return _stream_run_records(
+                    upload.pop_all(),
+                    stream_workflow(
+                        file_name=filename,
+                        file_contents=resource,
+                        param_values=workflow_param_values,
+                        schema=workflow,
+                        max_failures=max_failures,
+                        max_failures_per_field=max_failures_per_field,
+                        fail_fast=fail_fast,
+                        profile=profile,
+                    ),
+                    WorkflowRunStreamHeader(filename=filename, workflow_id=workflow_id),
+                    file.size or 0,
+                )
+
+            # run our workflow
+            run_result = execute_workflow(
+                file_name=filename,
+                file_contents=resource,
+                param_values=workflow_param_values,
+                schema=workflow,
+                max_failures=max_failures,
+                max_failures_per_field=max_failures_per_field,
+                fail_fast=fail_fast,
+                profile=profile,
+            )
+
+    _record_validation_metrics(file.size or 0, run_result)
+    report = run_result.to_report(filename, workflow_id)
+    if run_report_cache and report_key:
+        run_report_cache.put(report_key, report)
+    return report
+
+
+def _invalid_file_error() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail="Could not parse the input file. Please check that it is a valid .csv file!",
+    )
+
+
+def _record_validation_metrics(file_bytes: int, *results: WorkflowRunResult):
+    """Count an uploaded file, and the rows and failures of the runs on it."""
+    validated_bytes.inc(file_bytes)
+    for result in results:
+        validated_rows.inc(result.row_count)
+        emitted_failures.inc(len(result.validation_failures))
+
+
+def _stream_run_records(
+    upload: ExitStack,
+    run: Generator[list[ValidationFailure], None, WorkflowRunResult],
+    header: WorkflowRunStreamHeader,
+    file_bytes: int,
+) -> Iterator[str]:
+    """Serialize a streamed workflow run as newline-delimited JSON records, one chunk
+    per batch of failures, and clean up the upload when done."""
+    with upload:
+        yield header.model_dump_json(by_alias=True) + "\n"
+        while True:
+            try:
+                failures = next(run)
+            except StopIteration as stop:
+                result: WorkflowRunResult = stop.value
+                break
+            yield "".join(
+                WorkflowRunStreamFailure(
+                    message=failure.message, row_number=failure.row_number
+                ).model_dump_json(by_alias=True)
+                + "\n"
+                for failure in failures
+            )
+        summary = WorkflowRunStreamSummary(
+            row_count=result.row_count,
+            row_count_is_exact=result.row_count_is_exact,
+            failure_count=result.failure_count,
+            failure_count_is_exact=result.failure_count_is_exact,
+            timings=result.stats.timings,
+        )
+        _record_validation_metrics(file_bytes, result)
+        yield summary.model_dump_json(by_alias=True, exclude_none=True) + "\n"
+
 
-    # load the uploaded file to a Frictionless Resource
-    resource = Resource(file.file.read(), format="csv")
+@app.post("/api/workflows/run", status_code=200, tags=["workflows"])
+async def run_workflows(
+    file: UploadFile,
+    workflow_runs: str = Form(),
+    max_failures: int | None = Form(default=None, ge=1),
+    max_failures_per_field: int | None = Form(default=None, ge=1),
+    fail_fast: bool = Form(default=False),
+    session: Session = Depends(get_session),
+    user: DBUser = Depends(get_current_user),
+) -> list[WorkflowRunReport]:
+    """Runs several workflows on the passed in csv, which is only uploaded and
+    parsed once, and returns the report of each run, in order. The workflows must
+    be associated with workflows the calling user has access to.
 
+    Args:
+        file (UploadFile): The csv file to run the workflows on.
+        workflow_runs (str): The workflows to run, as a stringified JSON list of up
+            to `MAX_WORKFLOWS_PER_UPLOAD` objects with the `workflowId` of a workflow
+            and its `workflowInputs`, as passed to `run_workflow`.
+        max_failures (int | None): The maximum number of failures to report for
+            each workflow.
+        max_failures_per_field (int | None): The maximum number of failures to
+            report for each field.
+        fail_fast (bool): Whether each workflow stops at its first failure.
+    """
     try:
-        # check if the csv is even a valid csv file. Note that this is a stronger
-        # check than what is performed in `process_workflow` because we are checking
-        # for if the file adheres to the csv format, and not just the data within it
-        resource.infer(stats=True)
-    except frictionless.exception.FrictionlessException as e:
+        workflow_inputs = _WORKFLOW_RUN_INPUTS.validate_json(workflow_runs)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors()) from e
+    if not 1 <= len(workflow_inputs) <= MAX_WORKFLOWS_PER_UPLOAD:
         raise HTTPException(
             status_code=400,
-            detail="Could not parse the input file. Please check that it is a valid .csv file!",
-        ) from e
+            detail=f"Between 1 and {MAX_WORKFLOWS_PER_UPLOAD} workflows can be run at once.",
+        )
 
-    # get the CSV data from the Frictionless Resource to run our workflow
-    filename = file.filename if file.filename else ""
-    # run our workflow
-    validation_results = process_workflow(
-        file_name=filename,
-        file_contents=resource,
-        param_values=workflow_param_values,
-        schema=db_workflow.schema,
+    return await _in_validation_executor(
+        partial(
+            _run_workflows,
+            file=file,
+            workflow_inputs=workflow_inputs,
+            max_failures=max_failures,
+            max_failures_per_field=max_failures_per_field,
+            fail_fast=fail_fast,
+            session=session,
+            user=user,
+        )
     )
 
-    return WorkflowRunReport(
-        row_count=resource.rows if resource.rows else 0,
-        filename=file.filename if file.filename else "",
-        workflow_id=workflow_id,
-        validation_failures=validation_results,
-    )
+
+_WORKFLOW_RUN_INPUTS = TypeAdapter(list[WorkflowRunInputs])
+
+
+def _run_workflows(
+    file: UploadFile,
+    workflow_inputs: list[WorkflowRunInputs],
+    max_failures: int | None,
+    max_failures_per_field: int | None,
+    fail_fast: bool,
+    session: Session,
+    user: DBUser,
+) -> list[WorkflowRunReport]:
+    """Runs the workflows of `run_workflows` on one read of the uploaded file."""
+    runs = [
+        WorkflowRun(
+            workflow=fetch_compiled_workflow_or_raise(
+                inputs.workflow_id, session, user
+            ),
+            param_values=inputs.workflow_inputs,
+        )
+        for inputs in workflow_inputs
+    ]
+    filename = file.filename if file.filename else ""
+
+    with upload_resource(
+        file.file, settings.UPLOAD_MAX_MEMORY_BYTES, settings.UPLOAD_DIR or None
+    ) as resource:
+        try:
+            # the file is inferred once for all the workflows, as in `_run_workflow`
+            resource.infer()
+        except frictionless.exception.FrictionlessException as e:
+            raise _invalid_file_error() from e
+
+        results = execute_workflows(
+            file_name=filename,
+            file_contents=resource,
+            runs=runs,
+            max_failures=max_failures,
+            max_failures_per_field=max_failures_per_field,
+            fail_fast=fail_fast,
+        )
+
+    _record_validation_metrics(file.size or 0, *results)
+    return [
+        result.to_report(filename, inputs.workflow_id)
+        for inputs, result in zip(workflow_inputs, results)
+    ]
 
 
 @app.get("/api/workflows/{workflow_id}/run", tags=["workflows"], response_model=None)
-def return_workflow(
+async def return_workflow(
     workflow_id: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user: DBUser = Depends(get_current_user),
 ) -> WorkflowSchema:
     """Returns a serialized json representation of the workflow that can be used
     to run the workflow locally. The workflow_id must be associated with a
     workflow the calling user has access to."""
 
-    workflow = fetch_workflow_or_raise(workflow_id, session, user)
+    workflow = await fetch_workflow_or_raise_async(workflow_id, session, user)
     return workflow.schema
 
+
+@app.post("/api/workflows/{workflow_id}/jobs", status_code=202, tags=["jobs"])
+def create_workflow_run_job(
+    workflow_id: str,
+    file: UploadFile,
+    workflow_inputs: str = Form(),
+    max_failures: int | None = Form(default=None, ge=1),
+    max_failures_per_field: int | None = Form(default=None, ge=1),
+    fail_fast: bool = Form(default=False),
+    session: Session = Depends(get_session),
+    user: DBUser = Depends(get_current_user),
+) -> WorkflowRunJob:
+    """Queues a run of the workflow associated with id `workflow_id` on the
+    passed in csv, and returns the queued job right away. The job's status and
+    progress can then be polled with `GET /api/jobs/{job_id}`, and its report
+    fetched with `GET /api/jobs/{job_id}/report` once it has succeeded.
+
+    Takes the same arguments as `POST /api/workflows/{workflow_id}/run`.
+    """
+    workflow_param_values: dict[str, WorkflowParamValue] = json.loads(workflow_inputs)
+    db_workflow = fetch_workflow_or_raise(workflow_id, session, user)
+
+    upload_path = spool_upload(file.file, settings.UPLOAD_DIR or None)
+    try:
+        job = DBWorkflowRunJob(
+            workflow_id=db_workflow.id,
+            owner=user.id,
+            filename=file.filename if file.filename else "",
+            upload_path=upload_path,
+            param_values=workflow_param_values,
+            max_failures=max_failures,
+            max_failures_per_field=max_failures_per_field,
+            fail_fast=fail_fast,
+        )
+        with _commit_or_rollback(session):
+            session.add(job)
+    except:
+        # no job tracks the upload, so nothing else would remove it
+        os.remove(upload_path)
+        raise
+    session.refresh(job)
+
+    return WorkflowRunJob.model_validate(job)
+
+
+@app.get("/api/jobs/{job_id}", tags=["jobs"])
+def get_workflow_run_job(
+    job_id: str,
+    session: Session = Depends(get_session),
+    user: DBUser = Depends(get_current_user),
+) -> WorkflowRunJob:
+    """Get the status and progress of a workflow run job by ID"""
+    return WorkflowRunJob.model_validate(fetch_job_or_raise(job_id, session, user))
+
+
+@app.get("/api/jobs/{job_id}/report", tags=["jobs"])
+def get_workflow_run_job_report(
+    job_id: str,
+    session: Session = Depends(get_session),
+    user: DBUser = Depends(get_current_user),
+) -> WorkflowRunReport:
+    """Get the report of a workflow run job that has succeeded. Responds with a
+    409 if the job is still queued or running, or if it failed."""
+    job = fetch_job_or_raise(job_id, session, user)
+
+    if job.status != "succeeded" or job.report is None:
+        detail = f"Job {job_id} is {job.status}."
+        if job.error:
+            detail = f"{detail} {job.error}"
+        raise HTTPException(status_code=409, detail=detail)
+
+    return job.report
+
 @app.post("/api/keys", tags=["api_keys"])
 def create_api_key(
     api_key_params: ApiKeyCreate,
@@ -397,7 +1185,7 @@ def create_api_key(
     session: Session = Depends(get_session),
 ) -> ApiKey:
     """Creates an API key for the current user."""
-    api_key_provider = KEY_PROVIDER_CLASS(session, azure_kv_client)
+    api_key_provider = get_api_key_provider(session)
     api_key = generate_api_key()
     return api_key_provider.create_api_key(user.id, api_key, api_key_params.expiration)
 
@@ -407,7 +1195,7 @@ def get_api_keys(
     session: Session = Depends(get_session),
 ) -> list[ApiKey]:
     """Gets all API keys for the current user."""
-    api_key_provider = KEY_PROVIDER_CLASS(session, azure_kv_client)
+    api_key_provider = get_api_key_provider(session)
     return api_key_provider.get_api_keys(user.id)
 
 @app.delete('/api/keys', tags=['api_keys'])
@@ -417,11 +1205,17 @@ def delete_api_key(
     session: Session = Depends(get_session),
 ):
     """Deletes an API key for the current user."""
-    api_key_provider = KEY_PROVIDER_CLASS(session, azure_kv_client)
+    api_key_provider = get_api_key_provider(session)
     
     if api_key_provider.delete_api_key(user.id, api_key_params.api_key):
         return {"message": "API key deleted"}
     else:
         raise HTTPException(
             status_code=404, detail="API key not found."
-        )
\ No newline at end of file
+        )
+
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """Serves the metrics of this server process in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
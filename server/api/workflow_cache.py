@@ -0,0 +1,109 @@
+"""An in-process cache of parsed, ready-to-run workflows.
+
+API clients run the same few workflows over and over. Loading a workflow for a run
+would otherwise validate its whole schema JSON into a `WorkflowSchema` and compile
+its plans from scratch every time. The cache keeps a `CompiledWorkflow` for each of
+the most recently run workflows, keyed by the workflow id and a hash of the schema
+as stored in the database, so a run only loads the raw schema to hash it. A schema
+that was changed, e.g. by another server process, hashes differently and is loaded
+again.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import ClassVar
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import Text, cast, select
+from sqlalchemy.orm import Session
+
+from server.models.workflow.db_model import DBWorkflow
+from server.models.workflow.workflow_schema import WorkflowSchema
+from server.workflow_runner.plan import CompiledWorkflow
+
+DEFAULT_WORKFLOW_CACHE_SIZE = 128
+
+
+class CachedWorkflow(BaseModel):
+    """The owner and the compiled schema of a workflow, along with the hash of the
+    schema as stored in the database."""
+
+    owner: str
+    workflow: CompiledWorkflow
+    schema_hash: str
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(arbitrary_types_allowed=True)
+
+
+class WorkflowCacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+
+class WorkflowCache:
+    """A thread-safe LRU cache of compiled workflows, holding at most `max_size`
+    workflows."""
+
+    def __init__(self, max_size: int = DEFAULT_WORKFLOW_CACHE_SIZE):
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        # workflow id -> (schema hash, compiled workflow)
+        self._workflows: OrderedDict[str, tuple[str, CompiledWorkflow]] = (
+            OrderedDict()
+        )
+        self._lock: threading.Lock = threading.Lock()
+
+    def load(self, session: Session, workflow_id: str) -> CachedWorkflow | None:
+        """Load a workflow from the cache, or from the database if its schema isn't
+        cached or has changed. Returns None if there is no such workflow."""
+        row = session.execute(
+            select(DBWorkflow.owner, cast(DBWorkflow.schema, Text)).where(
+                DBWorkflow.id == workflow_id
+            )
+        ).first()
+        if row is None:
+            return None
+        owner, schema_json = row
+        schema_hash = hashlib.sha256(schema_json.encode()).hexdigest()
+
+        with self._lock:
+            cached = self._workflows.get(workflow_id)
+            if cached is not None and cached[0] == schema_hash:
+                self._workflows.move_to_end(workflow_id)
+                self.hits += 1
+                return CachedWorkflow(
+                    owner=owner, workflow=cached[1], schema_hash=schema_hash
+                )
+            self.misses += 1
+
+        workflow = CompiledWorkflow(WorkflowSchema.model_validate_json(schema_json))
+        with self._lock:
+            self._workflows[workflow_id] = (schema_hash, workflow)
+            self._workflows.move_to_end(workflow_id)
+            while len(self._workflows) > self.max_size:
+                _ = self._workflows.popitem(last=False)
+        return CachedWorkflow(owner=owner, workflow=workflow, schema_hash=schema_hash)
+
+    def invalidate(self, workflow_id: str):
+        """Drop a workflow that was updated or deleted."""
+        with self._lock:
+            _ = self._workflows.pop(workflow_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._workflows.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> WorkflowCacheStats:
+        with self._lock:
+            return WorkflowCacheStats(
+                size=len(self._workflows),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+            )
@@ -0,0 +1,146 @@
+"""Synthetic workflows and csv files to benchmark the workflow runner with."""
+
+import csv
+import datetime
+import io
+import random
+import string
+from collections.abc import Callable
+
+from server.models.workflow.workflow_schema import (
+    FieldSchema,
+    FieldsetSchema,
+    WorkflowSchema,
+)
+
+# the kinds of fields of a synthetic fieldset, in the order they are repeated
+FIELD_KINDS = ["string", "number", "timestamp", "allowedValues", "optionalString"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+ALLOWED_VALUES = ["red", "green", "blue", "yellow"]
+
+# generates the value of a cell
+CellGenerator = Callable[[random.Random], str]
+
+
+def synthetic_field(index: int) -> FieldSchema:
+    kind = FIELD_KINDS[index % len(FIELD_KINDS)]
+    data_type_validation: dict[str, str] = {
+        "dataType": "number" if kind == "number" else "string"
+    }
+    if kind == "timestamp":
+        data_type_validation = {
+            "dataType": "timestamp",
+            "dateTimeFormat": TIMESTAMP_FORMAT,
+        }
+    return FieldSchema.model_validate(
+        {
+            "id": str(index),
+            "name": f"{kind}_{index}",
+            "caseSensitive": True,
+            "required": True,
+            "allowEmptyValues": kind == "optionalString",
+            "allowedValues": ALLOWED_VALUES if kind == "allowedValues" else None,
+            "dataTypeValidation": data_type_validation,
+        }
+    )
+
+
+def synthetic_workflow_schema(columns: int) -> WorkflowSchema:
+    """A workflow that checks the file type, the row count and a fieldset of
+    `columns` fields of every kind in `FIELD_KINDS`."""
+    return WorkflowSchema.model_validate(
+        {
+            "version": "0.1",
+            "operations": [
+                {
+                    "type": "fileTypeValidation",
+                    "id": "file_type",
+                    "expectedFileType": "csv",
+                    "title": "Validate file type",
+                    "description": None,
+                },
+                {
+                    "type": "rowCountValidation",
+                    "id": "row_count",
+                    "minRowCount": 1,
+                    "maxRowCount": None,
+                    "title": "Validate row counts",
+                    "description": None,
+                },
+                {
+                    "type": "fieldsetSchemaValidation",
+                    "id": "fieldset",
+                    "fieldsetSchema": "synthetic_fields",
+                    "title": "Validate fieldset schema",
+                    "description": None,
+                },
+            ],
+            "fieldsetSchemas": [
+                {
+                    "id": "synthetic_fields",
+                    "name": "synthetic_fields",
+                    "orderMatters": True,
+                    "allowExtraColumns": "no",
+                    "fields": [
+                        synthetic_field(i).model_dump(by_alias=True)
+                        for i in range(columns)
+                    ],
+                }
+            ],
+            "params": [],
+        }
+    )
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters, k=rng.randint(3, 12)))
+
+
+def _random_timestamp(rng: random.Random, date_time_format: str) -> str:
+    timestamp = datetime.datetime(1970, 1, 1) + datetime.timedelta(
+        seconds=rng.randint(0, 2_000_000_000)
+    )
+    return timestamp.strftime(date_time_format)
+
+
+def cell_generators(field: FieldSchema) -> tuple[CellGenerator, CellGenerator]:
+    """Generators of valid and of invalid values for a field. A field that accepts
+    any value gets a valid value for both."""
+    if isinstance(field.allowed_values, list):
+        allowed_values = field.allowed_values
+        return (lambda rng: rng.choice(allowed_values)), (lambda _: "not allowed")
+
+    match field.data_type_validation.data_type:
+        case "number":
+            valid = lambda rng: str(rng.randint(0, 10**9))
+            invalid = lambda _: "n/a"
+        case "timestamp":
+            date_time_format = getattr(field.data_type_validation, "date_time_format")
+            valid = lambda rng: _random_timestamp(rng, date_time_format)
+            invalid = lambda _: "not a timestamp"
+        case _:
+            valid = _random_word
+            invalid = valid if field.allow_empty_values else (lambda _: "")
+    return valid, invalid
+
+
+def generate_csv(
+    fieldset_schema: FieldsetSchema,
+    rows: int,
+    bad_cell_ratio: float = 0.0,
+    seed: int = 0,
+) -> bytes:
+    """Generate a csv file with a column for each field of a fieldset, where about
+    `bad_cell_ratio` of the cells are invalid. The same arguments always generate
+    the same file."""
+    rng = random.Random(seed)
+    generators = [cell_generators(field) for field in fieldset_schema.fields]
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(field.name for field in fieldset_schema.fields)
+    for _ in range(rows):
+        writer.writerow(
+            invalid(rng) if rng.random() < bad_cell_ratio else valid(rng)
+            for valid, invalid in generators
+        )
+    return output.getvalue().encode()
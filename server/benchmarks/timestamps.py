@@ -0,0 +1,74 @@
+"""Benchmark the compiled timestamp matchers against `datetime.strptime`.
+
+Run with `python -m server.benchmarks.timestamps`.
+"""
+
+import argparse
+import datetime
+import random
+import timeit
+from collections.abc import Callable
+
+from server.workflow_runner.timestamps import compile_timestamp_matcher
+
+FORMATS = ["%Y-%m-%d", "%m/%d/%y", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"]
+
+
+def strptime_check(date_time_format: str) -> Callable[[str], bool]:
+    """The check as it was done before the matchers, once per cell."""
+
+    def matches(value: str) -> bool:
+        try:
+            _ = datetime.datetime.strptime(value, date_time_format)
+        except ValueError:
+            return False
+        return True
+
+    return matches
+
+
+def make_values(date_time_format: str, count: int, invalid_ratio: float) -> list[str]:
+    rng = random.Random(0)
+    start = datetime.datetime(1950, 1, 1)
+    values: list[str] = []
+    for _ in range(count):
+        timestamp = start + datetime.timedelta(seconds=rng.randint(0, 2_000_000_000))
+        value = timestamp.strftime(date_time_format)
+        if rng.random() < invalid_ratio:
+            # swap the month and the day, which is often an impossible date
+            value = value.replace("-", "/", 1) if rng.random() < 0.5 else value[::-1]
+        values.append(value)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--rows", type=int, default=100_000)
+    _ = parser.add_argument("--invalid-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{'format':<24}{'strptime':>12}{'matcher':>12}{'speedup':>10}")
+    for date_time_format in FORMATS:
+        values = make_values(date_time_format, args.rows, args.invalid_ratio)
+        checks = {
+            "strptime": strptime_check(date_time_format),
+            "matcher": compile_timestamp_matcher(date_time_format),
+        }
+        results = {name: list(map(check, values)) for name, check in checks.items()}
+        assert results["strptime"] == results["matcher"], date_time_format
+
+        timings = {
+            name: min(
+                timeit.repeat(lambda check=check: list(map(check, values)), number=1)
+            )
+            for name, check in checks.items()
+        }
+        print(
+            f"{date_time_format:<24}{timings['strptime']:>11.3f}s"
+            f"{timings['matcher']:>11.3f}s"
+            f"{timings['strptime'] / timings['matcher']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Benchmark the workflow runner on synthetic csv files.
+
+Each scenario is a workflow and a csv file generated for one of its fieldsets. The
+phases of a workflow run are timed one at a time: `parse_frictionless`, reading the
+rows with `_get_csv_contents_from_resource` and `validate_fieldset`, then the three
+of them one after the other, as well as `execute_workflow`, which runs them in a
+single pass over the file. For each phase the best time of a few repeats is kept,
+along with its throughput and the peak memory that it allocated, which is
+measured in a separate run since tracing allocations slows the run down.
+
+Run with `python -m server.benchmarks.workflow_runner`. The results can be saved
+as JSON with `--output`, and compared with the results of an earlier run with
+`--baseline`: the command then fails if a phase got slower, or used more memory,
+by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from server.benchmarks.data import generate_csv, synthetic_workflow_schema
+from server.models.workflow.workflow_schema import FieldsetSchema, WorkflowSchema
+from server.workflow_runner.validators import (
+    WorkflowParamValue,
+    csv_resource,
+    parse_frictionless,
+    validate_fieldset,
+)
+from server.workflow_runner.workflow_runner import (
+    _get_csv_contents_from_resource,  # pyright: ignore[reportPrivateUsage]
+    execute_workflow,
+)
+
+SAMPLE_SCHEMA_PATH = (
+    Path(__file__).resolve().parent.parent
+    / "tests/workflow_runner/sample_schema/workflow_schema.json"
+)
+
+# prepares the inputs of a phase, and returns the call to time
+Phase = Callable[[], Callable[[], Any]]
+
+
+class Scenario(BaseModel):
+    """A workflow, with the values of its params, and a file to run it on."""
+
+    name: str
+    workflow_schema: WorkflowSchema
+    param_values: dict[str, WorkflowParamValue]
+    fieldset_schema: FieldsetSchema
+    rows: int
+    bad_cell_ratio: float
+    contents: bytes
+
+
+class PhaseResult(BaseModel):
+    seconds: float
+    rows_per_second: float
+    megabytes_per_second: float
+    peak_memory_bytes: int
+
+
+class ScenarioResult(BaseModel):
+    name: str
+    rows: int
+    columns: int
+    bad_cell_ratio: float
+    file_bytes: int
+    failure_count: int
+    phases: dict[str, PhaseResult]
+
+
+class BenchmarkResults(BaseModel):
+    created_date: datetime
+    python_version: str
+    platform: str
+    scenarios: list[ScenarioResult]
+
+
+def sample_scenario(rows: int, bad_cell_ratio: float) -> Scenario:
+    """The sample workflow of the tests, on a generated file of countries."""
+    schema = WorkflowSchema.model_validate_json(SAMPLE_SCHEMA_PATH.read_text())
+    fieldset_schema = schema.fieldset_schemas[0]
+    return Scenario(
+        name="sample_schema",
+        workflow_schema=schema,
+        param_values={"fieldset_schema": fieldset_schema.name},
+        fieldset_schema=fieldset_schema,
+        rows=rows,
+        bad_cell_ratio=bad_cell_ratio,
+        contents=generate_csv(fieldset_schema, rows, bad_cell_ratio),
+    )
+
+
+def synthetic_scenario(rows: int, columns: int, bad_cell_ratio: float) -> Scenario:
+    schema = synthetic_workflow_schema(columns)
+    fieldset_schema = schema.fieldset_schemas[0]
+    return Scenario(
+        name=f"synthetic_{columns}_columns",
+        workflow_schema=schema,
+        param_values={},
+        fieldset_schema=fieldset_schema,
+        rows=rows,
+        bad_cell_ratio=bad_cell_ratio,
+        contents=generate_csv(fieldset_schema, rows, bad_cell_ratio),
+    )
+
+
+def scenario_phases(scenario: Scenario) -> dict[str, Phase]:
+    param_schemas = {param.id: param for param in scenario.workflow_schema.params}
+    csv_data = _get_csv_contents_from_resource(csv_resource(scenario.contents))
+
+    def run_phases_in_turn():
+        resource, _ = parse_frictionless(scenario.contents)
+        data = _get_csv_contents_from_resource(resource)
+        return validate_fieldset(
+            data.column_names,
+            data.data,
+            scenario.fieldset_schema,
+            param_schemas,
+            scenario.param_values,
+        )
+
+    return {
+        "parse_frictionless": lambda: lambda: parse_frictionless(scenario.contents),
+        "get_csv_contents": lambda: (
+            lambda resource=csv_resource(scenario.contents): (
+                _get_csv_contents_from_resource(resource)
+            )
+        ),
+        "validate_fieldset": lambda: lambda: validate_fieldset(
+            csv_data.column_names,
+            csv_data.data,
+            scenario.fieldset_schema,
+            param_schemas,
+            scenario.param_values,
+        ),
+        "phases_in_turn": lambda: run_phases_in_turn,
+        "execute_workflow": lambda: lambda: execute_workflow(
+            "benchmark.csv",
+            scenario.contents,
+            scenario.param_values,
+            scenario.workflow_schema,
+        ),
+    }
+
+
+def measure_phase(phase: Phase, repeats: int) -> tuple[float, int]:
+    """The best time of a phase over `repeats` runs, and the peak memory allocated
+    by one more run."""
+    best_seconds = float("inf")
+    for _ in range(repeats):
+        call = phase()
+        start = time.perf_counter()
+        _ = call()
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+
+    call = phase()
+    tracemalloc.start()
+    try:
+        _ = call()
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best_seconds, peak_memory_bytes
+
+
+def run_scenario(scenario: Scenario, repeats: int) -> ScenarioResult:
+    phases: dict[str, PhaseResult] = {}
+    megabytes = len(scenario.contents) / 1_000_000
+    for name, phase in scenario_phases(scenario).items():
+        seconds, peak_memory_bytes = measure_phase(phase, repeats)
+        phases[name] = PhaseResult(
+            seconds=seconds,
+            rows_per_second=scenario.rows / seconds,
+            megabytes_per_second=megabytes / seconds,
+            peak_memory_bytes=peak_memory_bytes,
+        )
+
+    result = execute_workflow(
+        "benchmark.csv",
+        scenario.contents,
+        scenario.param_values,
+        scenario.workflow_schema,
+    )
+    return ScenarioResult(
+        name=scenario.name,
+        rows=scenario.rows,
+        columns=len(scenario.fieldset_schema.fields),
+        bad_cell_ratio=scenario.bad_cell_ratio,
+        file_bytes=len(scenario.contents),
+        failure_count=result.failure_count,
+        phases=phases,
+    )
+
+
+def run_benchmarks(scenarios: list[Scenario], repeats: int) -> BenchmarkResults:
+    return BenchmarkResults(
+        created_date=datetime.now(),
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+        scenarios=[run_scenario(scenario, repeats) for scenario in scenarios],
+    )
+
+
+def find_regressions(
+    results: BenchmarkResults, baseline: BenchmarkResults, tolerance: float
+) -> list[str]:
+    """Describe the phases that are slower, or allocate more memory, than in the
+    baseline by more than `tolerance`, e.g. 0.2 for 20%. Only the scenarios run
+    on files of the same shape in both results are compared."""
+    baseline_scenarios = {scenario.name: scenario for scenario in baseline.scenarios}
+    regressions: list[str] = []
+    for scenario in results.scenarios:
+        baseline_scenario = baseline_scenarios.get(scenario.name)
+        if baseline_scenario is None or (
+            (baseline_scenario.rows, baseline_scenario.columns)
+            != (scenario.rows, scenario.columns)
+            or baseline_scenario.bad_cell_ratio != scenario.bad_cell_ratio
+        ):
+            continue
+        for name, phase in scenario.phases.items():
+            baseline_phase = baseline_scenario.phases.get(name)
+            if baseline_phase is None:
+                continue
+            for metric, value, baseline_value, unit in [
+                ("time", phase.seconds, baseline_phase.seconds, "s"),
+                (
+                    "peak memory",
+                    phase.peak_memory_bytes / 1_000_000,
+                    baseline_phase.peak_memory_bytes / 1_000_000,
+                    "MB",
+                ),
+            ]:
+                if value > baseline_value * (1 + tolerance):
+                    regressions.append(
+                        f"{scenario.name} {name}: {metric} went from "
+                        f"{baseline_value:.3f}{unit} to {value:.3f}{unit}"
+                    )
+    return regressions
+
+
+def print_results(results: BenchmarkResults):
+    print(
+        f"{'scenario':<24}{'phase':<20}{'time':>10}{'rows/s':>12}{'MB/s':>8}"
+        f"{'peak MB':>10}"
+    )
+    for scenario in results.scenarios:
+        for name, phase in scenario.phases.items():
+            print(
+                f"{scenario.name:<24}{name:<20}{phase.seconds:>9.3f}s"
+                f"{phase.rows_per_second:>12,.0f}{phase.megabytes_per_second:>8.2f}"
+                f"{phase.peak_memory_bytes / 1_000_000:>10.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    _ = parser.add_argument("--rows", type=int, default=100_000)
+    _ = parser.add_argument(
+        "--columns",
+        type=int,
+        nargs="+",
+        default=[10, 50],
+        help="the number of columns of each synthetic scenario",
+    )
+    _ = parser.add_argument("--bad-cell-ratio", type=float, default=0.01)
+    _ = parser.add_argument("--repeats", type=int, default=3)
+    _ = parser.add_argument("--output", type=Path, help="save the results as JSON")
+    _ = parser.add_argument(
+        "--baseline", type=Path, help="compare with the results saved by a past run"
+    )
+    _ = parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = [sample_scenario(args.rows, args.bad_cell_ratio)] + [
+        synthetic_scenario(args.rows, columns, args.bad_cell_ratio)
+        for columns in args.columns
+    ]
+    results = run_benchmarks(scenarios, args.repeats)
+    print_results(results)
+    if args.output:
+        _ = args.output.write_text(results.model_dump_json(indent=2))
+
+    if args.baseline:
+        baseline = BenchmarkResults.model_validate(
+            json.loads(args.baseline.read_text())
+        )
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
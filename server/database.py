@@ -1,49 +1,177 @@
-"""This file initializes the SQLAlchemy database engine"""
+"""This file initializes the SQLAlchemy database engine.
+
+The database is configured with the `DATABASE_URL` environment variable (or in
+`.env.server`), and defaults to a SQLite file. A SQLite database is opened in WAL
+mode, so that reads don't block on a write and several server processes can share
+the file, waiting on each other's writes rather than failing with "database is
+locked". A PostgreSQL database is used through a pool of connections that are
+checked before use, so that connections dropped by the server are replaced.
+
+Async endpoints use an asyncio engine on the same database, through its async
+driver: aiosqlite for SQLite, and asyncpg for PostgreSQL.
+"""
 
 import json
 import logging
 import sqlite3
-from typing import Any
+from typing import Any, ClassVar
 
 import sqlalchemy.pool
 from pydantic.json import pydantic_encoder
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from sqlalchemy import create_engine, event
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import DeclarativeMeta, sessionmaker
 
 SQLITE_DB_PATH = "./db.sqlite"
+# the driver of each database that the asyncio engine uses
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
 LOG = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+class DatabaseSettings(BaseSettings):
+    """Configuration of the database engine"""
+
+    DATABASE_URL: str = f"sqlite:///{SQLITE_DB_PATH}"
+
+    # how long a SQLite connection waits for another one to finish writing
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    # how much of a SQLite database file is memory-mapped
+    SQLITE_MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+
+    # connections kept open to other databases, and how many more can be opened
+    # when they are all in use
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT_SECONDS: float = 30.0
+    # connections are replaced after this long, before the server drops them
+    DATABASE_POOL_RECYCLE_SECONDS: int = 30 * 60
+
+    model_config: ClassVar[SettingsConfigDict] = SettingsConfigDict(
+        env_file=".env.server", case_sensitive=True, extra="ignore"
+    )
+
+
 def json_serializer(*args: dict[str, Any], **kwargs: dict[str, Any]) -> str:
     """JSON serializer to use in the SQLAlchemy engine"""
     return json.dumps(*args, default=pydantic_encoder, **kwargs)
 
 
-# By default sqlite doesn't enforce foreign key constraints
-# ths code ensures that it is enforced for all connections
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(
-    dbapi_connection: sqlite3.Connection,
-    # pylint: disable=unused-argument
-    connection_record: sqlalchemy.pool._ConnectionRecord,  # pyright: ignore[reportUnusedParameter, reportPrivateUsage, reportPrivateImportUsage]
+def _is_sqlite_in_memory(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def _sqlite_engine_options(settings: DatabaseSettings) -> dict[str, Any]:
+    return {
+        "connect_args": {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS,
+        },
+        "json_serializer": json_serializer,
+    }
+
+
+def _pooled_engine_options(settings: DatabaseSettings) -> dict[str, Any]:
+    return {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+        "json_serializer": json_serializer,
+    }
+
+
+def _set_sqlite_pragmas_on_connect(
+    engine: Engine, url: URL, settings: DatabaseSettings
 ):
-    cursor = dbapi_connection.cursor()
-    _ = cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+    use_wal = not _is_sqlite_in_memory(url)
+
+    # the pragmas only apply to the connection they are run on, except for the
+    # journal mode, which is stored in the database file. Connections are pooled,
+    # so they run once for each new connection.
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(
+        dbapi_connection: sqlite3.Connection,
+        # pylint: disable=unused-argument
+        connection_record: sqlalchemy.pool._ConnectionRecord,  # pyright: ignore[reportUnusedParameter, reportPrivateUsage, reportPrivateImportUsage]
+    ):
+        cursor = dbapi_connection.cursor()
+        # By default sqlite doesn't enforce foreign key constraints
+        _ = cursor.execute("PRAGMA foreign_keys=ON")
+        if use_wal:
+            _ = cursor.execute("PRAGMA journal_mode=WAL")
+            # in WAL mode, a commit can only be lost on a power failure
+            _ = cursor.execute("PRAGMA synchronous=NORMAL")
+            _ = cursor.execute(
+                f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_BYTES)}"
+            )
+        cursor.close()
 
 
-def create_fk_constraint_engine(file_path: str = SQLITE_DB_PATH):
-    """Create SQLite engine that supports foreign key constraints"""
+def create_sqlite_engine(url: URL, settings: DatabaseSettings) -> Engine:
+    """Create a SQLite engine that enforces foreign key constraints and, for a
+    database file, uses WAL journaling"""
+    engine = create_engine(url, **_sqlite_engine_options(settings))
+    _set_sqlite_pragmas_on_connect(engine, url, settings)
+    return engine
+
+
+def create_pooled_engine(url: URL, settings: DatabaseSettings) -> Engine:
+    """Create an engine for a database server, e.g. PostgreSQL, with a pool of
+    connections that are checked before use"""
     return create_engine(
-        f"sqlite:///{file_path}",
-        connect_args={"check_same_thread": False},
-        json_serializer=json_serializer,
+        url, poolclass=sqlalchemy.pool.QueuePool, **_pooled_engine_options(settings)
+    )
+
+
+def create_database_engine(
+    url: str | URL | None = None, settings: DatabaseSettings | None = None
+) -> Engine:
+    """Create the engine for a database URL, by default the configured one"""
+    settings = settings or DatabaseSettings()
+    url = make_url(url or settings.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        return create_sqlite_engine(url, settings)
+    return create_pooled_engine(url, settings)
+
+
+def async_database_url(url: str | URL) -> URL:
+    """The URL of a database with the driver that the asyncio engine uses for it"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return url
+
+
+def create_async_database_engine(
+    url: str | URL | None = None, settings: DatabaseSettings | None = None
+) -> AsyncEngine:
+    """Create the asyncio engine for a database URL, by default the configured one.
+    It is set up like the engine from `create_database_engine`, with the async
+    driver of the database."""
+    settings = settings or DatabaseSettings()
+    url = async_database_url(url or settings.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        engine = create_async_engine(url, **_sqlite_engine_options(settings))
+        _set_sqlite_pragmas_on_connect(engine.sync_engine, url, settings)
+        return engine
+    return create_async_engine(
+        url,
+        poolclass=sqlalchemy.pool.AsyncAdaptedQueuePool,
+        **_pooled_engine_options(settings),
     )
 
 
-engine = create_fk_constraint_engine(SQLITE_DB_PATH)
+engine = create_database_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# objects stay loaded after a commit, as they can't be lazily reloaded in async code
+async_engine = create_async_database_engine()
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 Base: DeclarativeMeta = declarative_base()
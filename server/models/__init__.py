@@ -6,6 +6,7 @@ auto-generate the database migration scripts.
 
 from .user.db_model import DBUser
 from .workflow.db_model import DBWorkflow
-from .apikey.db_model import DBApiKey
+from .apikey.db_model import DBApiKey, DBAzureApiKey
+from .job.db_model import DBWorkflowRunJob
 
 
@@ -3,7 +3,7 @@ from datetime import datetime
 from server.models.user.db_model import DBUser
 from server.database import Base
 
-from sqlalchemy import Uuid, ForeignKey, String, DateTime
+from sqlalchemy import Uuid, ForeignKey, String, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 class DBApiKey(Base):
@@ -14,3 +14,14 @@ class DBApiKey(Base):
     api_key: Mapped[str] = mapped_column(String, nullable=False, primary_key=True)
     expiration: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
+class DBAzureApiKey(Base):
+    """Index of the API keys stored in Azure Key Vault, by user. The vault is the
+    source of truth: this table lets a user's keys be listed without scanning the
+    whole vault, and is kept in sync with it on create and delete, and by
+    `reconcile_azure_api_keys`."""
+    __tablename__ = "azure_api_key"
+    __table_args__ = (Index("ix_azure_api_key_user", "user"),)
+
+    user: Mapped[str] = mapped_column(Uuid(as_uuid=False), ForeignKey(DBUser.id), nullable=False)
+    key_vault_identifier: Mapped[str] = mapped_column(String, nullable=False, primary_key=True)
+    expiration: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
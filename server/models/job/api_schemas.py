@@ -0,0 +1,33 @@
+"""Workflow run job schemas that are used in the API."""
+
+from datetime import datetime
+from typing import ClassVar, Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+WorkflowRunJobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class WorkflowRunJob(BaseModel):
+    """The status of a workflow run that was queued as a job.
+
+    `rows_processed` is the number of rows of the file validated so far. Once the job
+    has succeeded its `WorkflowRunReport` can be fetched, and if it failed `error`
+    says why.
+    """
+
+    id: str
+    workflow_id: str = Field(serialization_alias="workflowId")
+    filename: str
+    status: WorkflowRunJobStatus
+    rows_processed: int = Field(serialization_alias="rowsProcessed")
+    error: str | None = None
+    created_date: datetime = Field(serialization_alias="createdDate")
+    started_date: datetime | None = Field(
+        default=None, serialization_alias="startedDate"
+    )
+    finished_date: datetime | None = Field(
+        default=None, serialization_alias="finishedDate"
+    )
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(from_attributes=True)
@@ -0,0 +1,66 @@
+"""This file holds the WorkflowRunJob model as represented in the database."""
+
+import uuid
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, String, Uuid
+from sqlalchemy.orm import Mapped, mapped_column
+
+from server.database import Base
+from server.models.user.db_model import DBUser
+from server.models.workflow.api_schemas import WorkflowRunReport
+from server.models.workflow.db_model import DBWorkflow
+from server.pydantic_type import PydanticType
+
+from .api_schemas import WorkflowRunJobStatus
+
+
+class DBWorkflowRunJob(Base):
+    """Workflow run job table. The queue of workflow runs that are processed by the
+    job workers, and their reports once they are done."""
+
+    __tablename__: str = "workflow_run_job"
+    # workers look for the oldest queued job
+    __table_args__: tuple[Any, ...] = (
+        Index("ix_workflow_run_job_status_created_date", "status", "created_date"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    workflow_id: Mapped[str] = mapped_column(
+        Uuid(as_uuid=False),
+        ForeignKey(DBWorkflow.id, ondelete="CASCADE"),
+        nullable=False,
+    )
+    owner: Mapped[str] = mapped_column(
+        Uuid(as_uuid=False), ForeignKey(DBUser.id), nullable=False
+    )
+    status: Mapped[WorkflowRunJobStatus] = mapped_column(
+        String, default="queued", nullable=False
+    )
+    filename: Mapped[str]
+    # where the uploaded file was spooled until the job runs
+    upload_path: Mapped[str]
+    param_values: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    max_failures: Mapped[int | None]
+    max_failures_per_field: Mapped[int | None]
+    fail_fast: Mapped[bool] = mapped_column(default=False, nullable=False)
+
+    # the worker that claimed the job, which keeps `heartbeat_date` fresh while it
+    # runs it. Jobs whose heartbeat is too old are claimed again.
+    worker_id: Mapped[str | None]
+    heartbeat_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    rows_processed: Mapped[int] = mapped_column(default=0, nullable=False)
+
+    report: Mapped[WorkflowRunReport | None] = mapped_column(
+        PydanticType(WorkflowRunReport), nullable=True
+    )
+    error: Mapped[str | None]
+
+    created_date: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.now, nullable=False
+    )
+    started_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -1,7 +1,7 @@
 """Workflow schemas that are used in the API."""
 
 from datetime import datetime
-from typing import ClassVar
+from typing import ClassVar, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -46,15 +46,105 @@ class ValidationFailure(BaseModel):
     """
 
     message: str
-    row_number: int | None = Field(default=None, serialization_alias="rowNumber")
+    row_number: int | None = Field(default=None, alias="rowNumber")
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
+
+
+class OperationTiming(BaseModel):
+    """Wall time spent on the checks of an operation of a profiled workflow run."""
+
+    operation_id: str = Field(alias="operationId")
+    type: str
+    seconds: float
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
+
+
+class WorkflowRunTimings(BaseModel):
+    """Where the wall time of a profiled workflow run went.
+
+    The stages take turns while the file is read, and each one is the time spent in
+    it over the whole run. Time that is in none of them, e.g. to compile the
+    workflow, only counts towards `total_seconds`. Frictionless parses the cells of a
+    row when they are first read, so that time counts towards the baseline
+    validation, or the row materialization if there is no baseline validation.
+    """
+
+    total_seconds: float = Field(alias="totalSeconds")
+    # reading the file and splitting it into rows
+    parse_seconds: float = Field(alias="parseSeconds")
+    baseline_validation_seconds: float = Field(alias="baselineValidationSeconds")
+    # turning rows into lists of values for the fieldset validations
+    row_materialization_seconds: float = Field(alias="rowMaterializationSeconds")
+    operations: list[OperationTiming]
+    rows_per_second: float = Field(alias="rowsPerSecond")
+    cells_per_second: float = Field(alias="cellsPerSecond")
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
 
 
 class WorkflowRunReport(BaseModel):
-    """Report for a server-side run of a workflow."""
+    """Report for a server-side run of a workflow.
 
-    row_count: int = Field(serialization_alias="rowCount")
+    When the run was capped, `validation_failures` only holds the first failures,
+    and `failure_count` (and `row_count`, if the file was not read to the end) are
+    lower bounds, as flagged by the `*_is_exact` fields.
+    """
+
+    row_count: int = Field(alias="rowCount")
+    row_count_is_exact: bool = Field(default=True, alias="rowCountIsExact")
+    failure_count: int = Field(alias="failureCount")
+    failure_count_is_exact: bool = Field(default=True, alias="failureCountIsExact")
     filename: str
-    workflow_id: str = Field(serialization_alias="workflowId")
-    validation_failures: list[ValidationFailure] = Field(
-        serialization_alias="validationFailures"
+    workflow_id: str = Field(alias="workflowId")
+    validation_failures: list[ValidationFailure] = Field(alias="validationFailures")
+    # only for runs that were profiled
+    timings: WorkflowRunTimings | None = None
+
+    # reports are stored as JSON with their aliases, e.g. by workflow run jobs
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
+
+
+class WorkflowRunInputs(BaseModel):
+    """A workflow to run on an uploaded file along with others, and its inputs."""
+
+    workflow_id: str = Field(alias="workflowId")
+    # the values of the params of the workflow, by name
+    workflow_inputs: dict[str, int | str | list[str] | None] = Field(
+        alias="workflowInputs"
     )
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
+
+
+class WorkflowRunStreamHeader(BaseModel):
+    """First record of a workflow run report streamed as newline-delimited JSON."""
+
+    type: Literal["header"] = "header"
+    filename: str
+    workflow_id: str = Field(alias="workflowId")
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
+
+
+class WorkflowRunStreamFailure(ValidationFailure):
+    """A validation failure of a streamed workflow run report, sent as soon as the
+    rows it was found in have been validated."""
+
+    type: Literal["failure"] = "failure"
+
+
+class WorkflowRunStreamSummary(BaseModel):
+    """Last record of a streamed workflow run report, sent once the file was read.
+    A stream that ends without it was cut short by an error."""
+
+    type: Literal["summary"] = "summary"
+    row_count: int = Field(alias="rowCount")
+    row_count_is_exact: bool = Field(default=True, alias="rowCountIsExact")
+    failure_count: int = Field(alias="failureCount")
+    failure_count_is_exact: bool = Field(default=True, alias="failureCountIsExact")
+    # only for runs that were profiled
+    timings: WorkflowRunTimings | None = None
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(populate_by_name=True)
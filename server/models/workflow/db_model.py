@@ -2,8 +2,9 @@
 
 import uuid
 from datetime import datetime
+from typing import Any
 
-from sqlalchemy import DateTime, ForeignKey, Uuid
+from sqlalchemy import DateTime, ForeignKey, Index, Uuid
 from sqlalchemy.orm import Mapped, mapped_column
 
 from server.database import Base
@@ -17,6 +18,10 @@ class DBWorkflow(Base):
     """Workflow table"""
 
     __tablename__: str = "workflow"
+    # a user's workflows are listed in pages, ordered by creation date
+    __table_args__: tuple[Any, ...] = (
+        Index("ix_workflow_owner_created_date_id", "owner", "created_date", "id"),
+    )
 
     id: Mapped[str] = mapped_column(
         Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -29,8 +34,10 @@ class DBWorkflow(Base):
         DateTime, default=datetime.now, nullable=False
     )
 
+    # schemas can be large: they are only loaded, and parsed, when accessed
     schema: Mapped[WorkflowSchema] = mapped_column(
         PydanticType(WorkflowSchema),
         default=create_empty_workflow_schema,
         nullable=False,
+        deferred=True,
     )
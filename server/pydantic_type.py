@@ -1,6 +1,7 @@
 """This file defines a new PydanticType, which is a custom SQLAlchemy type
 to store Pydantic models in JSON columns."""
 
+from functools import cache
 from typing import Any, override
 
 from fastapi.encoders import jsonable_encoder
@@ -10,6 +11,12 @@ from sqlalchemy.engine import Dialect
 from sqlalchemy.types import JSON, TypeDecorator
 
 
+@cache
+def _type_adapter(pydantic_type: Any) -> TypeAdapter[Any]:
+    # building an adapter compiles a validator for the type, so each type gets one
+    return TypeAdapter(pydantic_type)
+
+
 # pylint: disable=abstract-method
 class PydanticType(TypeDecorator):  # pyright: ignore[reportMissingTypeArgument]
     """SQLAlchemy type to store Pydantic models as JSON objects.
@@ -24,6 +31,8 @@ class PydanticType(TypeDecorator):  # pyright: ignore[reportMissingTypeArgument]
     """
 
     impl = JSON  # pyright: ignore[reportUnannotatedClassAttribute]
+    # the type only holds a pydantic type, so statements that use it can be cached
+    cache_ok = True  # pyright: ignore[reportUnannotatedClassAttribute]
 
     def __init__(self, pydantic_type: Any):
         super().__init__()
@@ -42,4 +51,6 @@ class PydanticType(TypeDecorator):  # pyright: ignore[reportMissingTypeArgument]
 
     @override
     def process_result_value(self, value: Any, dialect: Dialect):
-        return TypeAdapter(self.pydantic_type).validate_python(value) if value else None
+        return (
+            _type_adapter(self.pydantic_type).validate_python(value) if value else None
+        )
@@ -0,0 +1,67 @@
+import unittest
+
+from server.api.metrics import CallbackMetric, Counter, Histogram, MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter("requests_total", "Requests.", ["route"])
+        counter.inc(route="run_workflow")
+        counter.inc(2, route="run_workflow")
+        counter.inc(route='say "hi"')
+        self.assertEqual(counter.value(route="run_workflow"), 3)
+        self.assertEqual(
+            counter.render(),
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="run_workflow"} 3\n'
+            'requests_total{route="say \\"hi\\""} 1\n',
+        )
+
+    def test_labels_must_match(self):
+        counter = Counter("requests_total", "Requests.", ["route"])
+        with self.assertRaises(ValueError):
+            counter.inc(method="GET")
+
+    def test_histogram(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=[0.1, 1])
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(value)
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(
+            histogram.render().splitlines()[2:],
+            [
+                'latency_seconds_bucket{le="0.1"} 1',
+                'latency_seconds_bucket{le="1"} 3',
+                'latency_seconds_bucket{le="+Inf"} 4',
+                "latency_seconds_count 4",
+                "latency_seconds_sum 6.05",
+            ],
+        )
+
+    def test_registry(self):
+        registry = MetricsRegistry()
+        counter = registry.register(Counter("rows_total", "Rows."))
+        hits = {"workflow": 3}
+        _ = registry.register(
+            CallbackMetric(
+                "cache_hits_total",
+                "Cache hits.",
+                "counter",
+                lambda: {(cache,): value for cache, value in hits.items()},
+                ["cache"],
+            )
+        )
+        counter.inc(10)
+        hits["workflow"] = 4
+        self.assertEqual(
+            registry.render(),
+            "# HELP rows_total Rows.\n"
+            "# TYPE rows_total counter\n"
+            "rows_total 10\n"
+            "# HELP cache_hits_total Cache hits.\n"
+            "# TYPE cache_hits_total counter\n"
+            'cache_hits_total{cache="workflow"} 4\n',
+        )
+        with self.assertRaises(ValueError):
+            _ = registry.register(Counter("rows_total", "Rows."))
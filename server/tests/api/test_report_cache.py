@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from server.api.report_cache import RunReportCache, run_report_key
+from server.models.workflow.api_schemas import ValidationFailure, WorkflowRunReport
+
+
+def make_report(failure_count: int = 1) -> WorkflowRunReport:
+    return WorkflowRunReport(
+        row_count=10,
+        failure_count=failure_count,
+        filename="data.csv",
+        workflow_id="workflow_id",
+        validation_failures=[
+            ValidationFailure(message=f"Failure {index}", row_number=index)
+            for index in range(failure_count)
+        ],
+    )
+
+
+def make_key(**changes: object) -> str:
+    arguments: dict[str, object] = {
+        "file_hash": "file_hash",
+        "file_name": "data.csv",
+        "workflow_id": "workflow_id",
+        "schema_hash": "schema_hash",
+        "param_values": {"a": 1, "b": ["x", "y"]},
+        "options": {"max_failures": None, "fail_fast": False},
+    }
+    arguments.update(changes)
+    return run_report_key(**arguments)  # pyright: ignore[reportArgumentType]
+
+
+class TestRunReportKey(unittest.TestCase):
+    def test_params_are_normalized(self):
+        self.assertEqual(
+            make_key(param_values={"a": 1, "b": ["x", "y"]}),
+            make_key(param_values={"b": ["x", "y"], "a": 1}),
+        )
+
+    def test_key_depends_on_the_whole_run(self):
+        keys = {
+            make_key(),
+            make_key(file_hash="other_file_hash"),
+            make_key(file_name="data.txt"),
+            make_key(workflow_id="other_workflow_id"),
+            make_key(schema_hash="other_schema_hash"),
+            make_key(param_values={"a": 2, "b": ["x", "y"]}),
+            make_key(options={"max_failures": 1, "fail_fast": False}),
+        }
+        self.assertEqual(len(keys), 7)
+
+
+class TestRunReportCache(unittest.TestCase):
+    def setUp(self):
+        self.directory: str = self.enterContext(tempfile.TemporaryDirectory())
+
+    def test_reports_are_cached(self):
+        cache = RunReportCache(self.directory)
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", make_report())
+        self.assertEqual(cache.get("key"), make_report())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_reports_are_kept_across_restarts(self):
+        RunReportCache(self.directory).put("key", make_report())
+        self.assertEqual(RunReportCache(self.directory).get("key"), make_report())
+
+    def test_reports_are_shared_by_processes(self):
+        report_bytes = len(make_report().model_dump_json(by_alias=True))
+        first = RunReportCache(self.directory, max_bytes=2 * report_bytes)
+        second = RunReportCache(self.directory, max_bytes=2 * report_bytes)
+        first.put("a", make_report())
+        self.assertEqual(second.get("a"), make_report())
+
+        # the reports of both caches count towards the size of the directory, and
+        # "b" was used the least recently when "c" was added
+        second.put("b", make_report())
+        self.assertIsNotNone(first.get("a"))
+        first.put("c", make_report())
+        self.assertEqual(
+            sorted(path.stem for path in Path(self.directory).glob("*.json")),
+            ["a", "c"],
+        )
+        self.assertIsNone(second.get("b"))
+
+    def test_size_limit(self):
+        report_bytes = len(make_report().model_dump_json(by_alias=True))
+        cache = RunReportCache(self.directory, max_bytes=2 * report_bytes)
+        for key in ["a", "b", "a", "c"]:
+            if cache.get(key) is None:
+                cache.put(key, make_report())
+        # "b" was the least recently used report when "c" was added
+        self.assertEqual(
+            sorted(path.stem for path in Path(self.directory).glob("*.json")),
+            ["a", "c"],
+        )
+        self.assertIsNone(cache.get("b"))
+
+        # reports larger than the cache are not cached
+        cache.put("d", make_report(failure_count=100))
+        self.assertIsNone(cache.get("d"))
+
+    def test_unreadable_report_is_a_miss(self):
+        cache = RunReportCache(self.directory)
+        cache.put("key", make_report())
+        _ = Path(self.directory, "key.json").write_text("{}")
+        self.assertIsNone(cache.get("key"))
+        self.assertFalse(os.path.exists(Path(self.directory, "key.json")))
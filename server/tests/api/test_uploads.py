@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import io
+import os
+import unittest
+from pathlib import Path
+
+from server.api import uploads
+from server.api.uploads import spooled_upload, upload_resource
+
+BAD_DATA_PATH = Path(__file__).resolve().parent.parent / "workflow_runner/data/bad.csv"
+
+
+class TestUploads(unittest.TestCase):
+    def test_small_upload_is_kept_in_memory(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        with upload_resource(io.BytesIO(contents), len(contents)) as resource:
+            self.assertEqual(resource.data, contents)
+            resource.infer()
+            self.assertEqual(len(resource.read_rows()), 13)
+
+    def test_large_upload_is_spooled_to_disk(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        original_chunk_bytes = uploads.UPLOAD_CHUNK_BYTES
+        uploads.UPLOAD_CHUNK_BYTES = 64
+        self.addCleanup(setattr, uploads, "UPLOAD_CHUNK_BYTES", original_chunk_bytes)
+
+        with upload_resource(io.BytesIO(contents), 100) as resource:
+            assert resource.path is not None
+            path = resource.path
+            self.assertEqual(Path(path).read_bytes(), contents)
+            resource.infer()
+            self.assertEqual(len(resource.read_rows()), 13)
+        self.assertFalse(os.path.exists(path))
+
+    def test_compressed_upload_is_decompressed_while_read(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        compressed = gzip.compress(contents)
+        for max_memory_bytes in [len(compressed), 16]:
+            with upload_resource(io.BytesIO(compressed), max_memory_bytes) as resource:
+                self.assertEqual(resource.compression, "gz")
+                resource.infer()
+                self.assertEqual(len(resource.read_rows()), 13)
+                # the upload is kept compressed
+                if resource.path is not None:
+                    self.assertEqual(Path(resource.path).read_bytes(), compressed)
+
+    def test_upload_is_hashed_while_read(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        original_chunk_bytes = uploads.UPLOAD_CHUNK_BYTES
+        uploads.UPLOAD_CHUNK_BYTES = 64
+        self.addCleanup(setattr, uploads, "UPLOAD_CHUNK_BYTES", original_chunk_bytes)
+
+        for max_memory_bytes in [len(contents), 100]:
+            digest = hashlib.sha256()
+            with upload_resource(io.BytesIO(contents), max_memory_bytes, None, digest):
+                self.assertEqual(
+                    digest.hexdigest(), hashlib.sha256(contents).hexdigest()
+                )
+
+    def test_spooled_upload(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        with spooled_upload(io.BytesIO(contents)) as path:
+            self.assertEqual(Path(path).read_bytes(), contents)
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from datetime import timedelta
+
+from server.api.user_cache import UserCache
+from server.models.user.db_model import DBUser
+
+TEST_USER_ID = "test_user_id"
+
+
+def make_user(user_id: str = TEST_USER_ID) -> DBUser:
+    return DBUser(
+        id=user_id,
+        email="waymond@everythingeverywhere.com",
+        identity_provider="azure",
+        family_name="Wang",
+        given_name="Waymond",
+    )
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.loads = 0
+
+    async def load_user(self, user_id: str = TEST_USER_ID) -> DBUser:
+        self.loads += 1
+        # give concurrent loads of the user a chance to start
+        await asyncio.sleep(0.01)
+        return make_user(user_id)
+
+    async def test_users_are_cached(self):
+        cache = UserCache()
+        users = [await cache.load(TEST_USER_ID, self.load_user) for _ in range(3)]
+        self.assertEqual(self.loads, 1)
+        self.assertIs(users[0], users[2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    async def test_missing_users_are_not_cached(self):
+        cache = UserCache()
+
+        async def load_missing_user() -> None:
+            self.loads += 1
+
+        for _ in range(2):
+            self.assertIsNone(await cache.load(TEST_USER_ID, load_missing_user))
+        self.assertEqual(self.loads, 2)
+
+    async def test_users_expire_with_the_ttl(self):
+        cache = UserCache(ttl=timedelta(0))
+        for _ in range(2):
+            _ = await cache.load(TEST_USER_ID, self.load_user)
+        self.assertEqual(self.loads, 2)
+
+    async def test_size_limit(self):
+        cache = UserCache(max_size=2)
+        for user_id in ["a", "b", "a", "c", "a", "b"]:
+            _ = await cache.load(
+                user_id, lambda user_id=user_id: self.load_user(user_id)
+            )
+        # "b" was the least recently used user when "c" was added
+        self.assertEqual(self.loads, 4)
+
+    async def test_concurrent_loads_are_merged(self):
+        cache = UserCache()
+        users = await asyncio.gather(
+            *(cache.load(TEST_USER_ID, self.load_user) for _ in range(5))
+        )
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(all(user is users[0] for user in users))
+
+    async def test_failed_load_is_retried_by_waiting_loads(self):
+        cache = UserCache()
+
+        async def fail_to_load_user() -> DBUser:
+            self.loads += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("The database is down")
+
+        results = await asyncio.gather(
+            cache.load(TEST_USER_ID, fail_to_load_user),
+            cache.load(TEST_USER_ID, self.load_user),
+            return_exceptions=True,
+        )
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertIsInstance(results[1], DBUser)
+        self.assertEqual(self.loads, 2)
+        self.assertIs(await cache.load(TEST_USER_ID, self.load_user), results[1])
+
+    async def test_invalidate(self):
+        cache = UserCache()
+        _ = await cache.load(TEST_USER_ID, self.load_user)
+        cache.invalidate(TEST_USER_ID)
+        _ = await cache.load(TEST_USER_ID, self.load_user)
+        self.assertEqual(self.loads, 2)
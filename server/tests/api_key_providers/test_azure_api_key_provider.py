@@ -1,11 +1,19 @@
 import unittest
+import uuid
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Optional
+from typing import Dict
+from azure.core.exceptions import ResourceNotFoundError
 from azure.keyvault.secrets import SecretProperties, SecretClient
-from server.api.api_keys.azure_api_key_provider import AzureApiKeyProvider
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from server.api.api_keys.azure_api_key_provider import AzureApiKeyProvider, reconcile_azure_api_keys
+from server.database import Base
+from server.models.apikey.db_model import DBAzureApiKey
+from server.models.user.db_model import DBUser
 
 TEST_API_KEY = "test_api_key"
-TEST_USER_ID = "test_user_id"
+TEST_USER_ID = str(uuid.uuid4())
+OTHER_USER_ID = str(uuid.uuid4())
 
 class MockVaultId:
     def __init__(self, name: str):
@@ -20,28 +28,57 @@ class MockSecretAttributes:
     def __init__(self, expires_on: datetime):
         self.expires = expires_on
 
+class MockDeletePoller:
+    def __init__(self, secret: MockKeyVaultSecret):
+        self.secret = secret
+
+    def result(self) -> MockKeyVaultSecret:
+        return self.secret
+
 class MockSecretClient(SecretClient):
     def __init__(self, secrets: Dict[str, MockKeyVaultSecret]):
         self.secrets = secrets
+        self.list_calls = 0
 
-    def get_secret(self, name: str) -> Optional[MockKeyVaultSecret]:
-        return self.secrets.get(name)
+    def get_secret(self, name: str) -> MockKeyVaultSecret:
+        if name not in self.secrets:
+            raise ResourceNotFoundError(f"Secret {name} not found")
+        return self.secrets[name]
 
     def set_secret(self, api_key, user_id, **kwargs):
         self.secrets[api_key] = MockKeyVaultSecret(user_id, SecretProperties(**kwargs))
         self.secrets[api_key].properties._vault_id = MockVaultId(api_key)
         self.secrets[api_key].properties._attributes = MockSecretAttributes(kwargs.get("expires_on"))
     
+    def begin_delete_secret(self, name: str) -> MockDeletePoller:
+        if name not in self.secrets:
+            raise ResourceNotFoundError(f"Secret {name} not found")
+        return MockDeletePoller(self.secrets.pop(name))
+
     def list_properties_of_secrets(self) -> list[SecretProperties]:
+        self.list_calls += 1
         return [s.properties for s in list(self.secrets.values())]
 
 class TestAzureApiKeyProvider(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+        for user_id in [TEST_USER_ID, OTHER_USER_ID]:
+            self.session.add(DBUser(
+                id=user_id, email="", identity_provider="", family_name="", given_name=""
+            ))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
     def test_create_api_key(self):
         """Test that we can create an API key. We expect that one of the stored secrets
         in the mock client will have the same info as the one we created."""
 
         mock_client = MockSecretClient({})
-        provider = AzureApiKeyProvider(session=None, kv_client=mock_client)
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
 
         now = datetime.now(timezone.utc)
         api_key = provider.create_api_key(TEST_USER_ID, TEST_API_KEY, now + timedelta(days=1))
@@ -55,7 +92,7 @@ class TestAzureApiKeyProvider(unittest.TestCase):
     def test_get_api_key(self):
         """Test that we can get an API key."""
         mock_client = MockSecretClient({})
-        provider = AzureApiKeyProvider(session=None, kv_client=mock_client)
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
 
         now = datetime.now(timezone.utc)
         provider.create_api_key(TEST_USER_ID, TEST_API_KEY, now + timedelta(days=1))
@@ -63,10 +100,16 @@ class TestAzureApiKeyProvider(unittest.TestCase):
         api_key = provider.get_user_and_expiration(TEST_API_KEY)
         self.assertEqual(api_key, (TEST_USER_ID, now + timedelta(days=1)))
     
+    def test_get_missing_api_key(self):
+        """Test that a key that isn't in the vault is not valid."""
+        mock_client = MockSecretClient({})
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
+
     def test_expiration_date_validation_on_creation(self):
         """Test that we can't create an API key with an expired expiration date."""
         mock_client = MockSecretClient({})
-        provider = AzureApiKeyProvider(session=None, kv_client=mock_client)
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
 
         now = datetime.now(timezone.utc)
         with self.assertRaises(ValueError):
@@ -83,14 +126,14 @@ class TestAzureApiKeyProvider(unittest.TestCase):
                 )
             )
         })
-        provider = AzureApiKeyProvider(session=None, kv_client=mock_client)
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
         self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
     
     def test_get_api_keys(self):
         """Test that we can get all API keys for a user."""
         mock_client = MockSecretClient({})
-        provider = AzureApiKeyProvider(session=None, kv_client=mock_client)
-        provider.create_api_key("someotheruser", "someotherkey", datetime.now(timezone.utc) + timedelta(days=1))
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        provider.create_api_key(OTHER_USER_ID, "someotherkey", datetime.now(timezone.utc) + timedelta(days=1))
         provider.create_api_key(TEST_USER_ID, TEST_API_KEY + "1", datetime.now(timezone.utc) + timedelta(days=1))
         provider.create_api_key(TEST_USER_ID, TEST_API_KEY + "2", datetime.now(timezone.utc) + timedelta(days=1))
 
@@ -98,3 +141,68 @@ class TestAzureApiKeyProvider(unittest.TestCase):
         self.assertEqual(len(keys), 2)
         self.assertEqual(keys[0].api_key, TEST_API_KEY + "1")
         self.assertEqual(keys[1].api_key, TEST_API_KEY + "2")
+
+    def test_get_api_keys_does_not_scan_the_vault(self):
+        """Test that a user's API keys are listed from the index."""
+        mock_client = MockSecretClient({})
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+
+        keys = provider.get_api_keys(TEST_USER_ID)
+        self.assertEqual([(k.api_key, k.expiration) for k in keys], [(TEST_API_KEY, expiration)])
+        self.assertEqual(mock_client.list_calls, 0)
+
+    def test_delete_api_key(self):
+        """Test that deleting an API key removes it from the vault and the index."""
+        mock_client = MockSecretClient({})
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, datetime.now(timezone.utc) + timedelta(days=1))
+
+        self.assertTrue(provider.delete_api_key(TEST_USER_ID, TEST_API_KEY))
+        self.assertEqual(mock_client.secrets, {})
+        self.assertEqual(provider.get_api_keys(TEST_USER_ID), [])
+        self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+    def test_delete_api_key_of_other_user(self):
+        """Test that a user can't delete another user's API key, even if it isn't
+        indexed yet."""
+        mock_client = MockSecretClient({})
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(OTHER_USER_ID, TEST_API_KEY, expiration)
+        mock_client.set_secret("unindexed_key", OTHER_USER_ID, expires_on=expiration, tags={"user_id": OTHER_USER_ID})
+
+        self.assertFalse(provider.delete_api_key(TEST_USER_ID, TEST_API_KEY))
+        self.assertFalse(provider.delete_api_key(TEST_USER_ID, "unindexed_key"))
+        self.assertFalse(provider.delete_api_key(TEST_USER_ID, "missing_key"))
+        self.assertEqual(set(mock_client.secrets), {TEST_API_KEY, "unindexed_key"})
+        self.assertEqual(len(provider.get_api_keys(OTHER_USER_ID)), 1)
+
+    def test_reconcile(self):
+        """Test that reconciling syncs the index with the vault."""
+        mock_client = MockSecretClient({})
+        provider = AzureApiKeyProvider(session=self.session, kv_client=mock_client)
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, "unchanged_key", expiration)
+        provider.create_api_key(TEST_USER_ID, "changed_key", expiration)
+        provider.create_api_key(TEST_USER_ID, "deleted_key", expiration)
+
+        new_expiration = expiration + timedelta(days=1)
+        mock_client.set_secret("changed_key", TEST_USER_ID, expires_on=new_expiration, tags={"user_id": TEST_USER_ID})
+        mock_client.set_secret("unindexed_key", OTHER_USER_ID, expires_on=expiration, tags={"user_id": OTHER_USER_ID})
+        mock_client.set_secret("untagged_secret", "", expires_on=expiration)
+        del mock_client.secrets["deleted_key"]
+
+        changes = reconcile_azure_api_keys(self.session, mock_client)
+        self.assertEqual((changes.added, changes.updated, changes.removed), (1, 1, 1))
+        self.assertEqual(mock_client.list_calls, 1)
+        self.assertEqual(
+            [(k.api_key, k.expiration) for k in provider.get_api_keys(TEST_USER_ID)],
+            [("changed_key", new_expiration), ("unchanged_key", expiration)],
+        )
+        self.assertEqual([k.api_key for k in provider.get_api_keys(OTHER_USER_ID)], ["unindexed_key"])
+        self.assertEqual(len(self.session.scalars(select(DBAzureApiKey)).all()), 3)
+
+        changes = reconcile_azure_api_keys(self.session, mock_client)
+        self.assertEqual((changes.added, changes.updated, changes.removed), (0, 0, 0))
@@ -0,0 +1,132 @@
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from server.api.api_keys.api_key_provider import ApiKeyProvider
+from server.api.api_keys.caching_api_key_provider import (
+    DEFAULT_API_KEY_CACHE_TTL,
+    ApiKeyCache,
+    CachingApiKeyProvider,
+)
+from server.models.apikey.api_schemas import ApiKey
+
+TEST_API_KEY = "test_api_key"
+TEST_USER_ID = "test_user_id"
+
+
+class CountingApiKeyProvider(ApiKeyProvider):
+    """An in-memory provider that counts its key lookups."""
+
+    def __init__(self):
+        self.keys: dict[str, Tuple[str, datetime]] = {}
+        self.lookups = 0
+
+    def get_user_and_expiration(self, api_key: str) -> Optional[Tuple[str, datetime]]:
+        self.lookups += 1
+        result = self.keys.get(api_key)
+        if result and self.is_date_valid(result[1]):
+            return result
+        return None
+
+    def create_api_key(
+        self, user_id: str, api_key: str, expiration: datetime
+    ) -> ApiKey:
+        self.keys[api_key] = (user_id, expiration)
+        return ApiKey(api_key=api_key, expiration=expiration)
+
+    def delete_api_key(self, user_id: str, api_key: str) -> bool:
+        return self.keys.pop(api_key, None) is not None
+
+    def get_api_keys(self, user_id: str) -> list[ApiKey]:
+        return [
+            ApiKey(api_key=api_key, expiration=expiration)
+            for api_key, (key_user_id, expiration) in self.keys.items()
+            if key_user_id == user_id
+        ]
+
+
+class TestCachingApiKeyProvider(unittest.TestCase):
+    def make_provider(
+        self, ttl: timedelta = timedelta(hours=1), max_size: int = 100
+    ) -> tuple[CachingApiKeyProvider, CountingApiKeyProvider]:
+        inner = CountingApiKeyProvider()
+        return CachingApiKeyProvider(inner, ApiKeyCache(ttl, max_size)), inner
+
+    def test_lookups_are_cached(self):
+        provider, inner = self.make_provider()
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+
+        for _ in range(3):
+            self.assertEqual(
+                provider.get_user_and_expiration(TEST_API_KEY),
+                (TEST_USER_ID, expiration),
+            )
+            self.assertIsNone(provider.get_user_and_expiration("unknown_key"))
+        self.assertEqual(inner.lookups, 2)
+        self.assertEqual((provider.cache.hits, provider.cache.misses), (4, 2))
+
+    def test_lookups_expire_with_the_ttl(self):
+        provider, inner = self.make_provider(ttl=timedelta(0))
+        provider.get_user_and_expiration(TEST_API_KEY)
+        provider.get_user_and_expiration(TEST_API_KEY)
+        self.assertEqual(inner.lookups, 2)
+
+    def test_lookups_expire_with_the_key(self):
+        provider, inner = self.make_provider()
+        expiration = datetime.now(timezone.utc) + timedelta(milliseconds=50)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+        self.assertIsNotNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+        time.sleep(0.1)
+        self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
+        self.assertEqual(inner.lookups, 2)
+
+    def test_deleted_key_is_invalidated(self):
+        provider, _ = self.make_provider()
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+        self.assertIsNotNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+        self.assertTrue(provider.delete_api_key(TEST_USER_ID, TEST_API_KEY))
+        self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+    def test_deleted_key_expires_in_other_processes(self):
+        provider, inner = self.make_provider(ttl=timedelta(milliseconds=50))
+        # another server process, with its own cache, on the same keys
+        other_provider = CachingApiKeyProvider(
+            inner, ApiKeyCache(timedelta(milliseconds=50))
+        )
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+        self.assertIsNotNone(other_provider.get_user_and_expiration(TEST_API_KEY))
+
+        self.assertTrue(provider.delete_api_key(TEST_USER_ID, TEST_API_KEY))
+        # the other process accepts the key until its lookup expires
+        self.assertIsNotNone(other_provider.get_user_and_expiration(TEST_API_KEY))
+        time.sleep(0.1)
+        self.assertIsNone(other_provider.get_user_and_expiration(TEST_API_KEY))
+
+        # which takes a few seconds by default
+        self.assertLessEqual(DEFAULT_API_KEY_CACHE_TTL, timedelta(seconds=5))
+
+    def test_created_key_is_invalidated(self):
+        provider, _ = self.make_provider()
+        self.assertIsNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        provider.create_api_key(TEST_USER_ID, TEST_API_KEY, expiration)
+        self.assertIsNotNone(provider.get_user_and_expiration(TEST_API_KEY))
+
+    def test_size_limit(self):
+        provider, inner = self.make_provider(max_size=2)
+        for api_key in ["a", "b", "a", "c", "a", "b"]:
+            provider.get_user_and_expiration(api_key)
+        # "b" was the least recently used key when "c" was added
+        self.assertEqual(inner.lookups, 4)
+
+    def test_keys_are_not_stored(self):
+        provider, _ = self.make_provider()
+        provider.get_user_and_expiration(TEST_API_KEY)
+        self.assertNotIn(TEST_API_KEY, repr(provider.cache._lookups))
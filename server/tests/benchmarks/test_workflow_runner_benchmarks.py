@@ -0,0 +1,54 @@
+import unittest
+
+from server.benchmarks.data import generate_csv, synthetic_workflow_schema
+from server.benchmarks.workflow_runner import (
+    find_regressions,
+    run_benchmarks,
+    sample_scenario,
+    synthetic_scenario,
+)
+from server.workflow_runner.workflow_runner import execute_workflow
+
+
+class TestBenchmarkData(unittest.TestCase):
+    def test_valid_csv_has_no_failures(self):
+        schema = synthetic_workflow_schema(10)
+        contents = generate_csv(schema.fieldset_schemas[0], 200)
+        result = execute_workflow("valid.csv", contents, {}, schema)
+        self.assertEqual(result.row_count, 200)
+        self.assertEqual(result.failure_count, 0)
+
+    def test_bad_cells_are_reported(self):
+        schema = synthetic_workflow_schema(10)
+        contents = generate_csv(schema.fieldset_schemas[0], 200, bad_cell_ratio=0.1)
+        result = execute_workflow("invalid.csv", contents, {}, schema)
+        self.assertGreater(result.failure_count, 0)
+
+    def test_generation_is_deterministic(self):
+        fieldset_schema = synthetic_workflow_schema(5).fieldset_schemas[0]
+        self.assertEqual(
+            generate_csv(fieldset_schema, 50, 0.1),
+            generate_csv(fieldset_schema, 50, 0.1),
+        )
+
+
+class TestWorkflowRunnerBenchmarks(unittest.TestCase):
+    def test_find_regressions(self):
+        results = run_benchmarks(
+            [sample_scenario(50, 0.0), synthetic_scenario(50, 5, 0.0)], repeats=1
+        )
+        self.assertEqual(find_regressions(results, results, tolerance=0.0), [])
+
+        baseline = results.model_copy(deep=True)
+        baseline.scenarios[0].phases["validate_fieldset"].seconds /= 2
+        self.assertEqual(
+            [
+                regression.split(":")[0]
+                for regression in find_regressions(results, baseline, tolerance=0.2)
+            ],
+            ["sample_schema validate_fieldset"],
+        )
+
+        # scenarios run on files of another shape are not comparable
+        baseline.scenarios[0].rows = 100
+        self.assertEqual(find_regressions(results, baseline, tolerance=0.2), [])
@@ -0,0 +1,108 @@
+import datetime
+import json
+import random
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+from server.models.workflow.workflow_schema import (
+    BasicFieldDataTypeSchema,
+    FieldSchema,
+    TimestampDataTypeSchema,
+    WorkflowSchema,
+)
+from server.workflow_runner.columnar import factorize, validate_columns
+from server.workflow_runner.plan import compile_field_plan, validate_rows
+from server.workflow_runner.workflow_runner import process_workflow
+
+DIR = Path(__file__).resolve().parent
+SCHEMA_PATH = DIR / "sample_schema/workflow_schema.json"
+BAD_DATA_PATH = DIR / "data/bad.csv"
+
+CELL_VALUES = [
+    None,
+    "",
+    "42",
+    " 4.2e1 ",
+    "1_000",
+    "nan",
+    "42.0.0",
+    "1\x00",
+    "notanumber!",
+    "2021-01-01",
+    "2021-02-30",
+    "John",
+    "john",
+    42,
+    42.0,
+    True,
+    Decimal("-0"),
+    Decimal("0"),
+    datetime.date(2021, 1, 1),
+    ["a", "b"],
+]
+
+
+def field_schema(name: str, **kwargs: object) -> FieldSchema:
+    return FieldSchema.model_validate(
+        {
+            "id": name,
+            "name": name,
+            "caseSensitive": True,
+            "required": True,
+            "allowEmptyValues": False,
+            "allowedValues": None,
+            "dataTypeValidation": BasicFieldDataTypeSchema(dataType="any"),
+            **kwargs,
+        }
+    )
+
+
+class TestColumnarEngine(unittest.TestCase):
+    def test_factorize(self):
+        codes, uniques = factorize(["a", None, 1, "a", True, 1.0, None, 1])
+        self.assertEqual(codes.tolist(), [0, 1, 2, 0, 3, 4, 1, 2])
+        self.assertEqual(uniques, ["a", None, 1, True, 1.0])
+        self.assertEqual([type(value) for value in uniques[2:]], [int, bool, float])
+
+    def test_same_failures_as_row_engine(self):
+        columns = ["name", "Age", "date", "status", "extra"]
+        fields = [
+            field_schema("name", allowedValues=["John", "Jane", "42"]),
+            field_schema(
+                "age",
+                caseSensitive=False,
+                required=False,
+                dataTypeValidation=BasicFieldDataTypeSchema(dataType="number"),
+            ),
+            field_schema(
+                "date",
+                allowEmptyValues=True,
+                dataTypeValidation=TimestampDataTypeSchema(
+                    dataType="timestamp", dateTimeFormat="%Y-%m-%d"
+                ),
+            ),
+            field_schema(
+                "status",
+                dataTypeValidation=BasicFieldDataTypeSchema(dataType="number"),
+                allowedValues=["42", "nan"],
+            ),
+            field_schema("missing"),
+        ]
+        plans = [compile_field_plan(field, columns, {}, {}) for field in fields]
+
+        rng = random.Random(42)
+        rows = [[rng.choice(CELL_VALUES) for _ in columns] for _ in range(2000)]
+        self.assertEqual(
+            validate_columns(plans, rows, first_row_number=2),
+            validate_rows(plans, rows, first_row_number=2),
+        )
+
+    def test_process_workflow_engines_match(self):
+        schema = WorkflowSchema.model_validate(json.loads(SCHEMA_PATH.read_text()))
+        contents = BAD_DATA_PATH.read_text()
+        params = {"fieldset_schema": "demographic_fields"}
+        self.assertEqual(
+            process_workflow("bad.csv", contents, params, schema, engine="columnar"),
+            process_workflow("bad.csv", contents, params, schema, engine="row"),
+        )
@@ -0,0 +1,76 @@
+import unittest
+
+from server.models.workflow.api_schemas import ValidationFailure
+from server.models.workflow.workflow_schema import (
+    BasicFieldDataTypeSchema,
+    FieldSchema,
+)
+from server.workflow_runner.failures import ChainedFailures, FailureStore
+from server.workflow_runner.plan import compile_field_plan
+
+
+def number_field_plan(name: str):
+    field = FieldSchema.model_validate(
+        {
+            "id": name,
+            "name": name,
+            "caseSensitive": True,
+            "required": True,
+            "allowEmptyValues": True,
+            "allowedValues": None,
+            "dataTypeValidation": BasicFieldDataTypeSchema(dataType="number"),
+        }
+    )
+    return compile_field_plan(field, [name], {}, {})
+
+
+class TestFailureStore(unittest.TestCase):
+    def test_builds_failures_on_access(self):
+        (check,) = number_field_plan("age").checks
+        store = FailureStore()
+        store.append(ValidationFailure(message="Invalid file type"))
+        code = store.check_code(check)
+        self.assertEqual(store.check_code(check), code)
+        store.add(2, code, "abc")
+        store.add(3, code, ["a"])
+        store.add(4, code, "abc")
+
+        expected = [
+            ValidationFailure(message="Invalid file type"),
+            ValidationFailure(
+                row_number=2,
+                message="Value 'abc' for field 'age' is not a valid number",
+            ),
+            ValidationFailure(
+                row_number=3,
+                message="Value '['a']' for field 'age' is not a valid number",
+            ),
+            ValidationFailure(
+                row_number=4,
+                message="Value 'abc' for field 'age' is not a valid number",
+            ),
+        ]
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store, expected)
+        self.assertEqual(list(store), expected)
+        self.assertEqual(store[-1], expected[-1])
+        self.assertEqual(store[1:3], expected[1:3])
+        self.assertNotEqual(store, expected[:3])
+        with self.assertRaises(IndexError):
+            _ = store[4]
+
+    def test_chained_failures(self):
+        first = FailureStore()
+        first.append(ValidationFailure(message="a"))
+        second = FailureStore()
+        second.extend(
+            [
+                ValidationFailure(message="b", row_number=1),
+                ValidationFailure(message="c", row_number=2),
+            ]
+        )
+        chained = ChainedFailures([first, [], second])
+        self.assertEqual(len(chained), 3)
+        self.assertEqual([failure.message for failure in chained], ["a", "b", "c"])
+        self.assertEqual(chained[2], ValidationFailure(message="c", row_number=2))
+        self.assertEqual(ChainedFailures([]), [])
@@ -0,0 +1,179 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import override
+from unittest import mock
+
+from frictionless import Resource
+
+from server.models.workflow.workflow_schema import WorkflowSchema
+from server.workflow_runner import parallel
+from server.workflow_runner.parallel import (
+    ChunkValidationPool,
+    execute_workflow_parallel,
+    find_record_boundaries,
+)
+from server.workflow_runner.validators import WorkflowParamValue
+from server.workflow_runner.workflow_runner import execute_workflow
+
+DIR = Path(__file__).resolve().parent
+SCHEMA_PATH = DIR / "sample_schema/workflow_schema.json"
+BAD_DATA_PATH = DIR / "data/bad.csv"
+PARAM_VALUES: dict[str, WorkflowParamValue] = {"fieldset_schema": "demographic_fields"}
+
+
+class TestFindRecordBoundaries(unittest.TestCase):
+    def find(self, contents: bytes, chunk_bytes: int) -> list[int] | None:
+        with tempfile.NamedTemporaryFile(delete=False) as file:
+            file.write(contents)
+        self.addCleanup(os.unlink, file.name)
+        return find_record_boundaries(file.name, chunk_bytes)
+
+    def test_chunks_end_on_records(self):
+        contents = b"a,b\n1,2\n3,4\n5,6\n7,8"
+        self.assertEqual(self.find(contents, 1), [4, 8, 12, 16, 19])
+        self.assertEqual(self.find(contents, 5), [4, 12, 19])
+        self.assertEqual(self.find(contents, 100), [4, 19])
+
+    def test_newlines_in_quotes(self):
+        contents = b'a,"b\nc"\n"1\n2","""3\n"""\n4,5\n'
+        boundaries = self.find(contents, 1)
+        self.assertEqual(boundaries, [8, 23, 27])
+        assert boundaries is not None
+        self.assertEqual(contents[boundaries[0] : boundaries[1]], b'"1\n2","""3\n"""\n')
+
+    def test_unbalanced_quotes(self):
+        self.assertIsNone(self.find(b'a,b\n"1,2\n3,4\n', 1))
+
+    def test_quotes_in_unquoted_fields(self):
+        # as in Python's csv reader, only a quote at the start of a field opens a
+        # quoted field
+        contents = b'a,b\n1,5" screen\n2,"x\ny"\n3,z\n4,7" tv\n'
+        self.assertEqual(self.find(contents, 1), [4, 16, 24, 28, 36])
+
+
+class TestExecuteWorkflowParallel(unittest.TestCase):
+    @override
+    def setUp(self):
+        self.schema: WorkflowSchema = WorkflowSchema.model_validate(
+            json.loads(SCHEMA_PATH.read_text())
+        )
+        # bad.csv repeated, with quoted newlines and rows with extra cells, so that
+        # chunks have both baseline and fieldset failures
+        header, *rows = BAD_DATA_PATH.read_bytes().splitlines(keepends=True)
+        rows.append(b'"Papua\nNew Guinea",Port Moresby,9000000,5,Oceania,extra\n')
+        contents = header + b"".join(rows * 30)
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as file:
+            file.write(contents)
+        self.addCleanup(os.unlink, file.name)
+        self.path = file.name
+        self.contents = contents
+
+    def run_serial(self, **kwargs):
+        resource = Resource(self.contents, format="csv")
+        resource.infer()
+        return execute_workflow(
+            "data.csv", resource, PARAM_VALUES, self.schema, **kwargs
+        )
+
+    def run_parallel(self, **kwargs):
+        return execute_workflow_parallel(
+            "data.csv",
+            self.path,
+            PARAM_VALUES,
+            self.schema,
+            max_workers=2,
+            chunk_bytes=500,
+            **kwargs,
+        )
+
+    def test_same_failures_as_serial(self):
+        serial = self.run_serial()
+        parallel = self.run_parallel()
+        self.assertEqual(parallel.row_count, serial.row_count)
+        self.assertEqual(parallel.failure_count, serial.failure_count)
+        self.assertEqual(parallel.validation_failures, serial.validation_failures)
+        self.assertTrue(parallel.row_count_is_exact)
+        self.assertTrue(parallel.failure_count_is_exact)
+        # the row count validation ran on the whole file
+        self.assertEqual(parallel.row_count, 420)
+        self.assertIn(
+            "File does not have the expected row count (min: 1, max: 250)",
+            [failure.message for failure in parallel.validation_failures],
+        )
+
+    def test_quotes_in_unquoted_fields(self):
+        header, *rows = BAD_DATA_PATH.read_bytes().splitlines(keepends=True)
+        rows += [
+            b'Fiji,Suva 5" west,900000,6,Oceania\n',
+            b'"Papua\nNew Guinea",Port Moresby,9000000,5,Oceania,extra\n',
+            b'Tonga,Nuku 7" north,100000,7,Oceania\n',
+        ]
+        self.contents = header + b"".join(rows * 30)
+        _ = Path(self.path).write_bytes(self.contents)
+
+        serial = self.run_serial()
+        # chunks that start next to the quoted newlines
+        parallel = execute_workflow_parallel(
+            "data.csv",
+            self.path,
+            PARAM_VALUES,
+            self.schema,
+            max_workers=2,
+            chunk_bytes=400,
+        )
+        self.assertEqual(parallel.row_count, serial.row_count)
+        self.assertEqual(parallel.validation_failures, serial.validation_failures)
+
+    def test_shared_pool(self):
+        pool = ChunkValidationPool(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        serial = self.run_serial()
+        with mock.patch.object(
+            parallel, "ProcessPoolExecutor", wraps=parallel.ProcessPoolExecutor
+        ) as process_pool_executor:
+            for _ in range(2):
+                result = self.run_parallel(pool=pool)
+                self.assertEqual(result.validation_failures, serial.validation_failures)
+        # the runs share the processes of the pool
+        process_pool_executor.assert_called_once()
+
+    def test_max_failures_per_field(self):
+        serial = self.run_serial(max_failures_per_field=2)
+        parallel = self.run_parallel(max_failures_per_field=2)
+        self.assertEqual(parallel.validation_failures, serial.validation_failures)
+        # both are lower bounds, but each chunk counts up to the caps on its own
+        self.assertGreaterEqual(parallel.failure_count, serial.failure_count)
+        self.assertFalse(parallel.failure_count_is_exact)
+
+    def test_fail_fast(self):
+        result = self.run_parallel(fail_fast=True)
+        self.assertEqual(len(result.validation_failures), 1)
+        self.assertFalse(result.row_count_is_exact)
+        self.assertFalse(result.failure_count_is_exact)
+
+    def test_small_file_runs_serially(self):
+        result = execute_workflow_parallel(
+            "bad.csv", str(BAD_DATA_PATH), PARAM_VALUES, self.schema
+        )
+        self.assertEqual(result.row_count, 13)
+        self.assertEqual(len(result.validation_failures), 11)
+
+    def test_compressed_file_runs_serially(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False) as file:
+            file.write(gzip.compress(self.contents))
+        self.addCleanup(os.unlink, file.name)
+        result = execute_workflow_parallel(
+            "data.csv.gz",
+            file.name,
+            PARAM_VALUES,
+            self.schema,
+            max_workers=2,
+            chunk_bytes=500,
+        )
+        self.assertEqual(
+            result.validation_failures, self.run_serial().validation_failures
+        )
@@ -0,0 +1,144 @@
+import json
+import unittest
+from pathlib import Path
+from typing import override
+
+from server.models.workflow.api_schemas import ValidationFailure
+from server.models.workflow.workflow_schema import (
+    BasicFieldDataTypeSchema,
+    FieldSchema,
+    FileTypeValidation,
+    RowCountValidation,
+    WorkflowSchema,
+)
+from server.workflow_runner.plan import (
+    CompiledWorkflow,
+    FieldsetPlan,
+    compile_field_plan,
+    compile_workflow_plan,
+    validate_rows,
+)
+
+DIR = Path(__file__).resolve().parent
+SCHEMA_PATH = DIR / "sample_schema/workflow_schema.json"
+
+
+def field_schema(name: str, **kwargs: object) -> FieldSchema:
+    return FieldSchema.model_validate(
+        {
+            "id": name,
+            "name": name,
+            "caseSensitive": True,
+            "required": True,
+            "allowEmptyValues": False,
+            "allowedValues": None,
+            "dataTypeValidation": BasicFieldDataTypeSchema(dataType="any"),
+            **kwargs,
+        }
+    )
+
+
+class TestCompileWorkflowPlan(unittest.TestCase):
+    @override
+    def setUp(self):
+        self.schema: WorkflowSchema = WorkflowSchema.model_validate(
+            json.loads(SCHEMA_PATH.read_text())
+        )
+
+    def test_resolves_operations(self):
+        plan = compile_workflow_plan(
+            self.schema,
+            {"fieldset_schema": "demographic_fields"},
+            ["continent", "country", "capital", "population", "population_rank"],
+        )
+        self.assertIsNone(plan.param_failure)
+        self.assertIsInstance(plan.operations[0], FileTypeValidation)
+        self.assertIsInstance(plan.operations[1], RowCountValidation)
+
+        fieldset_plan = plan.operations[2]
+        assert isinstance(fieldset_plan, FieldsetPlan)
+        self.assertEqual(fieldset_plan.fieldset_schema.name, "demographic_fields")
+        self.assertEqual(
+            [(field.name, field.column_index) for field in fieldset_plan.fields],
+            [
+                ("country", 1),
+                ("capital", 2),
+                ("population", 3),
+                ("population_rank", 4),
+                ("continent", 0),
+            ],
+        )
+
+    def test_param_is_not_a_string(self):
+        plan = compile_workflow_plan(self.schema, {"fieldset_schema": ["a"]}, [])
+        self.assertEqual(plan.operations, ())
+        self.assertEqual(
+            plan.param_failure,
+            ValidationFailure(
+                message="The param value referenced with fieldset_schema is not a string."
+            ),
+        )
+
+
+class TestCompiledWorkflow(unittest.TestCase):
+    @override
+    def setUp(self):
+        self.schema: WorkflowSchema = WorkflowSchema.model_validate(
+            json.loads(SCHEMA_PATH.read_text())
+        )
+
+    def test_plans_are_reused(self):
+        workflow = CompiledWorkflow(self.schema, max_plans=2)
+        params = {"fieldset_schema": "demographic_fields"}
+        columns = ["continent", "country", "capital", "population", "population_rank"]
+
+        plan = workflow.compile_plan(params, columns)
+        self.assertEqual(len(plan.operations), 3)
+        self.assertIs(workflow.compile_plan(dict(params), list(columns)), plan)
+
+        # another header gets its own plan
+        reordered_plan = workflow.compile_plan(params, columns[::-1])
+        self.assertIsNot(reordered_plan, plan)
+        self.assertIs(workflow.compile_plan(params, columns), plan)
+
+        # the least recently used plan is dropped
+        _ = workflow.compile_plan(params, [])
+        self.assertIs(workflow.compile_plan(params, columns), plan)
+        self.assertIsNot(workflow.compile_plan(params, columns[::-1]), reordered_plan)
+
+
+class TestCompileFieldPlan(unittest.TestCase):
+    def test_case_insensitive_column_index(self):
+        field = field_schema("name", caseSensitive=False)
+        self.assertEqual(
+            compile_field_plan(field, ["NAME", "age"], {}, {}).column_index, 0
+        )
+        self.assertIsNone(
+            compile_field_plan(
+                field_schema("name"), ["NAME", "age"], {}, {}
+            ).column_index
+        )
+
+    def test_missing_column_is_empty(self):
+        plan = compile_field_plan(field_schema("name"), ["age"], {}, {})
+        self.assertEqual(
+            validate_rows((plan,), [["42"]]),
+            [
+                ValidationFailure(
+                    row_number=1, message="Empty value for the field 'name'"
+                )
+            ],
+        )
+
+    def test_messages_with_braces(self):
+        field = field_schema("{name}", allowedValues=["a"])
+        plan = compile_field_plan(field, ["{name}"], {}, {})
+        self.assertEqual(
+            validate_rows((plan,), [["{b}"]], first_row_number=3),
+            [
+                ValidationFailure(
+                    row_number=3,
+                    message="Value '{b}' is not allowed for field '{name}'",
+                )
+            ],
+        )
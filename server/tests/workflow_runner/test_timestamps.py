@@ -0,0 +1,129 @@
+import datetime
+import random
+import re
+import unittest
+
+from server.workflow_runner.timestamps import compile_timestamp_matcher
+
+FORMATS = [
+    "%Y-%m-%d",
+    "%m/%d/%y",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%d%m%Y",
+    "%H:%M",
+    "%m-%d",
+    "%y %Y",
+    "100%% %Y",
+    "%Y-%b-%d",
+    "%Y%",
+]
+
+# building blocks of random timestamps: valid and invalid numbers, separators and
+# characters that regexes or int() treat specially
+PIECES = [
+    "0",
+    "00",
+    "1",
+    "01",
+    "02",
+    "12",
+    "13",
+    "29",
+    "30",
+    "31",
+    "32",
+    "59",
+    "60",
+    "61",
+    "68",
+    "69",
+    "99",
+    "0000",
+    "1900",
+    "2000",
+    "2021",
+    "2024",
+    "123456",
+    "1234567",
+    " 5",
+    "-",
+    "/",
+    ":",
+    ".",
+    " ",
+    "  ",
+    "\t",
+    "T",
+    "t",
+    "%",
+    "100% ",
+    "Jan",
+    "jan",
+    "２０２１",
+    "１２",
+    "",
+]
+
+
+def strptime_matches(value: str, date_time_format: str) -> bool:
+    try:
+        _ = datetime.datetime.strptime(value, date_time_format)
+    except ValueError:
+        return False
+    return True
+
+
+class TestTimestampMatcher(unittest.TestCase):
+    def test_same_as_strptime(self):
+        rng = random.Random(42)
+        for date_time_format in FORMATS:
+            matches = compile_timestamp_matcher(date_time_format)
+            # valid timestamps, so that most values aren't rejected by the regex
+            values = [
+                datetime.datetime(2000, 1, 1)
+                .replace(
+                    year=rng.randint(1, 9999),
+                    month=rng.randint(1, 12),
+                    day=rng.randint(1, 28),
+                    hour=rng.randint(0, 23),
+                    minute=rng.randint(0, 59),
+                    second=rng.randint(0, 59),
+                    microsecond=rng.randint(0, 999999),
+                )
+                .strftime(date_time_format)
+                for _ in range(200)
+            ]
+            values.extend(
+                "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 7)))
+                for _ in range(3000)
+            )
+            for value in values:
+                self.assertEqual(
+                    matches(value),
+                    strptime_matches(value, date_time_format),
+                    f"{value!r} with format {date_time_format!r}",
+                )
+
+    def test_impossible_dates(self):
+        matches = compile_timestamp_matcher("%Y-%m-%d")
+        self.assertTrue(matches("2024-02-29"))
+        self.assertFalse(matches("2023-02-29"))
+        self.assertFalse(matches("2023-04-31"))
+        self.assertFalse(matches("0000-01-01"))
+        self.assertFalse(compile_timestamp_matcher("%m-%d")("02-29"))
+        self.assertFalse(compile_timestamp_matcher("%H:%M:%S")("12:00:60"))
+
+    def test_cached_by_format(self):
+        self.assertIs(
+            compile_timestamp_matcher("%Y-%m-%d"),
+            compile_timestamp_matcher("%Y-%m-%d"),
+        )
+
+    def test_invalid_format(self):
+        # strptime can't build a regex for a format with a repeated directive
+        matches = compile_timestamp_matcher("%Y-%Y")
+        with self.assertRaises(re.error):
+            _ = datetime.datetime.strptime("2021-2021", "%Y-%Y")
+        with self.assertRaises(re.error):
+            _ = matches("2021-2021")
@@ -1,4 +1,8 @@
+import bz2
+import gzip
+import lzma
 import unittest
+from typing import Any
 from unittest.mock import MagicMock
 
 from server.models.workflow.api_schemas import ValidationFailure
@@ -12,9 +16,13 @@ from server.models.workflow.workflow_schema import (
     TimestampDataTypeSchema,
     WorkflowParam,
 )
+from server.workflow_runner.plan import compile_field_plan, validate_rows
 from server.workflow_runner.validators import (
+    CheckMemo,
+    ValidationEngine,
     WorkflowParamValue,
     check_csv_columns,
+    detect_compression,
     validate_field,
     validate_fieldset,
     validate_file_type,
@@ -51,6 +59,39 @@ class TestValidateFile(unittest.TestCase):
             ],
         )
 
+    def test_validate_compressed_file_type(self):
+        """
+        Test that the extension of a compressed file is ignored
+        """
+        validation = FileTypeValidation(
+            type="fileTypeValidation",
+            id="123",
+            expectedFileType="csv",
+            title="File type validation",
+            description=None,
+        )
+        for file_name in ["file.csv.gz", "file.csv.bz2", "file.csv.xz"]:
+            self.assertEqual(validate_file_type(file_name, validation), [])
+        self.assertEqual(
+            validate_file_type("file.txt.gz", validation),
+            [
+                ValidationFailure(
+                    message="File file.txt.gz does not have the expected file type csv",
+                    row_number=None,
+                )
+            ],
+        )
+
+
+class TestDetectCompression(unittest.TestCase):
+    def test_detect_compression(self):
+        contents = b"a,b\n1,2\n"
+        self.assertEqual(detect_compression(gzip.compress(contents)), "gz")
+        self.assertEqual(detect_compression(bz2.compress(contents)), "bz2")
+        self.assertEqual(detect_compression(lzma.compress(contents)), "xz")
+        self.assertIsNone(detect_compression(contents))
+        self.assertIsNone(detect_compression(b""))
+
 
 class TestValidateRowCount(unittest.TestCase):
     def test_validate_row_count(self):
@@ -249,6 +290,20 @@ class TestCheckCsvColumns(unittest.TestCase):
 
 
 class TestValidateField(unittest.TestCase):
+    engine: ValidationEngine = "row"
+
+    def validate_field(
+        self,
+        row_num: int,
+        row: dict[str, Any],
+        field: FieldSchema,
+        param_schemas: dict[str, WorkflowParam],
+        param_values: dict[str, WorkflowParamValue],
+    ) -> list[ValidationFailure]:
+        return validate_field(
+            row_num, row, field, param_schemas, param_values, engine=self.engine
+        )
+
     def test_validate_field_case_insensitive(self):
         field = mock_field_schema(
             "name",
@@ -257,9 +312,9 @@ class TestValidateField(unittest.TestCase):
             allow_empty_values=False,
             allowed_values=None,
         )
-        self.assertEqual(validate_field(1, {"Name": "John"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"Name": "John"}, field, {}, {}), [])
         self.assertEqual(
-            validate_field(1, {"Name": ""}, field, {}, {}),
+            self.validate_field(1, {"Name": ""}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1, message="Empty value for the field 'name'"
@@ -273,18 +328,18 @@ class TestValidateField(unittest.TestCase):
             "name",
             allow_empty_values=True,
         )
-        self.assertEqual(validate_field(1, {"name": "John"}, field, {}, {}), [])
-        self.assertEqual(validate_field(1, {"name": ""}, field, {}, {}), [])
-        self.assertEqual(validate_field(1, {"name": None}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": "John"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": ""}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": None}, field, {}, {}), [])
 
         # now disallow empty values
         field = mock_field_schema(
             "name",
             allow_empty_values=False,
         )
-        self.assertEqual(validate_field(1, {"name": "John"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": "John"}, field, {}, {}), [])
         self.assertEqual(
-            validate_field(1, {"name": ""}, field, {}, {}),
+            self.validate_field(1, {"name": ""}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1, message="Empty value for the field 'name'"
@@ -292,7 +347,7 @@ class TestValidateField(unittest.TestCase):
             ],
         )
         self.assertEqual(
-            validate_field(1, {"name": None}, field, {}, {}),
+            self.validate_field(1, {"name": None}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1, message="Empty value for the field 'name'"
@@ -308,10 +363,10 @@ class TestValidateField(unittest.TestCase):
             allow_empty_values=False,
             allowed_values=["John", "Jane"],
         )
-        self.assertEqual(validate_field(1, {"name": "John"}, field, {}, {}), [])
-        self.assertEqual(validate_field(1, {"name": "Jane"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": "John"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"name": "Jane"}, field, {}, {}), [])
         self.assertEqual(
-            validate_field(1, {"name": "Bob"}, field, {}, {}),
+            self.validate_field(1, {"name": "Bob"}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1, message="Value 'Bob' is not allowed for field 'name'"
@@ -339,13 +394,13 @@ class TestValidateField(unittest.TestCase):
         }
         params: dict[str, WorkflowParamValue] = {"allowed_names": ["John", "Jane"]}
         self.assertEqual(
-            validate_field(1, {"name": "John"}, field, param_schemas, params), []
+            self.validate_field(1, {"name": "John"}, field, param_schemas, params), []
         )
         self.assertEqual(
-            validate_field(1, {"name": "Jane"}, field, param_schemas, params), []
+            self.validate_field(1, {"name": "Jane"}, field, param_schemas, params), []
         )
         self.assertEqual(
-            validate_field(1, {"name": "Bob"}, field, param_schemas, params),
+            self.validate_field(1, {"name": "Bob"}, field, param_schemas, params),
             [
                 ValidationFailure(
                     row_number=1, message="Value 'Bob' is not allowed for field 'name'"
@@ -362,10 +417,10 @@ class TestValidateField(unittest.TestCase):
             allowed_values=None,
             data_type_validation=BasicFieldDataTypeSchema(dataType="number"),
         )
-        self.assertEqual(validate_field(1, {"age": "42"}, field, {}, {}), [])
-        self.assertEqual(validate_field(1, {"age": "42.0"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"age": "42"}, field, {}, {}), [])
+        self.assertEqual(self.validate_field(1, {"age": "42.0"}, field, {}, {}), [])
         self.assertEqual(
-            validate_field(1, {"age": "42.0.0"}, field, {}, {}),
+            self.validate_field(1, {"age": "42.0.0"}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1,
@@ -385,9 +440,11 @@ class TestValidateField(unittest.TestCase):
                 dataType="timestamp", dateTimeFormat="%Y-%m-%d"
             ),
         )
-        self.assertEqual(validate_field(1, {"date": "2021-01-01"}, field, {}, {}), [])
         self.assertEqual(
-            validate_field(1, {"date": "2021-01-01 00:00:00.000"}, field, {}, {}),
+            self.validate_field(1, {"date": "2021-01-01"}, field, {}, {}), []
+        )
+        self.assertEqual(
+            self.validate_field(1, {"date": "2021-01-01 00:00:00.000"}, field, {}, {}),
             [
                 ValidationFailure(
                     row_number=1,
@@ -401,6 +458,25 @@ class TestValidateField(unittest.TestCase):
 
 
 class TestValidateFieldSet(unittest.TestCase):
+    engine: ValidationEngine = "row"
+
+    def validate_fieldset(
+        self,
+        csv_columns: list[str],
+        csv_data: list[dict[str, Any]],
+        fieldset_schema: FieldsetSchema,
+        param_schemas: dict[str, WorkflowParam],
+        param_values: dict[str, WorkflowParamValue],
+    ) -> list[ValidationFailure]:
+        return validate_fieldset(
+            csv_columns,
+            csv_data,
+            fieldset_schema,
+            param_schemas,
+            param_values,
+            engine=self.engine,
+        )
+
     def test_validate_fieldset_with_bad_data(self):
         fieldset_schema = FieldsetSchema(
             id="123",
@@ -433,7 +509,7 @@ class TestValidateFieldSet(unittest.TestCase):
         )
 
         self.assertEqual(
-            validate_fieldset(
+            self.validate_fieldset(
                 ["name", "age", "city"],
                 [{"name": "John", "age": "42", "city": "New York"}],
                 fieldset_schema,
@@ -443,7 +519,7 @@ class TestValidateFieldSet(unittest.TestCase):
             [],
         )
         self.assertEqual(
-            validate_fieldset(
+            self.validate_fieldset(
                 ["name", "age", "city"],
                 [{"name": "John", "age": "42", "city": ""}],
                 fieldset_schema,
@@ -457,7 +533,7 @@ class TestValidateFieldSet(unittest.TestCase):
             ],
         )
         self.assertEqual(
-            validate_fieldset(
+            self.validate_fieldset(
                 ["name", "age", "city"],
                 [{"name": "John", "age": None, "city": "New York"}],
                 fieldset_schema,
@@ -470,3 +546,52 @@ class TestValidateFieldSet(unittest.TestCase):
                 )
             ],
         )
+
+
+class TestValidateFieldColumnar(TestValidateField):
+    engine: ValidationEngine = "columnar"
+
+
+class TestValidateFieldSetColumnar(TestValidateFieldSet):
+    engine: ValidationEngine = "columnar"
+
+
+class TestCheckMemo(unittest.TestCase):
+    def test_memoized_checks_have_the_same_outcomes(self):
+        field = mock_field_schema(
+            "day",
+            allowed_values=["1", "2"],
+            data_type_validation=TimestampDataTypeSchema(
+                dataType="timestamp", dateTimeFormat="%d"
+            ),
+        )
+        plan = compile_field_plan(field, ["day"], {}, {})
+        memo = CheckMemo()
+        memoized_plan = memo.memoize_fields([plan])
+        # `1` and `True` are equal, but only `str(1)` is a valid day
+        rows: list[list[Any]] = [["1"], ["3"], [1], [True], ["1"], [1], [True], [""]]
+
+        self.assertEqual(
+            validate_rows(memoized_plan, rows), validate_rows([plan], rows)
+        )
+        # the empty value check isn't memoized
+        self.assertEqual(memo.misses, 2 * 5)
+        self.assertEqual(memo.hits, 2 * 3)
+
+    def test_stops_memoizing_high_cardinality_checks(self):
+        field = mock_field_schema(
+            "amount", data_type_validation=BasicFieldDataTypeSchema(dataType="number")
+        )
+        memo = CheckMemo(max_values=10)
+        (memoized_plan,) = memo.memoize_fields(
+            [compile_field_plan(field, ["amount"], {}, {})]
+        )
+        (check,) = [
+            check for check in memoized_plan.checks if check.kind == "invalidNumber"
+        ]
+        for i in range(100):
+            self.assertFalse(check.is_invalid(str(i)))
+        self.assertTrue(check.is_invalid("abc"))
+        # the check is run directly once the memo was found to be useless
+        self.assertEqual(memo.misses, 11)
+        self.assertEqual(memo.hits, 0)
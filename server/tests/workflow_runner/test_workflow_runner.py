@@ -1,12 +1,22 @@
+import gzip
 import json
 import unittest
 from pathlib import Path
 from typing import override
+from unittest import mock
 
 from frictionless import Resource
 
+from server.models.workflow.api_schemas import ValidationFailure
 from server.models.workflow.workflow_schema import WorkflowSchema
-from server.workflow_runner.workflow_runner import process_workflow
+from server.workflow_runner import workflow_runner
+from server.workflow_runner.validators import ValidationEngine, parse_frictionless
+from server.workflow_runner.workflow_runner import (
+    WorkflowRun,
+    execute_workflow,
+    execute_workflows,
+    process_workflow,
+)
 
 DIR = Path(__file__).resolve().parent
 SCHEMA_PATH = DIR / "sample_schema/workflow_schema.json"
@@ -15,6 +25,8 @@ BAD_DATA_PATH = DIR / "data/bad.csv"
 
 
 class TestWorkflowRunner(unittest.TestCase):
+    engine: ValidationEngine = "row"
+
     @override
     def setUp(self):
         self.schema: WorkflowSchema = WorkflowSchema.model_validate(
@@ -25,7 +37,11 @@ class TestWorkflowRunner(unittest.TestCase):
         with GOOD_DATA_PATH.open() as f:
             contents = f.read()
         failures = process_workflow(
-            "good.csv", contents, {"fieldset_schema": "demographic_fields"}, self.schema
+            "good.csv",
+            contents,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
         )
         self.assertEqual(failures, [])
 
@@ -33,7 +49,11 @@ class TestWorkflowRunner(unittest.TestCase):
         with BAD_DATA_PATH.open() as f:
             contents = f.read()
         failures = process_workflow(
-            "bad.csv", contents, {"fieldset_schema": "demographic_fields"}, self.schema
+            "bad.csv",
+            contents,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
         )
         # 4 rows are missing population, which is a required field and also not a valid number
         self.assertEqual(len(failures), 11)
@@ -44,7 +64,11 @@ class TestWorkflowRunner(unittest.TestCase):
             contents = f.read()
         resource = Resource(contents.encode("utf-8"), format="csv")
         failures = process_workflow(
-            "good.csv", resource, {"fieldset_schema": "demographic_fields"}, self.schema
+            "good.csv",
+            resource,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
         )
         self.assertEqual(failures, [])
 
@@ -52,7 +76,11 @@ class TestWorkflowRunner(unittest.TestCase):
             contents = f.read()
         resource = Resource(contents.encode("utf-8"), format="csv")
         failures = process_workflow(
-            "bad.csv", resource, {"fieldset_schema": "demographic_fields"}, self.schema
+            "bad.csv",
+            resource,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
         )
         self.assertEqual(len(failures), 11)
 
@@ -69,5 +97,260 @@ class TestWorkflowRunner(unittest.TestCase):
             {"fieldset_schema": "demographic_fields"},
             self.schema,
             implicit_frictionless_validation=False,
+            engine=self.engine,
         )
         self.assertEqual(len(failures_without_flag), 10)
+
+    def test_row_count(self):
+        result = execute_workflow(
+            "bad.csv",
+            BAD_DATA_PATH.read_text(),
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
+        )
+        # the blank row is counted too
+        self.assertEqual(result.row_count, 13)
+        self.assertEqual(len(result.validation_failures), 11)
+        self.assertGreater(result.stats.check_memo_hits, 0)
+        self.assertGreater(result.stats.check_memo_misses, 0)
+        self.assertIsNone(result.stats.timings)
+
+    def test_several_workflows_on_one_file(self):
+        contents = BAD_DATA_PATH.read_text()
+        param_values = {"fieldset_schema": "demographic_fields"}
+        without_fieldset = self.schema.model_copy(
+            update={
+                "operations": [
+                    operation
+                    for operation in self.schema.operations
+                    if operation.type != "fieldsetSchemaValidation"
+                ]
+            }
+        )
+        runs = [
+            WorkflowRun(workflow=self.schema, param_values=param_values),
+            WorkflowRun(workflow=without_fieldset, param_values=param_values),
+            WorkflowRun(workflow=self.schema, param_values=param_values),
+        ]
+        for max_failures in [None, 1, 3]:
+            with mock.patch.object(
+                workflow_runner, "load_resource", wraps=workflow_runner.load_resource
+            ) as load_resource:
+                results = execute_workflows(
+                    "bad.csv",
+                    contents,
+                    runs,
+                    engine=self.engine,
+                    max_failures=max_failures,
+                )
+            load_resource.assert_called_once()
+
+            self.assertEqual(len(results), len(runs))
+            for run, result in zip(runs, results):
+                expected = execute_workflow(
+                    "bad.csv",
+                    contents,
+                    run.param_values,
+                    run.workflow,
+                    engine=self.engine,
+                    max_failures=max_failures,
+                )
+                self.assertEqual(result.row_count, expected.row_count)
+                self.assertEqual(result.row_count_is_exact, expected.row_count_is_exact)
+                self.assertEqual(result.failure_count, expected.failure_count)
+                self.assertEqual(
+                    list(result.validation_failures),
+                    list(expected.validation_failures),
+                )
+
+    def test_profiled_run(self):
+        result = execute_workflow(
+            "bad.csv",
+            BAD_DATA_PATH.read_text(),
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
+            profile=True,
+        )
+        timings = result.stats.timings
+        assert timings is not None
+        self.assertEqual(
+            [(timing.operation_id, timing.type) for timing in timings.operations],
+            [(operation.id, operation.type) for operation in self.schema.operations],
+        )
+        stages = [
+            timings.parse_seconds,
+            timings.baseline_validation_seconds,
+            timings.row_materialization_seconds,
+            *(timing.seconds for timing in timings.operations),
+        ]
+        self.assertTrue(all(seconds > 0 for seconds in stages))
+        self.assertLessEqual(sum(stages), timings.total_seconds)
+        self.assertAlmostEqual(
+            timings.rows_per_second, result.row_count / timings.total_seconds
+        )
+        self.assertAlmostEqual(timings.cells_per_second, timings.rows_per_second * 5)
+        self.assertEqual(result.to_report("bad.csv", "id").timings, timings)
+
+    def test_same_baseline_failures_as_frictionless(self):
+        contents = BAD_DATA_PATH.read_text()
+        _, frictionless_failures = parse_frictionless(contents)
+        failures = process_workflow(
+            "bad.csv",
+            contents,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
+        )
+        self.assertEqual(failures[: len(frictionless_failures)], frictionless_failures)
+
+    def test_rows_are_validated_in_batches(self):
+        contents = BAD_DATA_PATH.read_text()
+        params = {"fieldset_schema": "demographic_fields"}
+        failures = process_workflow(
+            "bad.csv", contents, params, self.schema, engine=self.engine
+        )
+        with mock.patch.object(workflow_runner, "ROW_BATCH_SIZE", 2):
+            batched_failures = process_workflow(
+                "bad.csv", contents, params, self.schema, engine=self.engine
+            )
+        self.assertEqual(batched_failures, failures)
+
+    def test_max_failures(self):
+        contents = BAD_DATA_PATH.read_text()
+        params = {"fieldset_schema": "demographic_fields"}
+        failures = process_workflow(
+            "bad.csv", contents, params, self.schema, engine=self.engine
+        )
+        result = execute_workflow(
+            "bad.csv",
+            contents,
+            params,
+            self.schema,
+            engine=self.engine,
+            max_failures=3,
+        )
+        # the first failures that were found are reported
+        self.assertEqual(len(result.validation_failures), 3)
+        for failure in result.validation_failures:
+            self.assertIn(failure, failures)
+        self.assertGreaterEqual(result.failure_count, 3)
+        self.assertFalse(result.failure_count_is_exact)
+        self.assertFalse(result.row_count_is_exact)
+
+        # a cap that isn't reached doesn't change anything
+        result = execute_workflow(
+            "bad.csv",
+            contents,
+            params,
+            self.schema,
+            engine=self.engine,
+            max_failures=11,
+        )
+        self.assertEqual(result.validation_failures, failures)
+        self.assertEqual(result.failure_count, 11)
+        self.assertTrue(result.failure_count_is_exact)
+        self.assertEqual(result.row_count, 13)
+
+    def test_max_failures_per_field(self):
+        result = execute_workflow(
+            "bad.csv",
+            BAD_DATA_PATH.read_text(),
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            implicit_frictionless_validation=False,
+            engine=self.engine,
+            max_failures_per_field=1,
+        )
+        # one failure for each of the 5 fields, the first of which is on population
+        self.assertEqual(len(result.validation_failures), 5)
+        self.assertEqual(
+            result.validation_failures[0].message,
+            "Empty value for the field 'population'",
+        )
+        self.assertFalse(result.failure_count_is_exact)
+        # the whole file is still read
+        self.assertEqual(result.row_count, 13)
+        self.assertTrue(result.row_count_is_exact)
+
+    def test_field_reaching_its_cap(self):
+        header, *rows = GOOD_DATA_PATH.read_text().splitlines()[:6]
+        # 5 rows without a population
+        rows = [row.split(",") for row in rows]
+        contents = "\n".join([header] + [f"{a},{b},,{d},{e}" for a, b, _, d, e in rows])
+        result = execute_workflow(
+            "data.csv",
+            contents,
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            implicit_frictionless_validation=False,
+            engine=self.engine,
+            max_failures_per_field=1,
+        )
+        self.assertEqual(len(result.validation_failures), 1)
+        # the rows after the first one aren't checked for the field, so both engines
+        # only count its first failure, as a lower bound
+        self.assertEqual(result.failure_count, 1)
+        self.assertFalse(result.failure_count_is_exact)
+
+    def test_fail_fast(self):
+        result = execute_workflow(
+            "bad.csv",
+            BAD_DATA_PATH.read_text(),
+            {"fieldset_schema": "demographic_fields"},
+            self.schema,
+            engine=self.engine,
+            fail_fast=True,
+        )
+        self.assertEqual(len(result.validation_failures), 1)
+        self.assertFalse(result.failure_count_is_exact)
+        self.assertFalse(result.row_count_is_exact)
+
+    def test_on_compressed_data(self):
+        contents = BAD_DATA_PATH.read_bytes()
+        params = {"fieldset_schema": "demographic_fields"}
+        failures = process_workflow(
+            "bad.csv", contents, params, self.schema, engine=self.engine
+        )
+        self.assertEqual(len(failures), 11)
+        self.assertEqual(
+            process_workflow(
+                "bad.csv.gz",
+                gzip.compress(contents),
+                params,
+                self.schema,
+                engine=self.engine,
+            ),
+            failures,
+        )
+
+    def test_stream_workflow(self):
+        contents = BAD_DATA_PATH.read_text()
+        params = {"fieldset_schema": "demographic_fields"}
+        result = execute_workflow(
+            "bad.csv", contents, params, self.schema, engine=self.engine
+        )
+        run = workflow_runner.stream_workflow(
+            "bad.csv", contents, params, self.schema, engine=self.engine
+        )
+        batches: list[list[ValidationFailure]] = []
+        while True:
+            try:
+                batches.append(next(run))
+            except StopIteration as stop:
+                streamed_result = stop.value
+                break
+
+        # the failures come in several batches while the rows are read
+        self.assertGreater(len(batches), 1)
+        streamed = [failure for batch in batches for failure in batch]
+        self.assertCountEqual(streamed, list(result.validation_failures))
+        self.assertEqual(
+            streamed_result.validation_failures, result.validation_failures
+        )
+        self.assertEqual(streamed_result.row_count, 13)
+
+
+class TestWorkflowRunnerColumnar(TestWorkflowRunner):
+    engine: ValidationEngine = "columnar"
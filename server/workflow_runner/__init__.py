@@ -1,6 +1,23 @@
 
-from .workflow_runner import process_workflow 
+from .parallel import ChunkValidationPool, execute_workflow_parallel
+from .plan import CompiledWorkflow
+from .workflow_runner import (
+    WorkflowRun,
+    WorkflowRunResult,
+    execute_workflow,
+    execute_workflows,
+    process_workflow,
+    stream_workflow,
+)
 
 __all__ = [
-    "process_workflow"
+    "ChunkValidationPool",
+    "CompiledWorkflow",
+    "WorkflowRun",
+    "WorkflowRunResult",
+    "execute_workflow",
+    "execute_workflow_parallel",
+    "execute_workflows",
+    "process_workflow",
+    "stream_workflow"
 ]
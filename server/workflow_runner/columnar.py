@@ -0,0 +1,232 @@
+"""Columnar validation engine.
+
+Instead of walking the file row by row, this engine validates one column at a time.
+Empty values are found with array comparisons, numbers are parsed with batched numpy
+casts, and the other checks run once per distinct value of a column with the results
+broadcast back to the cells as boolean masks. Failures are only built at the end, from
+the masks of bad cells, in the same order as the row engine reports them.
+"""
+
+from collections.abc import Sequence
+from functools import cached_property
+from operator import itemgetter
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from .failures import FailureStore, value_key
+from .plan import FailureBudget, FieldCheck, FieldPlan
+
+BoolArray = npt.NDArray[np.bool_]
+IndexArray = npt.NDArray[np.intp]
+
+_STRING_TYPES = {str, type(None)}
+
+# number of strings parsed per numpy cast, and the smaller sizes a failing batch is
+# split into before checking its strings one by one
+_NUMBER_BATCH_SIZES = (4096, 64)
+
+
+def factorize(values: list[Any]) -> tuple[IndexArray, list[Any]]:
+    """Encode a column as an array of codes into the list of its distinct values."""
+    # csv columns are mostly plain strings, which can be used as keys directly
+    keys = (
+        values
+        if set(map(type, values)) <= _STRING_TYPES
+        else list(map(value_key, values))
+    )
+    # map every cell to the row where its value first appears, then renumber those rows
+    first_seen: dict[Any, int] = {}
+    first_rows = np.fromiter(
+        map(first_seen.setdefault, keys, range(len(keys))),
+        dtype=np.intp,
+        count=len(keys),
+    )
+    unique_rows, codes = np.unique(first_rows, return_inverse=True)
+    return codes, [values[row] for row in unique_rows.tolist()]
+
+
+def _is_float(value: str) -> bool:
+    try:
+        _ = float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def find_unparseable_numbers(strings: npt.NDArray[np.object_]) -> BoolArray:
+    """Get the mask of strings that `float()` can't parse.
+
+    The strings are cast to float64 in batches with numpy (an object array cast calls
+    `float()` on each item, so it accepts exactly the same strings). A batch that fails
+    is retried in smaller batches, and only the smallest failing batches are checked
+    string by string, once per distinct string. So clean data doesn't pay for a Python
+    call per cell and dirty data doesn't pay for an exception per cell.
+    """
+    unparseable = np.zeros(len(strings), dtype=np.bool_)
+    known: dict[str, bool] = {}
+
+    def parse(start: int, stop: int, batch_sizes: tuple[int, ...]):
+        batch_size, *smaller_batch_sizes = batch_sizes
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            try:
+                _ = strings[batch_start:batch_stop].astype(np.float64)
+                continue
+            except ValueError:
+                pass
+            if smaller_batch_sizes:
+                parse(batch_start, batch_stop, tuple(smaller_batch_sizes))
+                continue
+            for i, value in enumerate(
+                strings[batch_start:batch_stop].tolist(), batch_start
+            ):
+                if value not in known:
+                    known[value] = not _is_float(value)
+                unparseable[i] = known[value]
+
+    parse(0, len(strings), _NUMBER_BATCH_SIZES)
+    return unparseable
+
+
+class _Column:
+    """The values of a single column, with the derived arrays computed on demand."""
+
+    def __init__(self, values: list[Any]):
+        self.values: list[Any] = values
+
+    @cached_property
+    def array(self) -> npt.NDArray[np.object_]:
+        array = np.empty(len(self.values), dtype=np.object_)
+        array[:] = self.values
+        return array
+
+    @cached_property
+    def is_none(self) -> BoolArray:
+        """The mask of the cells that are None"""
+        return np.fromiter(
+            (value is None for value in self.values),
+            dtype=np.bool_,
+            count=len(self.values),
+        )
+
+    @cached_property
+    def only_strings(self) -> bool:
+        """Whether the column only has strings and Nones"""
+        return set(map(type, self.values)) <= _STRING_TYPES
+
+    @cached_property
+    def factorized(self) -> tuple[IndexArray, list[Any]]:
+        return factorize(self.values)
+
+
+def _invalid_by_distinct_value(check: FieldCheck, column: _Column) -> BoolArray:
+    """Run a check once per distinct value and broadcast the result to the cells."""
+    codes, uniques = column.factorized
+    invalid_uniques = np.fromiter(
+        map(check.is_invalid, uniques), dtype=np.bool_, count=len(uniques)
+    )
+    return invalid_uniques[codes]
+
+
+def _invalid_numbers(check: FieldCheck, column: _Column) -> BoolArray:
+    """Get the mask of cells that are not numbers."""
+    if not column.only_strings:
+        return _invalid_by_distinct_value(check, column)
+
+    is_string = ~column.is_none
+    if is_string.all():
+        return find_unparseable_numbers(column.array)
+
+    # All Nones fail or pass the check together
+    invalid = np.full(len(column.values), check.is_invalid(None), dtype=np.bool_)
+    invalid[is_string] = find_unparseable_numbers(column.array[is_string])
+    return invalid
+
+
+def _invalid_cells(check: FieldCheck, column: _Column) -> BoolArray:
+    """Get the mask of cells in a column that fail a check."""
+    match check.kind:
+        case "emptyValue":
+            return np.asarray(
+                np.equal(column.array, "") | column.is_none, dtype=np.bool_
+            )
+        case "paramNotAList":
+            return np.ones(len(column.values), dtype=np.bool_)
+        case "invalidNumber":
+            return _invalid_numbers(check, column)
+        case _:
+            return _invalid_by_distinct_value(check, column)
+
+
+def validate_columns(
+    fields: Sequence[FieldPlan],
+    rows: Sequence[Sequence[Any]],
+    first_row_number: int = 1,
+    budget: FailureBudget | None = None,
+    failures: FailureStore | None = None,
+) -> FailureStore:
+    """Run the compiled field checks column by column. Adds the same failures, in the
+    same order, as `plan.validate_rows` to `failures` (or a new store), which is
+    returned.
+
+    With a `budget`, fields that have run out of failures are skipped. The columns of
+    the remaining fields are still checked in full, and the failures that don't fit
+    in the budget are dropped afterwards.
+    """
+    if failures is None:
+        failures = FailureStore()
+    bad_rows: list[IndexArray] = []
+    bad_fields: list[IndexArray] = []
+    bad_checks: list[IndexArray] = []
+
+    for field_index, field in enumerate(fields):
+        if not field.checks or (budget is not None and not budget.allows(field)):
+            continue
+
+        column = _Column(
+            list(map(itemgetter(field.column_index), rows))
+            if field.column_index is not None
+            else [None] * len(rows)
+        )
+        for check_index, check in enumerate(field.checks):
+            cells = np.flatnonzero(_invalid_cells(check, column))
+            if len(cells):
+                bad_rows.append(cells)
+                bad_fields.append(np.full(len(cells), field_index, dtype=np.intp))
+                bad_checks.append(np.full(len(cells), check_index, dtype=np.intp))
+
+    if not bad_rows:
+        return failures
+
+    failure_rows = np.concatenate(bad_rows)
+    failure_fields = np.concatenate(bad_fields)
+    failure_checks = np.concatenate(bad_checks)
+    # report failures row by row, then in field order, then in check order
+    order = np.lexsort((failure_checks, failure_fields, failure_rows))
+
+    check_codes = [
+        [failures.check_code(check) for check in field.checks] for field in fields
+    ]
+    for row, field_index, check_index in zip(
+        failure_rows[order].tolist(),
+        failure_fields[order].tolist(),
+        failure_checks[order].tolist(),
+    ):
+        field = fields[field_index]
+        # as in `validate_rows`, the failures of a field past its cap aren't counted
+        if budget is not None and budget.capped(field):
+            continue
+        if budget is not None and not budget.spend(field):
+            if budget.exhausted:
+                break
+            continue
+        value = (
+            rows[row][field.column_index] if field.column_index is not None else None
+        )
+        failures.add(
+            row + first_row_number, check_codes[field_index][check_index], value
+        )
+
+    return failures
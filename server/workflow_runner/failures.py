@@ -0,0 +1,189 @@
+"""Compact storage for validation failures.
+
+Bad uploads can have a failure for most of their cells, so failures are not kept as
+one `ValidationFailure` model (with its formatted message) each. A `FailureStore`
+keeps them in parallel arrays instead: the row number, a code for the check that
+failed (which knows its field and its message) and a code for the offending value.
+Checks and values are interned, so a million failures of the same few kinds only take
+a few arrays of integers. `ValidationFailure` models are built on access, when the
+store is read as the `Sequence[ValidationFailure]` it presents itself as.
+"""
+
+import datetime
+from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, overload
+
+from server.models.workflow.api_schemas import ValidationFailure
+
+if TYPE_CHECKING:
+    from .plan import FieldCheck
+
+# stored in place of a missing row number or offending value
+_NONE = -1
+
+
+# types whose equal values always have the same string representation
+_EXACT_TYPES = frozenset([int, bool, datetime.date])
+
+
+def value_key(value: Any) -> Any:
+    """Key used to group equal cells. Values of other types than str are grouped by
+    their type and string representation, so that e.g. `1`, `1.0` and `True` are kept
+    apart even though they compare equal, and unhashable values can be grouped too."""
+    value_type = type(value)
+    if value is None or value_type is str:
+        return value
+    if value_type in _EXACT_TYPES:
+        return (value_type, value)
+    return (value_type, str(value))
+
+
+class FailureSequence(Sequence[ValidationFailure], ABC):
+    """A read-only sequence of validation failures that are built on access. It
+    compares equal to any other sequence of the same failures, lists included."""
+
+    @overload
+    def __getitem__(self, index: int) -> ValidationFailure: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[ValidationFailure]: ...
+
+    def __getitem__(
+        self, index: int | slice
+    ) -> ValidationFailure | list[ValidationFailure]:
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("failure index out of range")
+        return self._get(index)
+
+    @abstractmethod
+    def _get(self, index: int) -> ValidationFailure:
+        """Build the failure at `index`, which is within the bounds of the sequence."""
+
+    def __iter__(self) -> Iterator[ValidationFailure]:
+        for index in range(len(self)):
+            yield self._get(index)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            failure == other_failure for failure, other_failure in zip(self, other)
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class FailureStore(FailureSequence):
+    """Validation failures stored as parallel arrays of row numbers, check codes and
+    interned offending values."""
+
+    def __init__(self):
+        self._row_numbers: array[int] = array("q")
+        self._message_codes: array[int] = array("i")
+        self._value_codes: array[int] = array("i")
+        # a message is either a compiled check, whose message depends on the value,
+        # or the literal message of a failure that was added as is
+        self._messages: list["FieldCheck | str"] = []
+        self._check_codes: dict[int, int] = {}
+        self._literal_codes: dict[str, int] = {}
+        self._values: list[Any] = []
+        self._value_codes_by_key: dict[Any, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._row_numbers)
+
+    def check_code(self, check: "FieldCheck") -> int:
+        """Get the code of a compiled check, to pass to `add`."""
+        # checks are interned by identity, their equality is too slow for the hot loop
+        code = self._check_codes.get(id(check))
+        if code is None:
+            code = self._check_codes[id(check)] = len(self._messages)
+            self._messages.append(check)
+        return code
+
+    def _literal_code(self, message: str) -> int:
+        code = self._literal_codes.get(message)
+        if code is None:
+            code = self._literal_codes[message] = len(self._messages)
+            self._messages.append(message)
+        return code
+
+    def _value_code(self, value: Any) -> int:
+        key = value_key(value)
+        code = self._value_codes_by_key.get(key)
+        if code is None:
+            code = self._value_codes_by_key[key] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def add(self, row_number: int | None, check_code: int, value: Any):
+        """Add a failure of the check with the given code on a cell value."""
+        self._row_numbers.append(_NONE if row_number is None else row_number)
+        self._message_codes.append(check_code)
+        self._value_codes.append(self._value_code(value))
+
+    def append(self, failure: ValidationFailure):
+        """Add a failure that was already built."""
+        self._row_numbers.append(
+            _NONE if failure.row_number is None else failure.row_number
+        )
+        self._message_codes.append(self._literal_code(failure.message))
+        self._value_codes.append(_NONE)
+
+    def extend(self, failures: Iterable[ValidationFailure]):
+        for failure in failures:
+            self.append(failure)
+
+    def records(self) -> Iterator[tuple[int | None, "FieldCheck | str", Any]]:
+        """The stored failures as (row number, check or literal message, value)
+        tuples, without formatting their messages."""
+        for row_number, message_code, value_code in zip(
+            self._row_numbers, self._message_codes, self._value_codes
+        ):
+            yield (
+                None if row_number == _NONE else row_number,
+                self._messages[message_code],
+                None if value_code == _NONE else self._values[value_code],
+            )
+
+    def _get(self, index: int) -> ValidationFailure:
+        row_number = self._row_numbers[index]
+        message = self._messages[self._message_codes[index]]
+        if not isinstance(message, str):
+            message = message.message(self._values[self._value_codes[index]])
+        return ValidationFailure(
+            row_number=None if row_number == _NONE else row_number, message=message
+        )
+
+
+class ChainedFailures(FailureSequence):
+    """Several sequences of failures read one after the other, without copying."""
+
+    def __init__(self, parts: Iterable[Sequence[ValidationFailure]]):
+        self._parts: list[Sequence[ValidationFailure]] = list(parts)
+        self._ends: list[int] = list(accumulate(len(part) for part in self._parts))
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def _get(self, index: int) -> ValidationFailure:
+        start = 0
+        for part, end in zip(self._parts, self._ends):
+            if index < end:
+                return part[index - start]
+            start = end
+        raise IndexError("failure index out of range")
+
+    def __iter__(self) -> Iterator[ValidationFailure]:
+        for part in self._parts:
+            yield from part
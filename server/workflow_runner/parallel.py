@@ -0,0 +1,511 @@
+"""Validate large files in several processes.
+
+The file is split into byte ranges of about `chunk_bytes` that start and end on
+record boundaries, and each range is validated in a worker process as a csv of its
+own, with the header of the file prepended and the dialect, encoding and schema that
+were inferred for the whole file. The workers run the Frictionless baseline checks
+and the fieldset validations on their rows. Their failures are merged back in file
+order, with their row numbers shifted by the number of rows before the chunk, while
+the checks that are about the whole file (the header checks, the file type and the
+row count) run once in the main process.
+"""
+
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from collections.abc import Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import pairwise
+from typing import Any, ClassVar
+
+import attrs
+from frictionless import Dialect, Error, Resource, Schema
+from frictionless.formats import CsvControl
+from pydantic import BaseModel, ConfigDict
+
+from server.models.workflow.workflow_schema import WorkflowSchema
+
+from .failures import FailureStore
+from .plan import (
+    CompiledWorkflow,
+    FailureBudget,
+    FieldsetPlan,
+    WorkflowParamValue,
+    compile_workflow_plan,
+    compiled_workflow,
+)
+from .validators import (
+    BaselineValidation,
+    CheckMemo,
+    ValidationEngine,
+    csv_resource,
+)
+from .workflow_runner import (
+    WorkflowRunResult,
+    WorkflowRunStats,
+    check_operations_before_rows,
+    check_params_before_rows,
+    execute_workflow,
+    fieldset_operations,
+    finish_run,
+    make_failure_budget,
+    stream_rows,
+    validate_param_values,
+)
+
+# files that fit in a single chunk are validated in the calling process
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# workers are spawned rather than forked: forking a process that runs other threads
+# (e.g. the API's thread pool) can leave locks held in the child
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+class _Quoting:
+    """Patterns of the quoted fields of a csv file.
+
+    As in Python's csv reader, a quote only opens a quoted field at the start of a
+    field, i.e. after a delimiter, a newline or at the start of the file, and is read
+    as is anywhere else, e.g. in `5" screen`. Within a quoted field, a doubled quote
+    is an escaped quote.
+    """
+
+    def __init__(self, quote_char: bytes, delimiter: bytes):
+        quote = re.escape(quote_char)
+        field_starts = re.escape(delimiter) + rb"\r\n"
+        quoted_field = rb"(?:\A|(?<=[%s]))%s(?:[^%s]|%s%s)*+%s" % (
+            field_starts,
+            quote,
+            quote,
+            quote,
+            quote,
+            quote,
+        )
+        stray_quote = rb"(?<=[^%s])%s" % (field_starts, quote)
+        self.quoted_field: re.Pattern[bytes] = re.compile(quoted_field)
+        # the quotes are matched possessively, so that the patterns never backtrack
+        self.unquoted: re.Pattern[bytes] = re.compile(
+            rb"(?:[^%s]++|%s|%s)*+" % (quote, quoted_field, stray_quote)
+        )
+
+    def skip_to(self, contents: mmap.mmap, start: int, end: int) -> int | None:
+        """Read `contents` from `start`, which is outside quoted fields, up to `end`.
+        Returns `end`, or the end of the quoted field that `end` is in, or None if
+        that field is never closed."""
+        match = self.unquoted.match(contents, start, end)
+        assert match is not None
+        if match.end() == end:
+            return end
+        # the unquoted bytes end at a quoted field that goes on past `end`
+        field = self.quoted_field.match(contents, match.end())
+        return field.end() if field else None
+
+
+def find_record_boundaries(
+    path: str,
+    chunk_bytes: int,
+    quote_char: bytes | None = b'"',
+    delimiter: bytes = b",",
+) -> list[int] | None:
+    """Split a csv file into byte ranges of at least `chunk_bytes` that end on record
+    boundaries.
+
+    Returns the end of the header followed by the end of each range, the last one being
+    the size of the file. A newline only ends a record outside quoted fields, which
+    are found as Python's csv reader reads them (see `_Quoting`). Returns None if the
+    file ends inside a quoted field, in which case its quoting can't be followed.
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return [0]
+    quoting = _Quoting(quote_char, delimiter) if quote_char else None
+
+    boundaries: list[int] = []
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as contents:
+        # the first boundary is the end of the header
+        position = 0
+        target = 0
+        while (newline := contents.find(b"\n", max(position, target))) != -1:
+            skipped = (
+                quoting.skip_to(contents, position, newline) if quoting else newline
+            )
+            if skipped is None:
+                return None
+            position = skipped
+            # the newline ends a record, unless it is in a quoted field
+            if skipped == newline:
+                position = newline + 1
+                boundaries.append(position)
+                target = position + chunk_bytes
+
+        # the rest of the file mustn't end inside a quoted field
+        if quoting and quoting.skip_to(contents, position, size) is None:
+            return None
+
+    if not boundaries or boundaries[-1] != size:
+        boundaries.append(size)
+    return boundaries
+
+
+def split_resource(resource: Resource, path: str, chunk_bytes: int) -> list[int] | None:
+    """Find the record boundaries of an inferred csv resource, or return None if its
+    chunks can't be validated on their own: if the encoding or the dialect make the
+    records hard to find in the raw bytes, if the file is compressed, or if the
+    schema has constraints that compare rows with each other."""
+    if resource.compression:
+        return None
+
+    dialect = resource.dialect
+    control = CsvControl.from_dialect(dialect)
+    if (
+        control.escape_char
+        or control.skip_initial_space
+        or not dialect.header
+        or dialect.header_rows != [1]
+        or dialect.comment_char
+        or dialect.comment_rows
+        or dialect.skip_blank_rows
+    ):
+        return None
+
+    table_schema = resource.schema
+    if (
+        table_schema.primary_key
+        or table_schema.foreign_keys
+        or any(field.constraints.get("unique") for field in table_schema.fields)
+    ):
+        return None
+
+    # the newline, the quote and the delimiter must be single bytes that can't be
+    # part of other characters, i.e. the encoding must be ASCII compatible
+    quote_char = control.quote_char or ""
+    delimiter = control.delimiter
+    encoding = resource.encoding
+    if encoding is None:
+        return None
+    try:
+        if (
+            not quote_char.isascii()
+            or len(delimiter) != 1
+            or not delimiter.isascii()
+            or b"\n".decode(encoding) != "\n"
+            or quote_char.encode().decode(encoding) != quote_char
+            or delimiter.encode().decode(encoding) != delimiter
+        ):
+            return None
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+    boundaries = find_record_boundaries(
+        path, chunk_bytes, quote_char.encode() or None, delimiter.encode()
+    )
+    # a header and a single chunk
+    if boundaries is None or len(boundaries) <= 2:
+        return None
+    return boundaries
+
+
+class _ChunkTask(BaseModel):
+    """What a worker needs to validate the rows between `start` and `end`."""
+
+    path: str
+    header_end: int
+    start: int
+    end: int
+    encoding: str
+    dialect: dict[str, Any]
+    table_schema: dict[str, Any]
+    workflow_schema: WorkflowSchema
+    param_values: dict[str, WorkflowParamValue]
+    implicit_frictionless_validation: bool
+    engine: ValidationEngine
+    max_failures: int | None
+    max_failures_per_field: int | None
+
+
+class _ChunkResult(BaseModel):
+    """The rows and failures of a chunk. Row numbers are relative to the chunk."""
+
+    row_count: int
+    read_whole_chunk: bool
+    failure_count: int
+    truncated: bool
+    # frictionless errors lose their properties when pickled, so they are sent as
+    # their class and the arguments to build them again
+    baseline_errors: list[tuple[type[Error], dict[str, Any]]]
+    # for each fieldset operation, (row number, field index, check index, value)
+    fieldset_failures: list[list[tuple[int, int, int, Any]]]
+    check_memo_hits: int
+    check_memo_misses: int
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(arbitrary_types_allowed=True)
+
+
+def _failure_records(
+    fieldset_plan: FieldsetPlan, failures: FailureStore
+) -> list[tuple[int, int, int, Any]]:
+    # the compiled checks can't be sent to another process, so they are identified
+    # by their position in the plan, which is the same in every process
+    positions = {
+        id(check): (field_index, check_index)
+        for field_index, field in enumerate(fieldset_plan.fields)
+        for check_index, check in enumerate(field.checks)
+    }
+    records: list[tuple[int, int, int, Any]] = []
+    for row_number, check, value in failures.records():
+        assert row_number is not None and not isinstance(check, str)
+        records.append((row_number, *positions[id(check)], value))
+    return records
+
+
+def _validate_chunk(task: _ChunkTask) -> _ChunkResult:
+    with open(task.path, "rb") as file:
+        contents = file.read(task.header_end)
+        file.seek(task.start)
+        contents += file.read(task.end - task.start)
+
+    resource = Resource(
+        contents,
+        format="csv",
+        encoding=task.encoding,
+        dialect=Dialect.from_descriptor(task.dialect),
+        schema=Schema.from_descriptor(task.table_schema),
+    )
+    budget = FailureBudget(task.max_failures, task.max_failures_per_field)
+    memo = CheckMemo()
+    baseline = (
+        BaselineValidation(resource, budget)
+        if task.implicit_frictionless_validation
+        else None
+    )
+
+    with resource:
+        if baseline:
+            # the header is only reported once, with the first chunk
+            baseline.validate_start(report_errors=task.start == task.header_end)
+
+        csv_columns = [field.name for field in resource.schema.fields]
+        plan = compile_workflow_plan(
+            task.workflow_schema, task.param_values, csv_columns
+        )
+        fieldsets = [
+            (memo.memoize_fieldset(operation), FailureStore())
+            for operation in plan.operations
+            if isinstance(operation, FieldsetPlan)
+        ]
+        row_count, read_whole_chunk = stream_rows(
+            resource, fieldsets, baseline, budget, task.engine
+        )
+
+    return _ChunkResult(
+        row_count=row_count,
+        read_whole_chunk=read_whole_chunk,
+        failure_count=budget.failure_count,
+        truncated=budget.truncated,
+        baseline_errors=(
+            [_error_arguments(error) for error in baseline.errors] if baseline else []
+        ),
+        fieldset_failures=[
+            _failure_records(fieldset_plan, failures)
+            for fieldset_plan, failures in fieldsets
+        ],
+        check_memo_hits=memo.hits,
+        check_memo_misses=memo.misses,
+    )
+
+
+def _error_arguments(error: Error) -> tuple[type[Error], dict[str, Any]]:
+    error_class = type(error)
+    return error_class, {
+        field.name: getattr(error, field.name)
+        for field in attrs.fields(error_class)
+        if field.init
+    }
+
+
+def _build_error(
+    error_class: type[Error], arguments: dict[str, Any], row_offset: int
+) -> Error:
+    # the message is rendered when the error is built, with the shifted row number
+    if arguments.get("row_number") is not None:
+        arguments = {**arguments, "row_number": arguments["row_number"] + row_offset}
+    return error_class(**arguments)
+
+
+def _merge_chunk(
+    chunk: _ChunkResult,
+    row_offset: int,
+    fieldsets: Sequence[tuple[FieldsetPlan, FailureStore]],
+    baseline: BaselineValidation | None,
+    budget: FailureBudget,
+):
+    failure_count = budget.failure_count
+    if baseline:
+        baseline.add_errors(
+            _build_error(error_class, arguments, row_offset)
+            for error_class, arguments in chunk.baseline_errors
+        )
+    for (fieldset_plan, failures), records in zip(fieldsets, chunk.fieldset_failures):
+        for row_number, field_index, check_index, value in records:
+            field = fieldset_plan.fields[field_index]
+            if budget.spend(field):
+                check_code = failures.check_code(field.checks[check_index])
+                failures.add(row_number + row_offset, check_code, value)
+    # the chunk counted every failure it found, including those it couldn't keep
+    budget.failure_count = failure_count + chunk.failure_count
+    budget.truncated = budget.truncated or chunk.truncated
+
+
+class ChunkValidationPool:
+    """Worker processes that validate the chunks of files, shared by the parallel runs
+    of a process so that they don't each spawn their own, and bounded by
+    `max_workers` however many runs there are at once.
+
+    The processes are only spawned once chunks are submitted. If a worker process
+    dies, the pool is replaced on the next submission."""
+
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers: int | None = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.max_workers, mp_context=_MP_CONTEXT)
+
+    def submit(self, task: _ChunkTask) -> Future[_ChunkResult]:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            try:
+                return self._executor.submit(_validate_chunk, task)
+            except BrokenProcessPool:
+                self._executor = self._new_executor()
+                return self._executor.submit(_validate_chunk, task)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+def execute_workflow_parallel(
+    file_name: str,
+    file_path: str,
+    param_values: dict[str, WorkflowParamValue],
+    schema: WorkflowSchema | CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+    max_workers: int | None = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    pool: ChunkValidationPool | None = None,
+) -> WorkflowRunResult:
+    """Run a workflow on a csv file on disk, validating chunks of about `chunk_bytes`
+    in the processes of `pool`, or of a pool of up to `max_workers` processes for this
+    run only.
+
+    This reports the same failures as `execute_workflow`, except that the baseline
+    checks that only run once the whole file was read (e.g. of a declared hash) are
+    skipped. Files that fit in a single chunk, or that can't be split (see
+    `split_resource`), are validated with `execute_workflow` in the calling process.
+
+    With a failure cap, each chunk keeps up to the cap and the first failures of the
+    file are kept, but which failures are found first may differ from a serial run.
+    """
+    workflow = compiled_workflow(schema)
+    validate_param_values(param_values, workflow.schema)
+
+    resource = csv_resource(file_path)
+    resource.infer()
+    boundaries = split_resource(resource, file_path, chunk_bytes)
+    # a file that can be split has an inferred encoding
+    if boundaries is None or resource.encoding is None:
+        return execute_workflow(
+            file_name=file_name,
+            file_contents=resource,
+            param_values=param_values,
+            schema=workflow,
+            implicit_frictionless_validation=implicit_frictionless_validation,
+            engine=engine,
+            max_failures=max_failures,
+            max_failures_per_field=max_failures_per_field,
+            fail_fast=fail_fast,
+        )
+
+    budget = make_failure_budget(max_failures, max_failures_per_field, fail_fast)
+    baseline = (
+        BaselineValidation(resource, budget)
+        if implicit_frictionless_validation
+        else None
+    )
+    csv_columns = [field.name for field in resource.schema.fields]
+    plan = workflow.compile_plan(param_values, csv_columns)
+    param_failures = check_params_before_rows(plan, budget)
+    operation_failures = check_operations_before_rows(
+        plan.operations, file_name, csv_columns, budget
+    )
+    fieldsets = fieldset_operations(plan.operations, operation_failures)
+
+    task = _ChunkTask(
+        path=file_path,
+        header_end=boundaries[0],
+        start=0,
+        end=0,
+        encoding=resource.encoding,
+        dialect=resource.dialect.to_descriptor(),
+        table_schema=resource.schema.to_descriptor(),
+        workflow_schema=workflow.schema,
+        param_values=param_values,
+        implicit_frictionless_validation=implicit_frictionless_validation,
+        engine=engine,
+        max_failures=budget.remaining,
+        max_failures_per_field=budget.max_failures_per_field,
+    )
+    row_count = 0
+    read_whole_file = True
+    stats = WorkflowRunStats()
+    run_pool = pool or ChunkValidationPool(max_workers)
+    futures: list[Future[_ChunkResult]] = []
+    try:
+        futures.extend(
+            run_pool.submit(task.model_copy(update={"start": start, "end": end}))
+            for start, end in pairwise(boundaries)
+        )
+        for index, future in enumerate(futures):
+            chunk = future.result()
+            _merge_chunk(chunk, row_count, fieldsets, baseline, budget)
+            row_count += chunk.row_count
+            stats.check_memo_hits += chunk.check_memo_hits
+            stats.check_memo_misses += chunk.check_memo_misses
+            # no more failures can be reported: the rest of the file isn't needed
+            if not chunk.read_whole_chunk or (
+                budget.exhausted and index < len(futures) - 1
+            ):
+                read_whole_file = False
+                break
+    finally:
+        if pool is None:
+            run_pool.shutdown()
+        else:
+            # the chunks that are no longer needed don't hold up other runs
+            for future in futures:
+                _ = future.cancel()
+
+    return finish_run(
+        plan.operations,
+        operation_failures,
+        baseline.validation_failures if baseline else [],
+        param_failures,
+        row_count,
+        read_whole_file,
+        budget,
+        stats,
+    )
@@ -0,0 +1,512 @@
+"""Compile a WorkflowSchema into an immutable validation plan.
+
+Everything that only depends on the schema, the user-provided params and the csv header
+is resolved here once per run (fieldset lookups, param references, column positions,
+allowed values and failure messages), so the row loop only has to call the compiled
+checks for each cell.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any, ClassVar, Literal
+
+from pydantic import BaseModel, ConfigDict
+
+from server.models.workflow.api_schemas import ValidationFailure
+from server.models.workflow.workflow_schema import (
+    BasicFieldDataTypeSchema,
+    FieldSchema,
+    FieldsetSchema,
+    FieldsetSchemaValidation,
+    FileTypeValidation,
+    ParamReference,
+    RowCountValidation,
+    TimestampDataTypeSchema,
+    WorkflowParam,
+    WorkflowSchema,
+)
+
+from .exceptions import (
+    FieldsetSchemaNotFoundException,
+    ParameterDefinitionNotFoundException,
+)
+from .failures import FailureStore
+from .timestamps import compile_timestamp_matcher
+
+WorkflowParamValue = int | str | list[str] | None
+
+# number of plans a CompiledWorkflow keeps, for different params and csv headers
+COMPILED_PLANS_SIZE = 16
+
+
+def get_param_schema_by_id(
+    param_schemas: dict[str, WorkflowParam], param_id: str
+) -> WorkflowParam:
+    if param_id in param_schemas:
+        return param_schemas[param_id]
+    raise ParameterDefinitionNotFoundException(
+        f"Parameter definition for id '{param_id}' not found in schema."
+    )
+
+
+def get_fieldset_schema_by_name(
+    fieldset_name: str, fieldsets: list[FieldsetSchema]
+) -> FieldsetSchema:
+    """Get the fieldset schema from the list of fieldsets."""
+    for fieldset in fieldsets:
+        if fieldset.name == fieldset_name:
+            return fieldset
+    raise FieldsetSchemaNotFoundException(
+        f"Fieldset schema with name '{fieldset_name}' not found in schema."
+    )
+
+
+def get_fieldset_schema_by_id(
+    fieldset_id: str, fieldsets: list[FieldsetSchema]
+) -> FieldsetSchema:
+    """Get the fieldset schema from the list of fieldsets."""
+    for fieldset in fieldsets:
+        if fieldset.id == fieldset_id:
+            return fieldset
+    raise FieldsetSchemaNotFoundException(
+        f"Fieldset schema with id '{fieldset_id}' not found in schema."
+    )
+
+
+FieldCheckKind = Literal[
+    "emptyValue", "invalidNumber", "invalidTimestamp", "notAllowed", "paramNotAList"
+]
+
+
+class FieldCheck(BaseModel):
+    """A single compiled check for a field.
+
+    `is_invalid` receives the cell value and returns True if the cell fails the check.
+    `kind` says which check this is, so other engines can run it in a specialized way.
+    `message_template` is the failure message with the field configuration already
+    filled in. It may contain a `{value}` placeholder for the offending cell value.
+    """
+
+    kind: FieldCheckKind
+    is_invalid: Callable[[Any], bool]
+    message_template: str
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(frozen=True)
+
+    def message(self, value: Any) -> str:
+        return self.message_template.format(value=value)
+
+
+class FieldPlan(BaseModel):
+    """The compiled checks for a single field of a fieldset schema.
+
+    `column_index` is the position of the field's column in the csv header, or None
+    if the file does not have the column (in which case every value is None).
+    """
+
+    name: str
+    column_index: int | None
+    checks: tuple[FieldCheck, ...]
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(frozen=True)
+
+
+class FieldsetPlan(BaseModel):
+    """The compiled plan to validate the rows of a file against a fieldset schema."""
+
+    fieldset_schema: FieldsetSchema
+    fields: tuple[FieldPlan, ...]
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(frozen=True)
+
+
+class FailureBudget:
+    """How many more failures a run may report, in total and for each field.
+
+    Engines call `spend` for every failure they find and only report it if that
+    returns True. Once a field has used up its budget they stop checking it, and once
+    the total budget is used up they stop altogether. `failure_count` counts every
+    failure that was found, so it is exact unless `truncated` is set, in which case it
+    is a lower bound. A field that reaches its cap sets `truncated`, since its later
+    failures are not looked for.
+    """
+
+    def __init__(
+        self,
+        max_failures: int | None = None,
+        max_failures_per_field: int | None = None,
+    ):
+        self.remaining: int | None = max_failures
+        self.max_failures_per_field: int | None = max_failures_per_field
+        # keyed by field name
+        self.field_failure_counts: dict[str, int] = {}
+        self.failure_count: int = 0
+        self.truncated: bool = False
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether no more failures can be reported at all."""
+        return self.remaining is not None and self.remaining <= 0
+
+    def capped(self, field: FieldPlan) -> bool:
+        """Whether this field has used up its own budget."""
+        return (
+            self.max_failures_per_field is not None
+            and self.field_failure_counts.get(field.name, 0)
+            >= self.max_failures_per_field
+        )
+
+    def allows(self, field: FieldPlan) -> bool:
+        """Whether failures of this field can still be reported."""
+        return not self.exhausted and not self.capped(field)
+
+    def spend(self, field: FieldPlan | None = None) -> bool:
+        """Record a failure, optionally of a given field. Returns whether there was
+        room left to report it."""
+        self.failure_count += 1
+        allowed = self.allows(field) if field is not None else not self.exhausted
+        if field is not None:
+            self.field_failure_counts[field.name] = (
+                self.field_failure_counts.get(field.name, 0) + 1
+            )
+            if self.capped(field):
+                self.truncated = True
+        if not allowed:
+            self.truncated = True
+            return False
+        if self.remaining is not None:
+            self.remaining -= 1
+        return True
+
+    def take(self, failures: list[ValidationFailure]) -> list[ValidationFailure]:
+        """Record failures that don't belong to a field and return those that fit."""
+        return [failure for failure in failures if self.spend()]
+
+
+def validate_rows(
+    fields: Sequence[FieldPlan],
+    rows: Iterable[Sequence[Any]],
+    first_row_number: int = 1,
+    budget: FailureBudget | None = None,
+    failures: FailureStore | None = None,
+) -> FailureStore:
+    """Run the compiled field checks on each row. Rows are sequences of cell values
+    ordered like the csv header the field plans were compiled against. The failures
+    are added to `failures` (or a new store), which is returned.
+
+    With a `budget`, fields that run out of failures are no longer checked and the
+    loop stops as soon as the total budget is used up.
+    """
+    if failures is None:
+        failures = FailureStore()
+    compiled_fields = [
+        (
+            field.column_index,
+            [(check, failures.check_code(check)) for check in field.checks],
+            field,
+        )
+        for field in fields
+    ]
+
+    for row_num, row in enumerate(rows, first_row_number):
+        fields_exhausted = False
+        for column_index, checks, field in compiled_fields:
+            value = row[column_index] if column_index is not None else None
+            for check, check_code in checks:
+                # the failures of a field past its cap aren't counted either
+                if budget is not None and budget.capped(field):
+                    break
+                if check.is_invalid(value):
+                    if budget is not None and not budget.spend(field):
+                        fields_exhausted = True
+                        continue
+                    failures.add(row_num, check_code, value)
+            if budget is not None and not budget.allows(field):
+                fields_exhausted = True
+
+        if fields_exhausted:
+            assert budget is not None
+            compiled_fields = [
+                compiled_field
+                for compiled_field in compiled_fields
+                if budget.allows(compiled_field[2])
+            ]
+            if not compiled_fields:
+                break
+
+    return failures
+
+
+WorkflowOperationPlan = FieldsetPlan | FileTypeValidation | RowCountValidation
+
+
+class WorkflowPlan(BaseModel):
+    """The compiled operations of a workflow schema for a single run.
+
+    If a param referenced by an operation has a value of the wrong type, `param_failure`
+    holds the failure to report instead of running the operations.
+    """
+
+    operations: tuple[WorkflowOperationPlan, ...]
+    param_failure: ValidationFailure | None = None
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(frozen=True)
+
+
+def _escape_template(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _lookup(values: list[Any]) -> frozenset[Any] | tuple[Any, ...]:
+    """Use a frozenset for membership checks, unless the values aren't hashable."""
+    try:
+        return frozenset(values)
+    except TypeError:
+        return tuple(values)
+
+
+def _resolve_column_index(field: FieldSchema, csv_columns: list[str]) -> int | None:
+    """Find the column of the field in the csv header. If there are several matching
+    columns the last one wins, the same as when looking the field up in a row dict."""
+    if field.case_sensitive:
+        matches = [i for i, column in enumerate(csv_columns) if column == field.name]
+    else:
+        field_name = field.name.lower()
+        matches = [
+            i for i, column in enumerate(csv_columns) if column.lower() == field_name
+        ]
+    return matches[-1] if matches else None
+
+
+def _is_empty(value: Any) -> bool:
+    return value == "" or value is None
+
+
+def _make_number_check(required: bool) -> Callable[[Any], bool]:
+    def is_invalid_number(value: Any) -> bool:
+        try:
+            _ = float(value)
+        except ValueError:
+            return True
+        # TypeError is raised if value is None. If the field is required we have
+        # already added a validation failure for the missing value.
+        except TypeError:
+            return not required
+        return False
+
+    return is_invalid_number
+
+
+def _make_timestamp_check(date_time_format: str) -> Callable[[Any], bool]:
+    matches = compile_timestamp_matcher(date_time_format)
+
+    def is_invalid_timestamp(value: Any) -> bool:
+        return not matches(str(value))
+
+    return is_invalid_timestamp
+
+
+def _make_allowed_values_check(allowed_values: list[Any]) -> Callable[[Any], bool]:
+    lookup = _lookup(allowed_values)
+
+    def is_not_allowed(value: Any) -> bool:
+        try:
+            return value not in lookup
+        # unhashable cell values (e.g. frictionless arrays) can't be looked up in a set
+        except TypeError:
+            return value not in allowed_values
+
+    return is_not_allowed
+
+
+def _always_invalid(_value: Any) -> bool:
+    return True
+
+
+def compile_field_plan(
+    field: FieldSchema,
+    csv_columns: list[str],
+    param_schemas: dict[str, WorkflowParam],
+    param_values: dict[str, WorkflowParamValue],
+) -> FieldPlan:
+    """Compile the checks of a single field."""
+    checks: list[FieldCheck] = []
+    field_name = _escape_template(field.name)
+
+    # If the field does not allow empty values and the value is empty, add a validation failure.
+    if not field.allow_empty_values:
+        checks.append(
+            FieldCheck(
+                kind="emptyValue",
+                is_invalid=_is_empty,
+                message_template=f"Empty value for the field '{field_name}'",
+            )
+        )
+
+    # Validate the data type of each field
+    match field.data_type_validation:
+        case BasicFieldDataTypeSchema(data_type="number"):
+            checks.append(
+                FieldCheck(
+                    kind="invalidNumber",
+                    is_invalid=_make_number_check(field.required),
+                    message_template=(
+                        f"Value '{{value}}' for field '{field_name}' "
+                        f"is not a valid number"
+                    ),
+                )
+            )
+        case TimestampDataTypeSchema(
+            data_type="timestamp", date_time_format=date_time_format
+        ):
+            checks.append(
+                FieldCheck(
+                    kind="invalidTimestamp",
+                    is_invalid=_make_timestamp_check(date_time_format),
+                    message_template=(
+                        f"Value '{{value}}' for field '{field_name}' does not match "
+                        f"the expected timestamp format "
+                        f"{_escape_template(date_time_format)}"
+                    ),
+                )
+            )
+        case _:
+            pass  # "any" and "string" need no additional validation
+
+    # If the field has a list of allowed values, check if the value is in the list.
+    if field.allowed_values:
+        if isinstance(field.allowed_values, list):
+            allowed_values = field.allowed_values
+        else:
+            param = get_param_schema_by_id(param_schemas, field.allowed_values.param_id)
+            allowed_values = param_values[param.name]
+            if not isinstance(allowed_values, list):
+                checks.append(
+                    FieldCheck(
+                        kind="paramNotAList",
+                        is_invalid=_always_invalid,
+                        message_template=(
+                            f"Param value referenced with "
+                            f"{_escape_template(param.name)} is not a list."
+                        ),
+                    )
+                )
+        if isinstance(allowed_values, list):
+            checks.append(
+                FieldCheck(
+                    kind="notAllowed",
+                    is_invalid=_make_allowed_values_check(allowed_values),
+                    message_template=(
+                        f"Value '{{value}}' is not allowed for field '{field_name}'"
+                    ),
+                )
+            )
+
+    return FieldPlan(
+        name=field.name,
+        column_index=_resolve_column_index(field, csv_columns),
+        checks=tuple(checks),
+    )
+
+
+def compile_fieldset_plan(
+    fieldset_schema: FieldsetSchema,
+    csv_columns: list[str],
+    param_schemas: dict[str, WorkflowParam],
+    param_values: dict[str, WorkflowParamValue],
+) -> FieldsetPlan:
+    """Compile the checks of every field in a fieldset schema."""
+    return FieldsetPlan(
+        fieldset_schema=fieldset_schema,
+        fields=tuple(
+            compile_field_plan(field, csv_columns, param_schemas, param_values)
+            for field in fieldset_schema.fields
+        ),
+    )
+
+
+def compile_workflow_plan(
+    schema: WorkflowSchema,
+    param_values: dict[str, WorkflowParamValue],
+    csv_columns: list[str],
+) -> WorkflowPlan:
+    """Resolve the operations of a workflow schema against the user-provided params
+    and the csv header."""
+    param_schemas: dict[str, WorkflowParam] = {
+        param.id: param for param in schema.params
+    }
+    operations: list[WorkflowOperationPlan] = []
+
+    for operation in schema.operations:
+        match operation:
+            case FieldsetSchemaValidation():
+                match operation.fieldset_schema:
+                    case str():
+                        fieldset_schema = get_fieldset_schema_by_id(
+                            operation.fieldset_schema, schema.fieldset_schemas
+                        )
+                    case ParamReference():
+                        param = get_param_schema_by_id(
+                            param_schemas, operation.fieldset_schema.param_id
+                        )
+                        fieldset_schema_name = param_values[param.name]
+                        if not isinstance(fieldset_schema_name, str):
+                            return WorkflowPlan(
+                                operations=(),
+                                param_failure=ValidationFailure(
+                                    message=f"The param value referenced with {param.name} is not a string."
+                                ),
+                            )
+                        fieldset_schema = get_fieldset_schema_by_name(
+                            fieldset_schema_name, schema.fieldset_schemas
+                        )
+                operations.append(
+                    compile_fieldset_plan(
+                        fieldset_schema, csv_columns, param_schemas, param_values
+                    )
+                )
+            case FileTypeValidation() | RowCountValidation():
+                operations.append(operation)
+
+    return WorkflowPlan(operations=tuple(operations))
+
+
+class CompiledWorkflow:
+    """A workflow schema that keeps the plans compiled for it, so that a workflow run
+    many times with the same params on files with the same header is only compiled
+    once. Plans are immutable, so concurrent runs can share them."""
+
+    def __init__(self, schema: WorkflowSchema, max_plans: int = COMPILED_PLANS_SIZE):
+        self.schema: WorkflowSchema = schema
+        self.max_plans: int = max_plans
+        self._plans: OrderedDict[tuple[str, tuple[str, ...]], WorkflowPlan] = (
+            OrderedDict()
+        )
+        self._lock: threading.Lock = threading.Lock()
+
+    def compile_plan(
+        self, param_values: dict[str, WorkflowParamValue], csv_columns: list[str]
+    ) -> WorkflowPlan:
+        """Get the plan of the workflow for the params and the csv header, compiling
+        it with `compile_workflow_plan` if it isn't kept yet."""
+        key = (json.dumps(param_values, sort_keys=True), tuple(csv_columns))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        plan = compile_workflow_plan(self.schema, param_values, csv_columns)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_plans:
+                _ = self._plans.popitem(last=False)
+        return plan
+
+
+def compiled_workflow(schema: WorkflowSchema | CompiledWorkflow) -> CompiledWorkflow:
+    if isinstance(schema, CompiledWorkflow):
+        return schema
+    return CompiledWorkflow(schema)
@@ -0,0 +1,104 @@
+"""Timing of the stages of a profiled workflow run."""
+
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Literal, ParamSpec, TypeVar
+
+from server.models.workflow.api_schemas import OperationTiming, WorkflowRunTimings
+from server.models.workflow.workflow_schema import WorkflowOperation
+
+from .failures import FailureStore
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+RunStage = Literal["parse", "baseline_validation", "row_materialization"]
+
+
+class RunProfiler:
+    """Adds up the wall time spent in each stage of a workflow run.
+
+    While a file is streamed, the stages take turns on each row or batch of rows, so
+    each of them is timed every time it runs. The time of an operation is keyed by
+    its failure store, which stands for the operation during the run.
+    """
+
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.stage_seconds: defaultdict[RunStage, float] = defaultdict(float)
+        # id of the failure store of an operation -> seconds
+        self.operation_seconds: defaultdict[int, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, stage: RunStage) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start
+
+    @contextmanager
+    def operation(self, failures: FailureStore) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.operation_seconds[id(failures)] += time.perf_counter() - start
+
+    def timed(self, stage: RunStage, func: Callable[P, T]) -> Callable[P, T]:
+        """Wrap `func` to add the time of each call to `stage`, for the calls made
+        for every row."""
+
+        def timed_func(*args: P.args, **kwargs: P.kwargs) -> T:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stage_seconds[stage] += time.perf_counter() - start
+
+        return timed_func
+
+    def timings(
+        self,
+        operations: Sequence[WorkflowOperation],
+        operation_failures: Sequence[FailureStore],
+        row_count: int,
+        column_count: int,
+    ) -> WorkflowRunTimings:
+        """The timings of the run so far, where `operation_failures` are the failure
+        stores of `operations`."""
+        total_seconds = time.perf_counter() - self.started
+        return WorkflowRunTimings(
+            total_seconds=total_seconds,
+            parse_seconds=self.stage_seconds["parse"],
+            baseline_validation_seconds=self.stage_seconds["baseline_validation"],
+            row_materialization_seconds=self.stage_seconds["row_materialization"],
+            operations=[
+                OperationTiming(
+                    operation_id=operation.id,
+                    type=operation.type,
+                    seconds=self.operation_seconds[id(failures)],
+                )
+                for operation, failures in zip(operations, operation_failures)
+            ],
+            rows_per_second=row_count / total_seconds if total_seconds else 0.0,
+            cells_per_second=(
+                row_count * column_count / total_seconds if total_seconds else 0.0
+            ),
+        )
+
+
+def profiled_stage(
+    profiler: RunProfiler | None, stage: RunStage
+) -> AbstractContextManager[None]:
+    """Time a stage of a run, if the run is profiled."""
+    return profiler.stage(stage) if profiler else nullcontext()
+
+
+def profiled_operation(
+    profiler: RunProfiler | None, failures: FailureStore
+) -> AbstractContextManager[None]:
+    """Time the checks of an operation, if the run is profiled."""
+    return profiler.operation(failures) if profiler else nullcontext()
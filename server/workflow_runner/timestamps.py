@@ -0,0 +1,106 @@
+"""Fast timestamp checks, compiled once per `date_time_format`.
+
+`datetime.strptime` looks the format up in a locale-aware cache, matches the value
+with the format's regex, converts every directive, computes the weekday and day of
+the year and builds a datetime, all in Python, for every cell. To check whether a
+value is a valid timestamp we only need the regex match and the range checks, so a
+format whose directives are all numeric is compiled into a matcher that does just
+that: it uses the same regex `strptime` builds for the format, so it matches exactly
+the same strings, and it lets the `datetime` constructor reject impossible dates and
+times, which is where `strptime` rejects them too. Other formats (e.g. with month
+names, which depend on the locale) fall back to calling `strptime`.
+"""
+
+import datetime
+import re
+from collections.abc import Callable
+from functools import lru_cache
+from operator import itemgetter
+
+# the private module that implements `strptime`, used to build the same format regex
+from _strptime import TimeRE
+
+TimestampMatcher = Callable[[str], bool]
+
+# directives that only match digits and are converted the same way in every locale
+_NUMERIC_DIRECTIVES = frozenset("dfHmMSyY")
+_DIRECTIVE = re.compile(r"%(.?)", re.DOTALL)
+
+# a format that is not in the cache only costs one regex compilation
+_MAX_CACHED_FORMATS = 256
+
+
+def _strptime_matcher(date_time_format: str) -> TimestampMatcher:
+    def matches(value: str) -> bool:
+        try:
+            _ = datetime.datetime.strptime(value, date_time_format)
+        except ValueError:
+            return False
+        return True
+
+    return matches
+
+
+def _two_digit_year(value: str) -> int:
+    # the same pivot as `strptime`: 69-99 are 1969-1999, 00-68 are 2000-2068
+    year = int(value)
+    return year + 2000 if year <= 68 else year + 1900
+
+
+# the datetime argument each directive sets, and how its digits are converted
+_CONVERTERS: dict[str, tuple[int, Callable[[str], int]]] = {
+    "Y": (0, int),
+    "y": (0, _two_digit_year),
+    "m": (1, int),
+    "d": (2, int),
+    "H": (3, int),
+    "M": (4, int),
+    "S": (5, int),
+}
+# what `strptime` uses for the year, month, day, hour, minute and second by default
+_DEFAULT_COMPONENTS = (1900, 1, 1, 0, 0, 0)
+
+
+def _numeric_matcher(format_regex: re.Pattern[str]) -> TimestampMatcher:
+    # the groups are in the order of the format. If a component is given twice (e.g.
+    # by %Y and %y) the last one wins, as in `strptime`. Microseconds are always valid.
+    converters = [
+        (index - 1, *_CONVERTERS[name])
+        for name, index in sorted(format_regex.groupindex.items(), key=itemgetter(1))
+        if name in _CONVERTERS
+    ]
+
+    def matches(value: str) -> bool:
+        found = format_regex.match(value)
+        if found is None or found.end() != len(value):
+            return False
+        groups = found.groups()
+        components: list[int] = list(_DEFAULT_COMPONENTS)
+        for group, component, convert in converters:
+            components[component] = convert(groups[group])
+        year, month, day, hour, minute, second = components
+        try:
+            _ = datetime.datetime(year, month, day, hour, minute, second)
+        except ValueError:
+            return False
+        return True
+
+    return matches
+
+
+@lru_cache(maxsize=_MAX_CACHED_FORMATS)
+def compile_timestamp_matcher(date_time_format: str) -> TimestampMatcher:
+    """Get a function that tells whether a string is a valid timestamp in the given
+    format, i.e. whether `datetime.strptime(value, date_time_format)` would succeed."""
+    directives = _DIRECTIVE.findall(date_time_format)
+    if not all(
+        directive in _NUMERIC_DIRECTIVES or directive == "%" for directive in directives
+    ):
+        return _strptime_matcher(date_time_format)
+
+    try:
+        format_regex = re.compile(TimeRE().pattern(date_time_format), re.IGNORECASE)
+    except re.error:
+        # e.g. a directive used twice. Let strptime report it the way it always has
+        return _strptime_matcher(date_time_format)
+    return _numeric_matcher(format_regex)
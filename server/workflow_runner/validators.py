@@ -1,48 +1,92 @@
-import datetime
-from typing import Any
+import os
+from collections.abc import Iterable, Sequence
+from typing import Any, Literal
 
-from frictionless import Resource, validate
+from frictionless import Checklist, Error, Resource, Row, settings, validate
 
 from server.models.workflow.api_schemas import ValidationFailure
 from server.models.workflow.workflow_schema import (
-    BasicFieldDataTypeSchema,
     FieldSchema,
     FieldsetSchema,
     FileTypeValidation,
     RowCountValidation,
-    TimestampDataTypeSchema,
     WorkflowParam,
 )
 
-from .exceptions import ParameterDefinitionNotFoundException
+from .columnar import validate_columns
+from .failures import FailureStore, value_key
+from .plan import (
+    FailureBudget,
+    FieldCheck,
+    FieldCheckKind,
+    FieldPlan,
+    FieldsetPlan,
+    WorkflowParamValue,
+    compile_field_plan,
+    compile_fieldset_plan,
+    validate_rows,
+)
 
-WorkflowParamValue = int | str | list[str] | None
+# "row" validates the file row by row, "columnar" validates it column by column with numpy
+ValidationEngine = Literal["row", "columnar"]
 
 
-def get_param_schema_by_id(
-    param_schemas: dict[str, WorkflowParam], param_id: str
-) -> WorkflowParam:
-    if param_id in param_schemas:
-        return param_schemas[param_id]
-    raise ParameterDefinitionNotFoundException(
-        f"Parameter definition for id '{param_id}' not found in schema."
-    )
+# Frictionless errors that are not reported by the baseline validation
+SKIPPED_FRICTIONLESS_ERRORS = ["missing-cell"]
+
+
+# the first bytes of the compressed files that are decompressed while they are read
+COMPRESSION_MAGIC_BYTES = {
+    "gz": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+}
+COMPRESSED_FILE_EXTENSIONS = tuple(
+    f".{compression}" for compression in COMPRESSION_MAGIC_BYTES
+)
+
+
+def detect_compression(head: bytes) -> str | None:
+    """Detect the compression of a file from its first bytes. Returns the Frictionless
+    name of the compression, or None if the file isn't gzip, bz2 or xz compressed."""
+    for compression, magic_bytes in COMPRESSION_MAGIC_BYTES.items():
+        if head.startswith(magic_bytes):
+            return compression
+    return None
+
+
+def csv_resource(source: bytes | str) -> Resource:
+    """Load the contents of a csv file, or the path of a csv file on disk, as a
+    Frictionless Resource. Compressed files are decompressed while they are read."""
+    if isinstance(source, bytes):
+        head = source[:8]
+    else:
+        with open(source, "rb") as file:
+            head = file.read(8)
+    return Resource(source, format="csv", compression=detect_compression(head))
+
+
+def load_resource(file_contents: str | bytes | Resource) -> Resource:
+    """Parse the file contents into a Frictionless Resource if not already. The
+    contents may be compressed if they are passed as bytes."""
+    if isinstance(file_contents, str):
+        # Resource expects bytes when the first argument is the actual csv contents
+        # A string is interpreted as a filename
+        return Resource(file_contents.encode("utf-8"), format="csv")
+    if isinstance(file_contents, bytes):
+        return csv_resource(file_contents)
+    return file_contents
 
 
 def parse_frictionless(
-    file_contents: str | Resource,
+    file_contents: str | bytes | Resource,
 ) -> tuple[Resource, list[ValidationFailure]]:
     """Validate the file using the Frictionless baseline checks and parse the file contents into a
     Frictionless Resource if not already."""
 
-    if isinstance(file_contents, str):
-        # Resource expects bytes when the first argument is the actual csv contents
-        # A string is interpreted as a filename
-        resource = Resource(file_contents.encode("utf-8"), format="csv")
-    else:
-        resource = file_contents
+    resource = load_resource(file_contents)
 
-    report = validate(resource, skip_errors=["missing-cell"])
+    report = validate(resource, skip_errors=SKIPPED_FRICTIONLESS_ERRORS)
     if not report.valid:
         return resource, [
             ValidationFailure(row_number=error[0], message=error[1])
@@ -51,11 +95,109 @@ def parse_frictionless(
     return resource, []
 
 
+class BaselineValidation:
+    """Run the Frictionless baseline checks on a resource while its rows are streamed
+    by someone else. This reports the same failures as `parse_frictionless`, without
+    reading the file a second time.
+
+    Call `validate_start` once the resource is open, `validate_row` for each row of
+    `resource.row_stream` (or `add_stream_error` if reading the row failed), and
+    `validate_end` once the stream is exhausted. Errors that don't fit in the
+    optional failure `budget` are dropped.
+    """
+
+    def __init__(self, resource: Resource, budget: FailureBudget | None = None):
+        self.checklist: Checklist = Checklist(skip_errors=SKIPPED_FRICTIONLESS_ERRORS)
+        self.checks = self.checklist.connect(resource)
+        self.budget: FailureBudget | None = budget
+        self.errors: list[Error] = []
+        self.error_count: int = 0
+        # like `frictionless.validate`, stop checking once we hit the error limit
+        self.partial: bool = False
+
+    def _add_errors(self, errors: Iterable[Error]):
+        for error in errors:
+            if self.checklist.match(error):
+                self._add_error(error)
+
+    def _add_error(self, error: Error):
+        if self.error_count >= settings.DEFAULT_LIMIT_ERRORS:
+            return
+        self.error_count += 1
+        if self.budget is None or self.budget.spend():
+            self.errors.append(error)
+
+    def _check_error_limit(self):
+        if self.error_count >= settings.DEFAULT_LIMIT_ERRORS:
+            self.partial = True
+            if self.budget is not None:
+                self.budget.truncated = True
+
+    def validate_start(self, report_errors: bool = True):
+        """Start the checks. With `report_errors` False the errors about the header
+        are not reported, e.g. when validating a chunk of a file whose header was
+        already checked."""
+        for check in list(self.checks):
+            errors = list(check.validate_start())
+            # checks that can't run on this resource report a check-error and are dropped
+            if any(error.type == "check-error" for error in errors):
+                self.checks.remove(check)
+            if report_errors:
+                self._add_errors(errors)
+
+    def add_errors(self, errors: Iterable[Error]):
+        """Add errors that another `BaselineValidation` already matched against the
+        checklist, e.g. the errors found in a chunk of the file."""
+        for error in errors:
+            if self.partial:
+                return
+            self._add_error(error)
+            self._check_error_limit()
+
+    def add_stream_error(self, error: Error):
+        if not self.partial:
+            self._add_error(error)
+
+    def validate_row(self, row: Row):
+        if self.partial:
+            return
+        for check in self.checks:
+            self._add_errors(check.validate_row(row))
+        self._check_error_limit()
+
+    def validate_end(self):
+        if self.partial:
+            return
+        for check in self.checks:
+            self._add_errors(check.validate_end())
+
+    @property
+    def validation_failures(self) -> list[ValidationFailure]:
+        return self.failures()
+
+    def failures(self, start: int = 0) -> list[ValidationFailure]:
+        """The failures of the errors found so far, from the `start`-th error on."""
+        failures: list[ValidationFailure] = []
+        for error in self.errors[start:]:
+            descriptor = error.to_descriptor()
+            failures.append(
+                ValidationFailure(
+                    row_number=descriptor.get("rowNumber"),
+                    message=descriptor["message"],
+                )
+            )
+        return failures
+
+
 def validate_file_type(
     file_name: str, validation: FileTypeValidation
 ) -> list[ValidationFailure]:
-    """Validate the file type of a file."""
-    if not file_name.endswith(validation.expected_file_type):
+    """Validate the file type of a file. The extension of a compressed file is
+    ignored, e.g. `data.csv.gz` is a .csv file."""
+    base_name, extension = os.path.splitext(file_name)
+    if extension not in COMPRESSED_FILE_EXTENSIONS:
+        base_name = file_name
+    if not base_name.endswith(validation.expected_file_type):
         return [
             ValidationFailure(
                 message=(
@@ -71,9 +213,16 @@ def validate_row_count(
     file_contents: list[dict[str, Any]], validation: RowCountValidation
 ) -> list[ValidationFailure]:
     """Validate the row count of a file."""
+    return check_row_count(len(file_contents), validation)
+
+
+def check_row_count(
+    row_count: int, validation: RowCountValidation
+) -> list[ValidationFailure]:
+    """Check that the number of rows in a file is within the expected range."""
     min_row_count = validation.min_row_count or 0
     max_row_count = validation.max_row_count or float("inf")
-    if not min_row_count <= len(file_contents) <= max_row_count:
+    if not min_row_count <= row_count <= max_row_count:
         return [
             ValidationFailure(
                 message=(
@@ -140,105 +289,94 @@ def check_csv_columns(
     return validations
 
 
+# checks whose outcome is worth remembering for each distinct value. The others are
+# cheaper than a cache lookup.
+MEMOIZED_CHECK_KINDS: frozenset[FieldCheckKind] = frozenset(
+    ["invalidNumber", "invalidTimestamp", "notAllowed"]
+)
+# number of distinct values remembered for each check
+CHECK_MEMO_SIZE = 4096
+
+
+class CheckMemo:
+    """Remembers the outcome of the checks of each field for the values they have
+    already seen, so that a column with a handful of distinct values across millions
+    of rows only runs its checks a handful of times.
+
+    Each check gets its own cache of at most `max_values` values. Values are keyed by
+    their type and their value (see `failures.value_key`), since e.g. `1` and `True`
+    are equal but can fail a check differently. When a cache is full it is emptied,
+    unless most of its lookups missed: then the column has too many distinct values
+    for the memo to pay off, and the check stops being memoized.
+    """
+
+    def __init__(self, max_values: int = CHECK_MEMO_SIZE):
+        self.max_values: int = max_values
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def memoize_check(self, check: FieldCheck) -> FieldCheck:
+        if check.kind not in MEMOIZED_CHECK_KINDS:
+            return check
+
+        is_invalid = check.is_invalid
+        outcomes: dict[Any, bool] = {}
+        check_hits = 0
+        check_misses = 0
+        memoizing = True
+
+        def memoized_is_invalid(value: Any) -> bool:
+            nonlocal check_hits, check_misses, memoizing
+            if not memoizing:
+                return is_invalid(value)
+
+            key = value if value.__class__ is str else value_key(value)
+            outcome = outcomes.get(key)
+            if outcome is not None:
+                check_hits += 1
+                self.hits += 1
+                return outcome
+
+            check_misses += 1
+            self.misses += 1
+            if len(outcomes) >= self.max_values:
+                memoizing = check_hits >= check_misses
+                outcomes.clear()
+            outcome = is_invalid(value)
+            if memoizing:
+                outcomes[key] = outcome
+            return outcome
+
+        return check.model_copy(update={"is_invalid": memoized_is_invalid})
+
+    def memoize_fields(self, fields: Sequence[FieldPlan]) -> tuple[FieldPlan, ...]:
+        """Get the same field plans, with their checks memoized."""
+        return tuple(
+            field.model_copy(
+                update={"checks": tuple(map(self.memoize_check, field.checks))}
+            )
+            for field in fields
+        )
+
+    def memoize_fieldset(self, plan: FieldsetPlan) -> FieldsetPlan:
+        return plan.model_copy(update={"fields": self.memoize_fields(plan.fields)})
+
+
 def validate_field(
     row_num: int,
     row: dict[str, Any],
     field: FieldSchema,
     param_schemas: dict[str, WorkflowParam],
     param_values: dict[str, WorkflowParamValue],
+    engine: ValidationEngine = "row",
 ) -> list[ValidationFailure]:
     """Validate a field in a row."""
-    validations: list[ValidationFailure] = []
-
-    # Get the value of the field from the row. If the field is case insensitive,
-    # we need to case-insensitively match the field name to the row keys.
-    if field.case_sensitive:
-        value = row.get(field.name)
-    else:
-        case_insensitive_values = {key.lower(): value for key, value in row.items()}
-        value = case_insensitive_values.get(field.name.lower())
-
-    # If the field does not allow empty values and the value is empty, add a validation failure.
-    if not field.allow_empty_values and (value == "" or value is None):
-        validations.append(
-            ValidationFailure(
-                row_number=row_num,
-                message=(f"Empty value for the field '{field.name}'"),
-            )
+    field_plan = compile_field_plan(field, list(row), param_schemas, param_values)
+    return list(
+        validate_plan_rows(
+            (field_plan,), [list(row.values())], engine, first_row_number=row_num
         )
-
-    # Validate the data type of each field
-    match field.data_type_validation:
-        case BasicFieldDataTypeSchema(data_type="any"):
-            pass  # no additional validation needed
-        case BasicFieldDataTypeSchema(data_type="string"):
-            pass  # no additional validation needed
-        case BasicFieldDataTypeSchema(data_type="number"):
-            try:
-                _ = float(value)  # pyright: ignore[reportArgumentType]
-            # TypeError is raised if value is None
-            except (TypeError, ValueError) as e:
-                # if value is None, and we haven't already added a validation failure for a
-                # missing value, create a validation failure
-                if (isinstance(e, TypeError) and not field.required) or isinstance(
-                    e, ValueError
-                ):
-                    validations.append(
-                        ValidationFailure(
-                            row_number=row_num,
-                            message=(
-                                f"Value '{value}' for field '{field.name}' "
-                                f"is not a valid number"
-                            ),
-                        )
-                    )
-        case TimestampDataTypeSchema(
-            data_type="timestamp", date_time_format=date_time_format
-        ):
-            try:
-                _ = datetime.datetime.strptime(str(value), date_time_format)
-            except ValueError:
-                validations.append(
-                    ValidationFailure(
-                        row_number=row_num,
-                        message=(
-                            f"Value '{value}' for field '{field.name}' does not match "
-                            f"the expected timestamp format {date_time_format}"
-                        ),
-                    )
-                )
-        case _:
-            pass
-
-    # If the field has a list of allowed values, check if the value is in the list.
-    if field.allowed_values:
-        if isinstance(field.allowed_values, list):
-            allowed_values = field.allowed_values
-        else:
-            param = get_param_schema_by_id(param_schemas, field.allowed_values.param_id)
-            allowed_values: WorkflowParamValue = param_values[param.name]
-            if not isinstance(allowed_values, list):
-                validations.append(
-                    ValidationFailure(
-                        row_number=row_num,
-                        message=(
-                            f"Param value referenced with {param.name} is not a list."
-                        ),
-                    )
-                )
-                return validations
-
-        if value not in allowed_values:
-            validations.append(
-                ValidationFailure(
-                    row_number=row_num,
-                    message=(
-                        f"Value '{value}' is not allowed for field '{field.name}'"
-                    ),
-                )
-            )
-
-    return validations
+    )
 
 
 def validate_fieldset(
@@ -247,21 +385,53 @@ def validate_fieldset(
     fieldset_schema: FieldsetSchema,
     param_schemas: dict[str, WorkflowParam],
     param_values: dict[str, WorkflowParamValue],
+    engine: ValidationEngine = "row",
 ) -> list[ValidationFailure]:
     """Validate the fieldset schema of a file."""
-    validations: list[ValidationFailure] = []
+    plan = compile_fieldset_plan(
+        fieldset_schema, csv_columns, param_schemas, param_values
+    )
+    return list(
+        validate_fieldset_plan(
+            csv_columns,
+            ([row.get(column) for column in csv_columns] for row in csv_data),
+            plan,
+            engine,
+        )
+    )
 
-    validations.extend(check_csv_columns(csv_columns, fieldset_schema))
-    for row_num, row in enumerate(csv_data):
-        for field in fieldset_schema.fields:
-            validations.extend(
-                validate_field(
-                    row_num=row_num + 1,
-                    row=row,
-                    field=field,
-                    param_schemas=param_schemas,
-                    param_values=param_values,
-                )
-            )
 
-    return validations
+def validate_fieldset_plan(
+    csv_columns: list[str],
+    rows: Iterable[Sequence[Any]],
+    plan: FieldsetPlan,
+    engine: ValidationEngine = "row",
+) -> FailureStore:
+    """Validate the header and the rows of a file with a compiled fieldset plan.
+    Rows are sequences of cell values ordered like `csv_columns`."""
+    failures = FailureStore()
+    failures.extend(check_csv_columns(csv_columns, plan.fieldset_schema))
+    return validate_plan_rows(plan.fields, rows, engine, failures=failures)
+
+
+def validate_plan_rows(
+    fields: Sequence[FieldPlan],
+    rows: Iterable[Sequence[Any]],
+    engine: ValidationEngine = "row",
+    first_row_number: int = 1,
+    budget: FailureBudget | None = None,
+    failures: FailureStore | None = None,
+) -> FailureStore:
+    """Run compiled field checks on rows with the given validation engine, adding
+    the failures to `failures` (or a new store)."""
+    match engine:
+        case "row":
+            return validate_rows(fields, rows, first_row_number, budget, failures)
+        case "columnar":
+            return validate_columns(
+                fields,
+                rows if isinstance(rows, list) else list(rows),
+                first_row_number,
+                budget,
+                failures,
+            )
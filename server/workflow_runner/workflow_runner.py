@@ -1,64 +1,736 @@
-from typing import Any
+from collections import deque
+from collections.abc import Callable, Generator, Iterator, Sequence
+from functools import partial
+from typing import Any, ClassVar, TypeVar
 
-from frictionless import Resource
+from frictionless import FrictionlessException, Resource, Row
+from pydantic import BaseModel, ConfigDict, Field
 
-from server.models.workflow.api_schemas import ValidationFailure
+from server.models.workflow.api_schemas import (
+    ValidationFailure,
+    WorkflowRunReport,
+    WorkflowRunTimings,
+)
 from server.models.workflow.workflow_schema import (
     CsvData,
-    FieldsetSchema,
-    FieldsetSchemaValidation,
     FileTypeValidation,
-    ParamReference,
     RowCountValidation,
-    WorkflowParam,
     WorkflowSchema,
 )
 
-from .exceptions import (
-    FieldsetSchemaNotFoundException,
-    ParameterDefinitionNotFoundException,
+from .exceptions import ParameterDefinitionNotFoundException
+from .failures import ChainedFailures, FailureSequence, FailureStore
+from .plan import (
+    CompiledWorkflow,
+    FailureBudget,
+    FieldsetPlan,
+    WorkflowOperationPlan,
+    WorkflowParamValue,
+    WorkflowPlan,
+    compiled_workflow,
 )
+from .profiling import RunProfiler, profiled_operation, profiled_stage
 from .validators import (
-    WorkflowParamValue,
-    get_param_schema_by_id,
-    parse_frictionless,
-    validate_fieldset,
+    BaselineValidation,
+    CheckMemo,
+    ValidationEngine,
+    check_csv_columns,
+    check_row_count,
+    load_resource,
     validate_file_type,
-    validate_row_count,
+    validate_plan_rows,
 )
 
+# number of rows buffered while streaming a file before they are validated together.
+# Batches start small and double up to ROW_BATCH_SIZE, so that a capped run on a
+# file full of failures can stop after a few rows.
+FIRST_ROW_BATCH_SIZE = 8
+ROW_BATCH_SIZE = 10_000
+
+# called with the number of rows read so far, every PROGRESS_INTERVAL_ROWS rows
+ProgressCallback = Callable[[int], None]
+PROGRESS_INTERVAL_ROWS = 10_000
+
+T = TypeVar("T")
+
+
+class WorkflowRunStats(BaseModel):
+    """Instrumentation of a workflow run."""
+
+    # lookups of check outcomes that were found in, or missing from, the `CheckMemo`
+    check_memo_hits: int = 0
+    check_memo_misses: int = 0
+    # where the time of the run went, if it was profiled
+    timings: WorkflowRunTimings | None = None
+
+    @property
+    def check_memo_hit_rate(self) -> float | None:
+        lookups = self.check_memo_hits + self.check_memo_misses
+        return self.check_memo_hits / lookups if lookups else None
+
+
+class WorkflowRunResult(BaseModel):
+    """The outcome of running a workflow on a file.
+
+    `validation_failures` is a lazy view of the compact failure stores filled during
+    the run: each `ValidationFailure` is only built when it is read.
+
+    If a failure cap was hit, `validation_failures` is cut short and `failure_count`
+    is a lower bound of the number of failures in the file. If the run stopped
+    reading the file early, `row_count` is a lower bound as well.
+    """
+
+    row_count: int
+    row_count_is_exact: bool = True
+    failure_count: int
+    failure_count_is_exact: bool = True
+    validation_failures: FailureSequence
+    stats: WorkflowRunStats = Field(default_factory=WorkflowRunStats)
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(arbitrary_types_allowed=True)
+
+    def to_report(self, filename: str, workflow_id: str) -> WorkflowRunReport:
+        return WorkflowRunReport(
+            row_count=self.row_count,
+            row_count_is_exact=self.row_count_is_exact,
+            failure_count=self.failure_count,
+            failure_count_is_exact=self.failure_count_is_exact,
+            filename=filename,
+            workflow_id=workflow_id,
+            validation_failures=self.validation_failures,
+            timings=self.stats.timings,
+        )
+
 
 def process_workflow(
     file_name: str,
-    file_contents: Resource | str,
+    file_contents: Resource | str | bytes,
+    param_values: dict[str, WorkflowParamValue],
+    schema: WorkflowSchema | CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+) -> Sequence[ValidationFailure]:
+    """Validate and execute a workflow based on the configured schema and user-provided parameters.
+
+    `engine` selects how fieldset schemas are validated: "row" walks the file row by row,
+    "columnar" validates it one column at a time with batched numpy operations. Both
+    engines return the same validation failures.
+
+    `max_failures` caps the number of failures returned for the whole file, and
+    `max_failures_per_field` the number returned for each field of a fieldset. Once a
+    field has reached its cap it is no longer checked, and once the whole file has
+    reached its cap the file is no longer read. `fail_fast` stops at the first failure.
+
+    The failures are returned as a lazy, read-only sequence that builds each
+    `ValidationFailure` on access.
+
+    `schema` can be a `CompiledWorkflow`, to reuse the plans it compiled in earlier
+    runs.
+
+    `file_contents` is either the text of the file, a Frictionless Resource, or the
+    raw bytes of the file, which are decompressed while they are read if they are
+    gzip, bz2 or xz compressed.
+    """
+    return execute_workflow(
+        file_name,
+        file_contents,
+        param_values,
+        schema,
+        implicit_frictionless_validation,
+        engine,
+        max_failures,
+        max_failures_per_field,
+        fail_fast,
+    ).validation_failures
+
+
+def execute_workflow(
+    file_name: str,
+    file_contents: Resource | str | bytes,
+    param_values: dict[str, WorkflowParamValue],
+    schema: WorkflowSchema | CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+    on_progress: ProgressCallback | None = None,
+    profile: bool = False,
+) -> WorkflowRunResult:
+    """Run a workflow on a file and also report how many rows the file has.
+
+    The file is read once: each row is handed to the Frictionless baseline checks,
+    counted, and buffered in batches of up to `ROW_BATCH_SIZE` rows for the fieldset
+    validations, so only one batch of rows is held in memory at a time.
+    `on_progress` is called with the number of rows read so far while the file is
+    read.
+
+    With `profile`, the wall time of each stage of the run is measured and reported
+    in `stats.timings`, which adds a little overhead to the run.
+
+    See `process_workflow` for the failure caps.
+    """
+    return _run_to_end(
+        _run_workflow(
+            file_name,
+            file_contents,
+            param_values,
+            schema,
+            implicit_frictionless_validation,
+            engine,
+            max_failures,
+            max_failures_per_field,
+            fail_fast,
+            on_progress,
+            profile,
+        )
+    )
+
+
+def stream_workflow(
+    file_name: str,
+    file_contents: Resource | str | bytes,
     param_values: dict[str, WorkflowParamValue],
-    schema: WorkflowSchema,
+    schema: WorkflowSchema | CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+    profile: bool = False,
+) -> Generator[list[ValidationFailure], None, WorkflowRunResult]:
+    """Run a workflow like `execute_workflow`, yielding the failures found by each
+    step of the run as soon as the step is done: first the failures that don't depend
+    on the rows, then those of each batch of rows, and last those that need the row
+    count. Failures are yielded in the order they were found, not grouped by operation
+    like in the result, which the generator returns once the file has been read.
+    The timings of a profiled run include the time spent between the steps.
+    """
+    run = _run_workflow(
+        file_name,
+        file_contents,
+        param_values,
+        schema,
+        implicit_frictionless_validation,
+        engine,
+        max_failures,
+        max_failures_per_field,
+        fail_fast,
+        profile=profile,
+    )
+    while True:
+        try:
+            run_failures = next(run)
+        except StopIteration as stop:
+            return stop.value
+        if failures := run_failures.read_new():
+            yield failures
+
+
+class WorkflowRun(BaseModel):
+    """A workflow to run with `execute_workflows`, and the values of its params."""
+
+    workflow: WorkflowSchema | CompiledWorkflow
+    param_values: dict[str, WorkflowParamValue]
+
+    model_config: ClassVar[ConfigDict] = ConfigDict(arbitrary_types_allowed=True)
+
+
+def execute_workflows(
+    file_name: str,
+    file_contents: Resource | str | bytes,
+    runs: Sequence[WorkflowRun],
     implicit_frictionless_validation: bool = True,
-) -> list[ValidationFailure]:
-    """Validate and execute a workflow based on the configured schema and user-provided parameters."""
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+) -> list[WorkflowRunResult]:
+    """Run several workflows on a file, like `execute_workflow` for each of them, but
+    opening and parsing the file once. Returns the result of each run, in order.
 
-    workflow_validation_failures: list[ValidationFailure] = []
+    The parsed rows are shared by the runs, which take turns to check each batch of
+    rows, so only about a batch of rows per run is held in memory at a time. The
+    failure caps apply to each run, and a run that stops reading the file early
+    doesn't stop the others.
+    """
+    workflows = [compiled_workflow(run.workflow) for run in runs]
+    for run, workflow in zip(runs, workflows):
+        validate_param_values(run.param_values, workflow.schema)
+
+    resource = load_resource(file_contents)
+    with resource:
+        shared_rows = _SharedRowStream(resource.row_stream)
+        # every reader must exist before the first row is read
+        readers = [shared_rows.reader() for _ in runs]
+        pending = {
+            index: _run_workflow_on_resource(
+                file_name,
+                resource,
+                reader,
+                run.param_values,
+                workflow,
+                implicit_frictionless_validation,
+                engine,
+                max_failures,
+                max_failures_per_field,
+                fail_fast,
+            )
+            for index, (run, workflow, reader) in enumerate(
+                zip(runs, workflows, readers)
+            )
+        }
+        results: dict[int, WorkflowRunResult] = {}
+        while pending:
+            for index, steps in list(pending.items()):
+                try:
+                    _ = next(steps)
+                except StopIteration as stop:
+                    results[index] = stop.value
+                    readers[index].close()
+                    del pending[index]
+
+    return [results[index] for index in range(len(runs))]
+
+
+class _SharedRowStream:
+    """Reads a stream of rows once for several readers. Each reader gets every row,
+    and every error raised while reading a row, in order. The rows that some reader
+    hasn't read yet are buffered for it."""
+
+    def __init__(self, rows: Iterator[Row]):
+        self.rows: Iterator[Row] = rows
+        self.readers: list[_SharedRowReader] = []
+        self.exhausted: bool = False
+
+    def reader(self) -> "_SharedRowReader":
+        reader = _SharedRowReader(self)
+        self.readers.append(reader)
+        return reader
+
+    def read_next(self):
+        """Read the next row, or error, into the buffer of every reader."""
+        if self.exhausted:
+            return
+        try:
+            item: Row | FrictionlessException = next(self.rows)
+        except FrictionlessException as exception:
+            item = exception
+        except StopIteration:
+            self.exhausted = True
+            return
+        for reader in self.readers:
+            reader.buffer.append(item)
+
+
+class _SharedRowReader(Iterator[Row]):
+    """The rows of a `_SharedRowStream` for one reader."""
+
+    def __init__(self, stream: _SharedRowStream):
+        self.stream: _SharedRowStream = stream
+        self.buffer: deque[Row | FrictionlessException] = deque()
+
+    def __next__(self) -> Row:
+        if not self.buffer:
+            self.stream.read_next()
+        if not self.buffer:
+            raise StopIteration
+        item = self.buffer.popleft()
+        if isinstance(item, FrictionlessException):
+            raise item
+        return item
+
+    def close(self):
+        """Stop buffering rows for this reader."""
+        self.buffer.clear()
+        if self in self.stream.readers:
+            self.stream.readers.remove(self)
+
+
+class _RunFailures:
+    """The failure stores of a workflow run, read as they fill up."""
+
+    def __init__(
+        self,
+        baseline: BaselineValidation | None,
+        param_failures: FailureStore,
+        operation_failures: Sequence[FailureStore],
+    ):
+        self.baseline: BaselineValidation | None = baseline
+        self.stores: list[FailureStore] = [param_failures, *operation_failures]
+        self._baseline_read: int = 0
+        self._stores_read: list[int] = [0] * len(self.stores)
+
+    def read_new(self) -> list[ValidationFailure]:
+        """The failures that were added since the last read."""
+        failures: list[ValidationFailure] = []
+        if self.baseline:
+            failures.extend(self.baseline.failures(self._baseline_read))
+            self._baseline_read = len(self.baseline.errors)
+        for index, store in enumerate(self.stores):
+            failures.extend(store[self._stores_read[index] :])
+            self._stores_read[index] = len(store)
+        return failures
+
+
+def _run_workflow(
+    file_name: str,
+    file_contents: Resource | str | bytes,
+    param_values: dict[str, WorkflowParamValue],
+    schema: WorkflowSchema | CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+    on_progress: ProgressCallback | None = None,
+    profile: bool = False,
+) -> Generator[_RunFailures, None, WorkflowRunResult]:
+    """The steps of `execute_workflow`. Yields the failure stores of the run once the
+    checks that don't depend on the rows are done, after each batch of rows and once
+    the checks that need the row count are done, and returns the result."""
+    profiler = RunProfiler() if profile else None
+    workflow = compiled_workflow(schema)
+    validate_param_values(param_values, workflow.schema)
+
+    with profiled_stage(profiler, "parse"):
+        resource = load_resource(file_contents)
+        # opening the resource reads a sample of the file to infer its schema. It
+        # stays open for the `with` block below, which closes it
+        if resource.closed:
+            resource.open()
+
+    with resource:
+        return (
+            yield from _run_workflow_on_resource(
+                file_name,
+                resource,
+                resource.row_stream,
+                param_values,
+                workflow,
+                implicit_frictionless_validation,
+                engine,
+                max_failures,
+                max_failures_per_field,
+                fail_fast,
+                on_progress,
+                profiler,
+            )
+        )
+
+
+def _run_workflow_on_resource(
+    file_name: str,
+    resource: Resource,
+    rows: Iterator[Row],
+    param_values: dict[str, WorkflowParamValue],
+    workflow: CompiledWorkflow,
+    implicit_frictionless_validation: bool = True,
+    engine: ValidationEngine = "row",
+    max_failures: int | None = None,
+    max_failures_per_field: int | None = None,
+    fail_fast: bool = False,
+    on_progress: ProgressCallback | None = None,
+    profiler: RunProfiler | None = None,
+) -> Generator[_RunFailures, None, WorkflowRunResult]:
+    """The steps of `_run_workflow` on an open resource, whose rows are read from
+    `rows`. The param values must have been validated."""
+    budget = make_failure_budget(max_failures, max_failures_per_field, fail_fast)
+    memo = CheckMemo()
 
     # generally, workflows will have an implicit frictionless baseline validation
     # but this can be turned off if we want the schema to be a completely faithful
     # representation of the total validations that will be performed
-    file_resource, frictionless_baseline_validation_failures = parse_frictionless(
-        file_contents
+    baseline = (
+        BaselineValidation(resource, budget)
+        if implicit_frictionless_validation
+        else None
     )
-    if implicit_frictionless_validation:
-        workflow_validation_failures.extend(frictionless_baseline_validation_failures)
 
-    _validate_param_values(param_values, schema)
+    if baseline:
+        with profiled_stage(profiler, "baseline_validation"):
+            baseline.validate_start()
+
+    csv_columns = [field.name for field in resource.schema.fields]
+    plan = workflow.compile_plan(param_values, csv_columns)
+    operations = [
+        (
+            memo.memoize_fieldset(operation)
+            if isinstance(operation, FieldsetPlan)
+            else operation
+        )
+        for operation in plan.operations
+    ]
+    param_failures = check_params_before_rows(plan, budget)
+    operation_failures = check_operations_before_rows(
+        operations, file_name, csv_columns, budget, profiler
+    )
+    run_failures = _RunFailures(baseline, param_failures, operation_failures)
+    yield run_failures
 
-    csv_data = _get_csv_contents_from_resource(file_resource)
-    workflow_validation_failures.extend(
-        _validate_csv(file_name, csv_data, param_values, schema)
+    batches = stream_row_batches(
+        resource,
+        fieldset_operations(operations, operation_failures),
+        baseline,
+        budget,
+        engine,
+        on_progress,
+        profiler,
+        rows,
     )
+    while True:
+        try:
+            _ = next(batches)
+        except StopIteration as stop:
+            row_count, read_whole_file = stop.value
+            break
+        yield run_failures
+    if baseline and read_whole_file:
+        with profiled_stage(profiler, "baseline_validation"):
+            baseline.validate_end()
+
+    result = finish_run(
+        operations,
+        operation_failures,
+        baseline.validation_failures if baseline else [],
+        param_failures,
+        row_count,
+        read_whole_file,
+        budget,
+        WorkflowRunStats(check_memo_hits=memo.hits, check_memo_misses=memo.misses),
+        profiler,
+    )
+    if profiler:
+        result.stats.timings = profiler.timings(
+            # a param failure stops the run before any operation
+            workflow.schema.operations if operations else [],
+            operation_failures,
+            row_count,
+            len(csv_columns),
+        )
+    yield run_failures
+    return result
+
+
+def _run_to_end(steps: Generator[Any, None, T]) -> T:
+    while True:
+        try:
+            _ = next(steps)
+        except StopIteration as stop:
+            return stop.value
 
-    return workflow_validation_failures
+
+def make_failure_budget(
+    max_failures: int | None,
+    max_failures_per_field: int | None,
+    fail_fast: bool,
+) -> FailureBudget:
+    if fail_fast:
+        max_failures = 1 if max_failures is None else min(max_failures, 1)
+    return FailureBudget(max_failures, max_failures_per_field)
+
+
+def check_params_before_rows(plan: WorkflowPlan, budget: FailureBudget) -> FailureStore:
+    """Report a param value of the wrong type, which the plan compiled to a failure
+    instead of its operations."""
+    param_failures = FailureStore()
+    if plan.param_failure:
+        param_failures.extend(budget.take([plan.param_failure]))
+    return param_failures
+
+
+def check_operations_before_rows(
+    operations: Sequence[WorkflowOperationPlan],
+    file_name: str,
+    csv_columns: list[str],
+    budget: FailureBudget,
+    profiler: RunProfiler | None = None,
+) -> list[FailureStore]:
+    """Create the failure store of each operation, in the order of the operations,
+    and run the checks that don't depend on the rows first, so they get into the
+    budget before any row does."""
+    operation_failures: list[FailureStore] = []
+    for operation in operations:
+        failures = FailureStore()
+        with profiled_operation(profiler, failures):
+            match operation:
+                case FieldsetPlan():
+                    failures.extend(
+                        budget.take(
+                            check_csv_columns(csv_columns, operation.fieldset_schema)
+                        )
+                    )
+                case FileTypeValidation():
+                    failures.extend(
+                        budget.take(validate_file_type(file_name, operation))
+                    )
+                case RowCountValidation():
+                    pass
+        operation_failures.append(failures)
+    return operation_failures
+
+
+def fieldset_operations(
+    operations: Sequence[WorkflowOperationPlan],
+    operation_failures: Sequence[FailureStore],
+) -> list[tuple[FieldsetPlan, FailureStore]]:
+    """Pair the fieldset operations with their failure stores."""
+    return [
+        (operation, failures)
+        for operation, failures in zip(operations, operation_failures)
+        if isinstance(operation, FieldsetPlan)
+    ]
+
+
+def stream_rows(
+    resource: Resource,
+    fieldsets: Sequence[tuple[FieldsetPlan, FailureStore]],
+    baseline: BaselineValidation | None,
+    budget: FailureBudget,
+    engine: ValidationEngine,
+    on_progress: ProgressCallback | None = None,
+) -> tuple[int, bool]:
+    """Read the rows of an open resource, handing each one to the baseline checks
+    and validating them against the fieldsets in batches. `on_progress` is called
+    every `PROGRESS_INTERVAL_ROWS` rows.
+
+    Returns the number of rows and whether the whole resource was read, which is not
+    the case if the failure budget ran out.
+    """
+    return _run_to_end(
+        stream_row_batches(resource, fieldsets, baseline, budget, engine, on_progress)
+    )
 
 
-def _validate_param_values(
+def stream_row_batches(
+    resource: Resource,
+    fieldsets: Sequence[tuple[FieldsetPlan, FailureStore]],
+    baseline: BaselineValidation | None,
+    budget: FailureBudget,
+    engine: ValidationEngine,
+    on_progress: ProgressCallback | None = None,
+    profiler: RunProfiler | None = None,
+    rows: Iterator[Row] | None = None,
+) -> Generator[int, None, tuple[int, bool]]:
+    """Like `stream_rows`, but yield the number of rows read so far after each batch
+    of rows was checked. With a `profiler`, the stages of the run are timed. The
+    rows are read from `rows` if given, instead of `resource.row_stream`."""
+    row_count = 0
+    rows_in_batch = 0
+    batch: list[list[Any]] = []
+    batch_size = min(FIRST_ROW_BATCH_SIZE, ROW_BATCH_SIZE)
+
+    # the calls made for every row, which are timed when the run is profiled
+    read_row: Callable[[], Row] = partial(
+        next, resource.row_stream if rows is None else rows
+    )
+    validate_row = baseline.validate_row if baseline else None
+    materialize_row: Callable[[Row], list[Any]] = Row.to_list
+    if profiler:
+        read_row = profiler.timed("parse", read_row)
+        if validate_row:
+            validate_row = profiler.timed("baseline_validation", validate_row)
+        materialize_row = profiler.timed("row_materialization", materialize_row)
+
+    def validate_batch():
+        first_row_number = row_count - len(batch) + 1
+        for fieldset_plan, failures in fieldsets:
+            with profiled_operation(profiler, failures):
+                validate_plan_rows(
+                    fieldset_plan.fields,
+                    batch,
+                    engine,
+                    first_row_number,
+                    budget,
+                    failures,
+                )
+        batch.clear()
+
+    def has_fields_to_check() -> bool:
+        return any(
+            budget.allows(field)
+            for fieldset_plan, _ in fieldsets
+            for field in fieldset_plan.fields
+        )
+
+    check_fields = has_fields_to_check()
+    while True:
+        # there is no point in reading the rest of the file if no more failures
+        # can be reported
+        if budget.exhausted:
+            return row_count, False
+
+        try:
+            row = read_row()
+        except FrictionlessException as exception:
+            if baseline:
+                with profiled_stage(profiler, "baseline_validation"):
+                    baseline.add_stream_error(exception.error)
+            continue
+        except StopIteration:
+            break
+
+        row_count += 1
+        if on_progress and row_count % PROGRESS_INTERVAL_ROWS == 0:
+            on_progress(row_count)
+        if validate_row:
+            validate_row(row)
+        if check_fields:
+            batch.append(materialize_row(row))
+        rows_in_batch += 1
+        if rows_in_batch >= batch_size:
+            if batch:
+                validate_batch()
+                check_fields = has_fields_to_check()
+            batch_size = min(batch_size * 2, ROW_BATCH_SIZE)
+            rows_in_batch = 0
+            yield row_count
+
+    if batch:
+        validate_batch()
+    return row_count, True
+
+
+def finish_run(
+    operations: Sequence[WorkflowOperationPlan],
+    operation_failures: Sequence[FailureStore],
+    baseline_failures: Sequence[ValidationFailure],
+    param_failures: Sequence[ValidationFailure],
+    row_count: int,
+    read_whole_file: bool,
+    budget: FailureBudget,
+    stats: WorkflowRunStats,
+    profiler: RunProfiler | None = None,
+) -> WorkflowRunResult:
+    """Run the checks that need the row count and put the failures together, in the
+    order of the operations."""
+    for operation, failures in zip(operations, operation_failures):
+        if isinstance(operation, RowCountValidation):
+            # a partial row count can only tell that there are too many rows
+            if read_whole_file or row_count > (operation.max_row_count or float("inf")):
+                with profiled_operation(profiler, failures):
+                    failures.extend(budget.take(check_row_count(row_count, operation)))
+
+    validations: list[Sequence[ValidationFailure]] = [
+        baseline_failures,
+        param_failures,
+        *operation_failures,
+    ]
+
+    return WorkflowRunResult(
+        row_count=row_count,
+        row_count_is_exact=read_whole_file,
+        failure_count=budget.failure_count,
+        failure_count_is_exact=read_whole_file and not budget.truncated,
+        validation_failures=ChainedFailures(validations),
+        stats=stats,
+    )
+
+
+def validate_param_values(
     param_values: dict[str, WorkflowParamValue], schema: WorkflowSchema
 ):
     """
@@ -85,80 +757,3 @@ def _get_csv_contents_from_resource(file_resource: Resource) -> CsvData:
         column_names=fieldnames,
         data=all_rows,
     )
-
-
-def _get_fieldset_schema_by_name(
-    fieldset_name: str, fieldsets: list[FieldsetSchema]
-) -> FieldsetSchema:
-    """Get the fieldset schema from the list of fieldsets."""
-    for fieldset in fieldsets:
-        if fieldset.name == fieldset_name:
-            return fieldset
-    raise FieldsetSchemaNotFoundException(
-        f"Fieldset schema with name '{fieldset_name}' not found in schema."
-    )
-
-
-def _get_fieldset_schema_by_id(
-    fieldset_id: str, fieldsets: list[FieldsetSchema]
-) -> FieldsetSchema:
-    """Get the fieldset schema from the list of fieldsets."""
-    for fieldset in fieldsets:
-        if fieldset.id == fieldset_id:
-            return fieldset
-    raise FieldsetSchemaNotFoundException(
-        f"Fieldset schema with id '{fieldset_id}' not found in schema."
-    )
-
-
-def _validate_csv(
-    file_name: str,
-    csv_data: CsvData,
-    param_values: dict[str, WorkflowParamValue],
-    schema: WorkflowSchema,
-) -> list[ValidationFailure]:
-    """Validate the CSV data based on the configured schema and user-provided parameters."""
-    validations = []
-
-    param_schemas: dict[str, WorkflowParam] = {
-        param.id: param for param in schema.params
-    }
-
-    for operation in schema.operations:
-        match operation:
-            case FieldsetSchemaValidation():
-                match operation.fieldset_schema:
-                    case str():
-                        fieldset_schema = _get_fieldset_schema_by_id(
-                            operation.fieldset_schema, schema.fieldset_schemas
-                        )
-                    case ParamReference():
-                        param = get_param_schema_by_id(
-                            param_schemas, operation.fieldset_schema.param_id
-                        )
-                        fieldset_schema_name = param_values[param.name]
-                        if not isinstance(fieldset_schema_name, str):
-                            return [
-                                ValidationFailure(
-                                    message=f"The param value referenced with {param.name} is not a string."
-                                )
-                            ]
-                        fieldset_schema = _get_fieldset_schema_by_name(
-                            fieldset_schema_name, schema.fieldset_schemas
-                        )
-
-                validations.extend(
-                    validate_fieldset(
-                        csv_data.column_names,
-                        csv_data.data,
-                        fieldset_schema,
-                        param_schemas,
-                        param_values,
-                    )
-                )
-            case FileTypeValidation():
-                validations.extend(validate_file_type(file_name, operation))
-            case RowCountValidation():
-                validations.extend(validate_row_count(csv_data.data, operation))
-
-    return validations